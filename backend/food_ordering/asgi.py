@@ -2,6 +2,9 @@
 ASGI config for food_ordering project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Production runs this under gunicorn's uvicorn worker (see Procfile) so that
+long-lived responses such as the /api/orders/events/ stream don't each pin
+a worker thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -14,3 +17,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'food_ordering.settings')
 
 application = get_asgi_application()
+
+# Periodic housekeeping (the sweep, archiving) runs in server processes only
+from food_ordering import scheduler  # noqa: E402
+
+scheduler.start()
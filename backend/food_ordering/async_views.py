@@ -0,0 +1,192 @@
+"""
+Native async read endpoints, served under /api/async/.
+
+Under ASGI every DRF view runs in a worker thread. An ``AsyncReadView`` runs
+on the event loop and awaits its queries through the async ORM. Everything
+that doesn't touch the database comes from the DRF viewset it mirrors, so
+responses match the sync endpoint's byte for byte:
+
+- permission classes and CountryFilterMixin scoping
+- the shard selection
+- filter backends
+- the ValuesSerializer that renders the rows
+
+Authentication is ``CachedJWTAuthentication.aauthenticate``. Pagination is
+``AsyncPageNumberPagination``, the default page-number format. Subclasses
+implement ``respond(viewset)``, which awaits the queries and returns the
+response data.
+
+Django's database backends are synchronous, so the async ORM still runs each
+query in a thread. What goes away is a thread held for the whole request:
+auth, cache reads, rendering and the wait for a free worker.
+"""
+
+import math
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import QuerySet
+from django.http import Http404
+from django.views import View
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from users.authentication import CachedJWTAuthentication
+from . import sharding
+
+
+async def alist(queryset):
+    """
+    Evaluate `queryset` with the async ORM (a ShardedQuerySet in a thread)
+    """
+    if isinstance(queryset, QuerySet):
+        return [row async for row in queryset]
+    return await sync_to_async(list)(queryset)
+
+
+async def acount(queryset):
+    if isinstance(queryset, QuerySet):
+        return await queryset.acount()
+    return await sync_to_async(queryset.count)()
+
+
+async def aslice(queryset, start, stop):
+    if isinstance(queryset, QuerySet):
+        return await alist(queryset[start:stop])
+    # A ShardedQuerySet slice runs its queries straight away
+    return await sync_to_async(queryset.__getitem__)(slice(start, stop))
+
+
+async def aget_object(queryset, **lookups):
+    """
+    The one object in `queryset` matching `lookups`, or a 404 worded
+    like get_object_or_404's
+    """
+    try:
+        if isinstance(queryset, QuerySet):
+            return await queryset.aget(**lookups)
+        # Also selects the object's shard for the rest of the request
+        return await sync_to_async(queryset.get)(**lookups)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """
+    PageNumberPagination with an awaitable apaginate_queryset(), for
+    AsyncReadView. Same query parameters and response body.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.count = await acount(queryset)
+        self.num_pages = max(1, math.ceil(self.count / page_size))
+        number = request.query_params.get(self.page_query_param) or 1
+        if number in self.last_page_strings:
+            number = self.num_pages
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_page_message.format(
+                page_number=number, message='That page number is not an integer'
+            ))
+        if number < 1 or number > self.num_pages:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=number,
+                message='That page number is less than 1' if number < 1 else 'That page contains no results'
+            ))
+
+        self.number = number
+        bottom = (number - 1) * page_size
+        return await aslice(queryset, bottom, bottom + page_size)
+
+    def get_next_link(self):
+        if self.number >= self.num_pages:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.number + 1)
+
+    def get_previous_link(self):
+        if self.number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.number - 1)
+
+    def get_paginated_data(self, data):
+        return {
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+
+class AsyncReadView(View):
+    """
+    Async GET endpoint mirroring `action` of `viewset_class`
+    """
+
+    viewset_class = None
+    action = 'list'
+    http_method_names = ['get']
+    pagination_class = AsyncPageNumberPagination
+
+    def get_viewset(self, request, *args, **kwargs):
+        """
+        The DRF viewset, set up as its dispatch() would for this request
+        """
+        viewset = self.viewset_class(action_map={'get': self.action})
+        viewset.args, viewset.kwargs = args, kwargs
+        viewset.headers = viewset.default_response_headers
+        # The browsable API renders forms with sync queries
+        viewset.renderer_classes = [JSONRenderer]
+        viewset.request = viewset.initialize_request(request, *args, **kwargs)
+        return viewset
+
+    async def get(self, request, *args, **kwargs):
+        viewset = self.get_viewset(request, *args, **kwargs)
+        drf_request = viewset.request
+        try:
+            authenticated = await CachedJWTAuthentication().aauthenticate(request)
+            drf_request.user, drf_request.auth = authenticated or (AnonymousUser(), None)
+            with sharding.using_shard():
+                # Permissions, content negotiation and the shard: no queries
+                viewset.initial(drf_request, *args, **kwargs)
+                response = Response(await self.respond(viewset))
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+
+        response = viewset.finalize_response(drf_request, response, *args, **kwargs)
+        return response.render()
+
+    async def respond(self, viewset):
+        raise NotImplementedError
+
+    async def paginated(self, viewset, queryset):
+        """
+        Page `queryset` (in the viewset's values form) like ValuesListMixin.values_list_response
+        """
+        serializer = viewset.get_values_serializer()
+        queryset = serializer.values(queryset)
+
+        paginator = self.pagination_class()
+        rows = await paginator.apaginate_queryset(queryset, viewset.request, viewset)
+        if rows is None:
+            return await self.represent(serializer, await alist(queryset))
+        return paginator.get_paginated_data(await self.represent(serializer, rows))
+
+    async def represent(self, serializer, rows):
+        """
+        Render `rows`. Serializers that need another query define ato_representation.
+        """
+        if hasattr(serializer, 'ato_representation'):
+            return await serializer.ato_representation(rows)
+        return serializer.to_representation(rows)
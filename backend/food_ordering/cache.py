@@ -0,0 +1,332 @@
+"""
+Two-tier cache for the food ordering API.
+
+``TwoTierCache`` is a Django cache backend that keeps a small per-process
+LRU (with its own short TTL) in front of a shared backend such as Redis.
+The module-level helpers (``cache_get``, ``cache_set``,
+``get_or_set``/``aget_or_set``, ``invalidate_tags``) add tag-based
+invalidation and stampede protection on top of whatever
+``CACHES['default']`` is, and count hits/misses for monitoring
+(``stats.snapshot()``). ``shared()`` skips the local tier, for values that
+must never be read stale.
+
+Tags work by versioning: every tag has a counter in the shared tier and the
+current counters are folded into the real cache key. Invalidating a tag
+bumps its counter, so every key built with the old value simply stops
+being read. Tag counters are always read from the shared tier, which is
+what keeps the local tier safe across processes: a locally cached value is
+only ever found under a key that is still current.
+
+Keys without tags get no such protection: after another process overwrites
+or deletes one, this process may go on reading its local copy for up to
+LOCAL_TIMEOUT seconds. Tag anything that is invalidated, or use
+``shared()``.
+"""
+
+import asyncio
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+
+
+class TwoTierCache(BaseCache):
+    """
+    Per-process LRU with TTL in front of the cache alias named in
+    OPTIONS['SHARED_ALIAS'].
+
+    OPTIONS:
+        SHARED_ALIAS       CACHES alias of the shared tier (default 'shared')
+        LOCAL_MAX_ENTRIES  size of the per-process LRU (default 1000, 0 disables it)
+        LOCAL_TIMEOUT      max seconds a value lives in the local tier (default 5)
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED_ALIAS', 'shared')
+        self._local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    # Local tier ----------------------------------------------------------
+
+    def _local_key(self, key, version):
+        return self.shared.make_and_validate_key(key, version=version)
+
+    def _local_get(self, local_key):
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is None:
+                return _MISSING
+            expires_at, payload = entry
+            if expires_at < time.monotonic():
+                del self._local[local_key]
+                return _MISSING
+            self._local.move_to_end(local_key)
+        return pickle.loads(payload)
+
+    def _local_set(self, local_key, value, timeout):
+        if self._local_max_entries <= 0:
+            return
+        ttl = self._local_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            ttl = min(ttl, timeout)
+        if ttl <= 0:
+            self._local_delete(local_key)
+            return
+        # Pickled like LocMemCache, so callers can't mutate the cached copy
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[local_key] = (time.monotonic() + ttl, payload)
+            self._local.move_to_end(local_key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, local_key):
+        with self._lock:
+            self._local.pop(local_key, None)
+
+    # BaseCache API -------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        value = self._local_get(local_key)
+        if value is not _MISSING:
+            stats.incr('local_hits')
+            return value
+
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            stats.incr('misses')
+            return default
+
+        stats.incr('shared_hits')
+        self._local_set(local_key, value, DEFAULT_TIMEOUT)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout=timeout, version=version)
+        self._local_set(self._local_key(key, version), value, timeout)
+        stats.incr('sets')
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._local_set(self._local_key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self._local_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        if self._local_get(self._local_key(key, version)) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # Counters live in the shared tier only
+        self._local_delete(self._local_key(key, version))
+        return self.shared.incr(key, delta=delta, version=version)
+
+    def clear(self):
+        self.clear_local()
+        self.shared.clear()
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+class CacheStats:
+    """
+    Thread-safe hit/miss counters for this process
+    """
+
+    FIELDS = (
+        'local_hits', 'shared_hits', 'misses', 'sets',
+        'computes', 'stampede_waits', 'invalidations',
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, field, amount=1):
+        with self._lock:
+            self._counts[field] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self.FIELDS, 0)
+
+
+stats = CacheStats()
+
+# How long a get_or_set caller holds the recompute lock, and how long other
+# callers wait for it before computing the value themselves
+STAMPEDE_LOCK_TIMEOUT = 10
+STAMPEDE_WAIT = 2.0
+STAMPEDE_POLL_INTERVAL = 0.05
+
+
+def shared():
+    """
+    The shared tier on its own. Per-user state that one process must never
+    read stale from its local tier (carts, locks) lives here.
+    """
+    return getattr(cache, 'shared', cache)
+
+
+def _tag_key(tag):
+    return f'tag:{tag}'
+
+
+def _new_tag_version():
+    # Time-based, so a tag counter that was evicted and recreated can't
+    # land back on a version whose values are still cached
+    return int(time.time() * 1000)
+
+
+def tagged_key(key, tags=()):
+    """
+    Fold the current version of each tag into `key`
+    """
+    if not tags:
+        return key
+    tag_keys = [_tag_key(tag) for tag in tags]
+    versions = shared().get_many(tag_keys)
+    missing = [tag_key for tag_key in tag_keys if tag_key not in versions]
+    if missing:
+        for tag_key in missing:
+            shared().add(tag_key, _new_tag_version(), timeout=None)
+        versions.update(shared().get_many(missing))
+    suffix = '.'.join(str(versions.get(tag_key, 0)) for tag_key in tag_keys)
+    return f'{key}@{suffix}'
+
+
+def cache_get(key, default=None, tags=()):
+    """
+    Read a (tagged) value, returning `default` on a miss. Without tags the
+    value may be up to LOCAL_TIMEOUT seconds stale (see the module docstring).
+    """
+    value = cache.get(tagged_key(key, tags), _MISSING)
+    if value is _MISSING:
+        return default
+    return value
+
+
+def cache_set(key, value, timeout=DEFAULT_TIMEOUT, tags=()):
+    cache.set(tagged_key(key, tags), value, timeout=timeout)
+
+
+def get_or_set(key, default, timeout=DEFAULT_TIMEOUT, tags=()):
+    """
+    Return the cached value for `key`, computing it with `default()` on a miss.
+
+    Only one caller across all processes recomputes a missing key at a time
+    (a short lock in the shared tier); the others poll for the result for up
+    to STAMPEDE_WAIT seconds before giving up and computing it themselves.
+    Polling sleeps, holding the caller's worker thread meanwhile; async
+    views use aget_or_set(), which doesn't.
+    The tagged key is resolved before computing, so an invalidation that
+    lands mid-compute isn't masked by the value being stored.
+    """
+    full_key = tagged_key(key, tags)
+    value = cache.get(full_key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f'{full_key}:lock'
+    if not shared().add(lock_key, 1, timeout=STAMPEDE_LOCK_TIMEOUT):
+        stats.incr('stampede_waits')
+        deadline = time.monotonic() + STAMPEDE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(STAMPEDE_POLL_INTERVAL)
+            value = cache.get(full_key, _MISSING)
+            if value is not _MISSING:
+                return value
+        return _compute(full_key, default, timeout)
+
+    try:
+        return _compute(full_key, default, timeout)
+    finally:
+        shared().delete(lock_key)
+
+
+async def aget_or_set(key, default, timeout=DEFAULT_TIMEOUT, tags=()):
+    """
+    get_or_set() for async views: `default` is a coroutine function, and
+    waiting on another caller's compute doesn't block the event loop. The
+    cache calls themselves stay synchronous (a local LRU hit, or one round
+    trip to the shared tier).
+    """
+    full_key = tagged_key(key, tags)
+    value = cache.get(full_key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f'{full_key}:lock'
+    if not shared().add(lock_key, 1, timeout=STAMPEDE_LOCK_TIMEOUT):
+        stats.incr('stampede_waits')
+        deadline = time.monotonic() + STAMPEDE_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(STAMPEDE_POLL_INTERVAL)
+            value = cache.get(full_key, _MISSING)
+            if value is not _MISSING:
+                return value
+        return await _acompute(full_key, default, timeout)
+
+    try:
+        return await _acompute(full_key, default, timeout)
+    finally:
+        shared().delete(lock_key)
+
+
+def _compute(full_key, default, timeout):
+    stats.incr('computes')
+    value = default()
+    cache.set(full_key, value, timeout=timeout)
+    return value
+
+
+async def _acompute(full_key, default, timeout):
+    stats.incr('computes')
+    value = await default()
+    cache.set(full_key, value, timeout=timeout)
+    return value
+
+
+def invalidate_tags(*tags):
+    """
+    Make every value cached under any of `tags` unreachable
+    """
+    for tag in tags:
+        tag_key = _tag_key(tag)
+        try:
+            shared().incr(tag_key)
+        except ValueError:
+            # Never read (or evicted): readers will start a fresh version line
+            shared().add(tag_key, _new_tag_version(), timeout=None)
+        stats.incr('invalidations')
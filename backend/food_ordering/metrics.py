@@ -0,0 +1,457 @@
+"""
+Request instrumentation for the food ordering API.
+
+``MetricsMiddleware`` samples requests (``METRICS_SAMPLE_RATE``) and records,
+per view and HTTP method, histograms of:
+
+- request latency
+- SQL query count and time spent in the database (every connection)
+- time spent turning objects into primitives (ModelSerializers using
+  ``TimedSerializerMixin`` and ValuesSerializers)
+- response size
+
+Views are labelled ``ViewSet.action`` for viewsets (``OrderViewSet.place_order``),
+otherwise by class or function name. ``render()`` returns everything in the
+Prometheus text format, together with the cache counters from
+``food_ordering.cache.stats``; ``/api/metrics/`` serves it to admins through
+``PrometheusRenderer``.
+
+Values are kept per process. With ``METRICS_MULTIPROC_DIR`` set (e.g. under
+gunicorn), each process also writes its values to ``<dir>/metrics-<pid>.json``
+at most every ``METRICS_FLUSH_INTERVAL`` seconds, and ``render()`` adds up the
+files of every process. Empty the directory when the server (re)starts.
+With a sample rate of 0 the middleware removes itself at startup.
+"""
+
+import atexit
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.renderers import BaseRenderer
+
+from . import cache as app_cache
+
+PREFIX = 'food_ordering'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (help, buckets)
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Request latency', LATENCY_BUCKETS),
+    'http_request_db_queries': ('SQL queries per request', QUERY_BUCKETS),
+    'http_request_db_duration_seconds': ('Time spent in SQL queries per request', LATENCY_BUCKETS),
+    'http_request_serializer_duration_seconds': ('Time spent in serializers per request', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('Response body size; 0 for streamed responses', SIZE_BUCKETS),
+}
+HISTOGRAM_LABELS = ('view', 'method')
+
+# name -> (help, label names)
+COUNTERS = {
+    'http_requests_total': ('Requests seen by the middleware, sampled or not', ('view', 'method', 'status')),
+    # Incremented by food_ordering.querylog
+    'sql_slow_queries_total': ('Queries slower than SQL_SLOW_QUERY_MS', ('view',)),
+    'sql_repeated_queries_total': ('Query fingerprints run more than SQL_REPEAT_THRESHOLD times in one request', ('view',)),
+}
+
+_current_sample = contextvars.ContextVar('metrics_sample', default=None)
+# Execute wrappers of the current request, outermost first (see execute_wrapper)
+_query_wrappers = contextvars.ContextVar('query_wrappers', default=())
+
+
+class Registry:
+    """
+    Thread-safe histograms and counters for this process.
+
+    Histogram values are [count per bucket..., count above the last bucket,
+    sum]; buckets are made cumulative only when rendering.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {name: {} for name in HISTOGRAMS}
+        self._counters = {name: {} for name in COUNTERS}
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        with self._lock:
+            series = self._histograms[name].get(labels)
+            if series is None:
+                series = self._histograms[name][labels] = [0] * (len(buckets) + 2)
+            series[bisect_left(buckets, value)] += 1
+            series[-1] += value
+
+    def incr(self, name, labels, amount=1):
+        with self._lock:
+            counter = self._counters[name]
+            counter[labels] = counter.get(labels, 0) + amount
+
+    def snapshot(self):
+        """
+        JSON-safe copy of every value, including the cache counters
+        """
+        with self._lock:
+            return {
+                'histograms': {
+                    name: [[list(labels), list(series)] for labels, series in values.items()]
+                    for name, values in self._histograms.items()
+                },
+                'counters': {
+                    name: [[list(labels), value] for labels, value in values.items()]
+                    for name, values in self._counters.items()
+                },
+                'cache': app_cache.stats.snapshot(),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {name: {} for name in HISTOGRAMS}
+            self._counters = {name: {} for name in COUNTERS}
+
+
+registry = Registry()
+
+
+# Multi-process -----------------------------------------------------------
+
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def _multiproc_dir():
+    return getattr(settings, 'METRICS_MULTIPROC_DIR', '')
+
+
+def flush(force=False):
+    """
+    Write this process's values to the shared directory, if one is set and
+    the last write is older than METRICS_FLUSH_INTERVAL (or `force`)
+    """
+    global _last_flush
+    directory = _multiproc_dir()
+    if not directory:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+        return
+    if not _flush_lock.acquire(blocking=force):
+        return  # another thread is writing
+    try:
+        _last_flush = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as output:
+            json.dump(registry.snapshot(), output)
+        # Readers only ever see a complete file
+        os.replace(temporary, path)
+    finally:
+        _flush_lock.release()
+
+
+atexit.register(lambda: _multiproc_dir() and flush(force=True))
+
+
+def collect():
+    """
+    Every process's values added up, or just this process's without a
+    multi-process directory
+    """
+    directory = _multiproc_dir()
+    if not directory:
+        return [registry.snapshot()]
+
+    flush(force=True)
+    snapshots = []
+    if not os.path.isdir(directory):
+        return snapshots
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.startswith('metrics-') and filename.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as snapshot_file:
+                snapshots.append(json.load(snapshot_file))
+        except (OSError, ValueError):
+            continue  # removed or replaced while listing
+    return snapshots
+
+
+def _merge(snapshots):
+    histograms = {name: {} for name in HISTOGRAMS}
+    counters = {name: {} for name in COUNTERS}
+    cache = dict.fromkeys(app_cache.CacheStats.FIELDS, 0)
+
+    for snapshot in snapshots:
+        for name, values in snapshot['histograms'].items():
+            if name not in histograms:
+                continue
+            for labels, series in values:
+                merged = histograms[name].setdefault(tuple(labels), [0] * len(series))
+                for index, value in enumerate(series):
+                    merged[index] += value
+        for name, values in snapshot['counters'].items():
+            if name not in counters:
+                continue
+            for labels, value in values:
+                labels = tuple(labels)
+                counters[name][labels] = counters[name].get(labels, 0) + value
+        for field, value in snapshot.get('cache', {}).items():
+            if field in cache:
+                cache[field] += value
+    return histograms, counters, cache
+
+
+# Prometheus text format --------------------------------------------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format (0.0.4)
+    """
+    histograms, counters, cache = _merge(collect())
+    lines = []
+
+    for name, (description, buckets) in HISTOGRAMS.items():
+        metric = f'{PREFIX}_{name}'
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} histogram']
+        for labels, series in sorted(histograms[name].items()):
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), series):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(float(bound))
+                lines.append(f'{metric}_bucket{_labels(HISTOGRAM_LABELS, labels, [("le", le)])} {cumulative}')
+            lines.append(f'{metric}_sum{_labels(HISTOGRAM_LABELS, labels)} {_number(float(series[-1]))}')
+            lines.append(f'{metric}_count{_labels(HISTOGRAM_LABELS, labels)} {cumulative}')
+
+    for name, (description, label_names) in COUNTERS.items():
+        metric = f'{PREFIX}_{name}'
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} counter']
+        for labels, value in sorted(counters[name].items()):
+            lines.append(f'{metric}{_labels(label_names, labels)} {value}')
+
+    metric = f'{PREFIX}_cache_operations_total'
+    lines += [f'# HELP {metric} Two-tier cache operations', f'# TYPE {metric} counter']
+    for field, value in cache.items():
+        lines.append(f'{metric}{_labels(("operation",), (field,))} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+class PrometheusRenderer(BaseRenderer):
+    """
+    Writes render()'s text as is; error responses fall back to JSON
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return json.dumps(data).encode(self.charset)
+
+
+# Collection --------------------------------------------------------------
+
+class Sample:
+    """
+    What one sampled request spent; also the execute_wrapper that counts
+    its SQL
+    """
+
+    __slots__ = ('queries', 'db_seconds', 'serializer_seconds', 'serializing', 'elapsed')
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+def _run_query_wrappers(execute, sql, params, many, context):
+    # Installed on every connection; runs the wrappers of whatever context
+    # the query runs in
+    for wrapper in reversed(_query_wrappers.get()):
+        execute = functools.partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def _install(connection, **kwargs):
+    if _run_query_wrappers not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _run_query_wrappers)
+
+
+connection_created.connect(_install, dispatch_uid='food_ordering.metrics')
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """
+    connection.execute_wrapper(wrapper) for every connection the current
+    context queries through. Connections are per thread, and under ASGI
+    (async views, the async ORM, sync views) the queries run in executor
+    threads; those inherit the context through sync_to_async, so a wrapper
+    set on the event loop still sees them.
+    """
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+    token = _query_wrappers.set((*_query_wrappers.get(), wrapper))
+    try:
+        yield
+    finally:
+        _query_wrappers.reset(token)
+
+
+def time_serializer(function, *args):
+    """
+    Call function(*args), adding its duration to the current sample's
+    serializer time. Nested calls are counted once, by the outermost.
+    """
+    sample = _current_sample.get()
+    if sample is None or sample.serializing:
+        return function(*args)
+    sample.serializing = True
+    started = time.perf_counter()
+    try:
+        return function(*args)
+    finally:
+        sample.serializer_seconds += time.perf_counter() - started
+        sample.serializing = False
+
+
+class TimedSerializerMixin:
+    """
+    Counts a serializer's to_representation() towards the request's
+    serializer time. Put it first in the bases of response serializers.
+    """
+
+    def to_representation(self, instance):
+        return time_serializer(super().to_representation, instance)
+
+
+def view_label(view_func, method):
+    """
+    'OrderViewSet.place_order' for viewset actions, else the view's name
+    """
+    # DRF views carry .cls, Django class-based views .view_class
+    cls = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if cls is None:
+        return getattr(view_func, '__name__', type(view_func).__name__)
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        method = method.lower()
+        # DRF answers HEAD with the GET action
+        action = actions.get(method) or (actions.get('get') if method == 'head' else None)
+        return f'{cls.__name__}.{action or method}'
+    return cls.__name__
+
+
+class MetricsMiddleware:
+    """
+    Samples METRICS_SAMPLE_RATE of requests (0 to 1) into `registry`.
+    Put it first in MIDDLEWARE so the latency covers the whole stack.
+    Runs natively in both sync (WSGI) and async (ASGI) middleware chains.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, 'METRICS_SAMPLE_RATE', 1.0))
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self._count(request, self.get_response(request))
+
+        with self._sampling() as sample:
+            response = self.get_response(request)
+        return self._record(request, response, sample)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return self._count(request, await self.get_response(request))
+
+        with self._sampling() as sample:
+            response = await self.get_response(request)
+        return self._record(request, response, sample)
+
+    def _sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    @contextmanager
+    def _sampling(self):
+        sample = Sample()
+        token = _current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            with execute_wrapper(sample):
+                yield sample
+        finally:
+            _current_sample.reset(token)
+            sample.elapsed = time.perf_counter() - started
+
+    def _count(self, request, response):
+        registry.incr('http_requests_total', self._counter_labels(request, response))
+        return response
+
+    def _record(self, request, response, sample):
+        labels = (getattr(request, 'metrics_view', 'unresolved'), request.method)
+        self._count(request, response)
+        registry.observe('http_request_duration_seconds', labels, sample.elapsed)
+        registry.observe('http_request_db_queries', labels, sample.queries)
+        registry.observe('http_request_db_duration_seconds', labels, sample.db_seconds)
+        registry.observe('http_request_serializer_duration_seconds', labels, sample.serializer_seconds)
+        size = 0 if response.streaming else len(response.content)
+        registry.observe('http_response_size_bytes', labels, size)
+        flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_label(view_func, request.method)
+
+    def _counter_labels(self, request, response):
+        return (getattr(request, 'metrics_view', 'unresolved'), request.method, str(response.status_code))
@@ -0,0 +1,41 @@
+"""
+Async-capable stand-ins for third-party middleware that only runs sync.
+
+One sync-only middleware anywhere in MIDDLEWARE makes Django run everything
+inside it in a worker thread under ASGI. Async views then still cost a
+thread hop per request. Every middleware in the stack must support both
+modes.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise (sync-only up to 6.x) that also runs in an async chain.
+    The static file lookup is a dict hit; only serving a file uses a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
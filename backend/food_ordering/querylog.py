@@ -0,0 +1,210 @@
+"""
+Slow-query log and N+1 detection.
+
+``QueryInspector`` is a database execute_wrapper. It times every query and
+groups queries by fingerprint: the SQL with literals, placeholders and IN
+lists collapsed, so ``... WHERE id = 7`` and ``... WHERE id = 8`` count as the
+same statement. It then
+
+- logs queries slower than SQL_SLOW_QUERY_MS to the ``food_ordering.sql``
+  logger, with the view and the stack frame they came from
+- flags a request that runs one fingerprint more than SQL_REPEAT_THRESHOLD
+  times (an N+1): logged, or raised as ``RepeatedQueryError`` when
+  SQL_REPEAT_RAISE is on, which it is by default under ``manage.py test``
+
+``QueryInspectionMiddleware`` wraps every request in one; use the class
+directly as a context manager around anything else, e.g. in a test:
+
+    with QueryInspector(repeat_threshold=3, raise_on_repeat=True):
+        ...
+"""
+
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import ExitStack
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.fields import Field
+
+from . import metrics
+
+logger = logging.getLogger('food_ordering.sql')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w".])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|%\(\w+\)s|\?')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_VALUES_RE = re.compile(r'(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+')
+_SPACE_RE = re.compile(r'\s+')
+
+# Transaction control, which every atomic() block repeats
+_IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK', 'BEGIN', 'COMMIT')
+
+# Frames never reported as the origin of a query
+_INSTRUMENTATION = {os.path.abspath(__file__), os.path.abspath(metrics.__file__)}
+_SITE_PACKAGES = f'site-packages{os.sep}'
+_ORM_DIR = f'{os.sep}django{os.sep}db{os.sep}'
+
+
+class RepeatedQueryError(Exception):
+    """
+    One request ran the same SQL fingerprint more than the threshold allows
+    """
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """
+    `sql` with values removed: literals and placeholders become ?, lists of
+    them (IN, VALUES rows) become (...), whitespace is collapsed
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    sql = _VALUES_RE.sub(r'\1', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _where(frame, filename):
+    base_dir = str(settings.BASE_DIR)
+    if filename.startswith(base_dir) and _SITE_PACKAGES not in filename:
+        filename = os.path.relpath(filename, base_dir)
+    elif _SITE_PACKAGES in filename:
+        filename = filename.split(_SITE_PACKAGES, 1)[1]
+    return f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+
+
+def origin():
+    """
+    Where the current query came from: the innermost frame in project code,
+    else the innermost one outside the ORM. Queries run while a serializer
+    field is read also name the field, e.g. MenuCategorySerializer.restaurant_name.
+    """
+    base_dir = str(settings.BASE_DIR)
+    project = fallback = field = None
+    frame = sys._getframe(1)
+    # Frames outside the request (the server, or a test client) don't count
+    while frame is not None and project is None and frame.f_code not in _REQUEST_BOUNDARIES:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename not in _INSTRUMENTATION:
+            owner = frame.f_locals.get('self')
+            if field is None and isinstance(owner, Field) and owner.parent is not None:
+                field = f'{type(owner.parent).__name__}.{owner.field_name}'
+            if filename.startswith(base_dir) and _SITE_PACKAGES not in filename:
+                project = _where(frame, filename)
+            elif fallback is None and _ORM_DIR not in filename:
+                fallback = _where(frame, filename)
+        frame = frame.f_back
+
+    location = project or fallback or 'unknown'
+    return f'{location} ({field})' if field else location
+
+
+class QueryInspector:
+    """
+    Execute wrapper that logs slow queries and flags repeated fingerprints
+    for one unit of work (a request, or a `with` block on every connection).
+    Arguments default to the SQL_* settings.
+    """
+
+    def __init__(self, view='unknown', slow_query_ms=None, repeat_threshold=None, raise_on_repeat=None):
+        self.view = view
+        self.slow_query_ms = settings.SQL_SLOW_QUERY_MS if slow_query_ms is None else slow_query_ms
+        self.repeat_threshold = (
+            settings.SQL_REPEAT_THRESHOLD if repeat_threshold is None else repeat_threshold
+        )
+        self.raise_on_repeat = settings.SQL_REPEAT_RAISE if raise_on_repeat is None else raise_on_repeat
+        self.counts = {}
+        # fingerprint -> where its first repeat past the threshold came from
+        self.repeated = {}
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        self.record(sql, (time.perf_counter() - started) * 1000)
+        return result
+
+    def record(self, sql, elapsed_ms):
+        key = fingerprint(sql)
+        if elapsed_ms >= self.slow_query_ms:
+            metrics.registry.incr('sql_slow_queries_total', (self.view,))
+            logger.warning(
+                'Slow query (%.1f ms) in %s at %s: %s', elapsed_ms, self.view, origin(), key
+            )
+
+        if key.startswith(_IGNORED_PREFIXES):
+            return
+        count = self.counts[key] = self.counts.get(key, 0) + 1
+        if count == self.repeat_threshold + 1:
+            self.repeated[key] = origin()
+            if self.raise_on_repeat:
+                raise RepeatedQueryError(self.describe(key, count))
+
+    def describe(self, key, count=None):
+        count = self.counts[key] if count is None else count
+        return (
+            f'{self.view} ran the same query {count} times '
+            f'(threshold {self.repeat_threshold}), first repeat at {self.repeated[key]}: {key}'
+        )
+
+    def report(self):
+        """
+        Log every fingerprint that went past the threshold
+        """
+        for key in self.repeated:
+            metrics.registry.incr('sql_repeated_queries_total', (self.view,))
+            logger.warning('Possible N+1: %s', self.describe(key))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        self._stack.enter_context(metrics.execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
+        self.report()
+
+
+class QueryInspectionMiddleware:
+    """
+    Runs each request under a QueryInspector labelled with its view
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        inspector = QueryInspector()
+        request.query_inspector = inspector
+        with inspector:
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        inspector = QueryInspector()
+        request.query_inspector = inspector
+        with inspector:
+            return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_inspector.view = metrics.view_label(view_func, request.method)
+
+
+_REQUEST_BOUNDARIES = {
+    QueryInspectionMiddleware.__call__.__code__,
+    QueryInspectionMiddleware.__acall__.__code__,
+}
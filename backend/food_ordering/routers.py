@@ -0,0 +1,167 @@
+"""
+Read-replica routing.
+
+With DATABASE_REPLICA_URLS set, settings.py adds each replica as a database
+alias (``replica_1``, ...) listed in DATABASE_REPLICAS. Writes always go to
+``default``, the primary. Reads go to a replica only where that is known to
+be safe:
+
+- ``ReplicaRoutingMiddleware`` allows it for GET/HEAD/OPTIONS requests,
+  unless the same client (same Authorization header or session) wrote
+  something in the last DATABASE_REPLICA_PIN_SECONDS, so users always read
+  their own writes (place_order, then my_orders)
+- ``replica_reads()`` allows it around any other block of code
+
+Everything else reads from the primary: management commands, unsafe
+requests, every read after the first write of a request, and reads inside
+a transaction on the primary. A request uses one replica throughout.
+"""
+
+import contextvars
+import hashlib
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import cache as app_cache
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """
+    Where reads go for the current request or block: `replica` is an alias,
+    or None for the primary
+    """
+
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing', default=None)
+
+
+def pick_replica():
+    replicas = settings.DATABASE_REPLICAS
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def replica_reads(replica=None):
+    """
+    Send reads in this block to a replica (`replica`, or a random one)
+    """
+    token = _state.set(RoutingState(replica or pick_replica()))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """
+    Send reads in this block to the primary, even inside replica_reads()
+    """
+    token = _state.set(RoutingState(None))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # select_for_update() and read-modify-write need the primary
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Read the rest of the request from where it was written
+            state.replica = None
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def pin_key(request):
+    """
+    Cache key identifying the client behind `request`, or None for
+    anonymous requests. Hashed so no credential ends up in the cache.
+    """
+    identity = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not identity:
+        return None
+    return 'db-pin:' + hashlib.sha256(identity.encode()).hexdigest()[:32]
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Reads from a replica for safe requests of clients that haven't written
+    recently; after a request that writes, pins its client to the primary
+    for DATABASE_REPLICA_PIN_SECONDS
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with self._routing(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with self._routing(request):
+            return await self.get_response(request)
+
+    @contextmanager
+    def _routing(self, request):
+        key = pin_key(request)
+        replica = None
+        # Pins are read from the shared tier only: a local copy could
+        # outlive a pin set, or expired, in another process
+        if request.method in SAFE_METHODS and not (key and app_cache.shared().get(key)):
+            replica = pick_replica()
+
+        state = RoutingState(replica)
+        token = _state.set(state)
+        try:
+            yield
+        finally:
+            _state.reset(token)
+
+        if state.wrote and key:
+            app_cache.shared().set(key, True, timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
@@ -0,0 +1,95 @@
+"""
+A minimal in-process scheduler for periodic housekeeping.
+
+``every(seconds, name, func)`` runs ``func`` on a daemon thread every
+``seconds``. Every worker process may start the same task; a slot in the
+shared cache tier, claimed with ``add()`` and left to expire after one
+interval, makes sure only one of them runs it per interval. A crash in
+``func`` is logged and the task carries on at the next interval.
+
+Apps register tasks with ``every()`` from ``AppConfig.ready()``, behind a
+setting that is off by default. Registered tasks only start running once
+``start()`` is called, which the WSGI and ASGI entry points do: ``migrate``,
+``shell``, tests and other management commands load the apps but never
+start a thread.
+"""
+
+import logging
+import threading
+
+from django.db import connections
+
+from . import cache as app_cache
+
+logger = logging.getLogger('food_ordering.scheduler')
+
+_lock = threading.Lock()
+_tasks = {}
+_started = False
+
+
+class PeriodicTask:
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.loop, name=f'scheduler:{name}', daemon=True)
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            self.run_once()
+            # Threads outside a request don't get Django's connection cleanup
+            connections.close_all()
+
+    def run_once(self):
+        """
+        Run the task unless another process already ran it this interval.
+        Returns whether it ran here.
+        """
+        if not app_cache.shared().add(f'scheduler:{self.name}', 1, timeout=self.interval):
+            return False
+        try:
+            self.func()
+        except Exception:
+            logger.exception('Scheduled task %s failed', self.name)
+        return True
+
+    def stop(self):
+        self.stopped.set()
+
+
+def every(seconds, name, func):
+    """
+    Run `func` every `seconds` in this process (once per name), from
+    start() on
+    """
+    with _lock:
+        if name not in _tasks:
+            task = _tasks[name] = PeriodicTask(name, seconds, func)
+            if _started:
+                task.thread.start()
+        return _tasks[name]
+
+
+def start():
+    """
+    Start the registered tasks in this process. Called by the server entry
+    points (food_ordering/wsgi.py and asgi.py).
+    """
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+        for task in _tasks.values():
+            task.thread.start()
+
+
+def stop_all():
+    global _started
+    with _lock:
+        for task in _tasks.values():
+            task.stop()
+        _tasks.clear()
+        _started = False
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 from decouple import config  # Added for environment variables
@@ -18,6 +19,9 @@ from decouple import config  # Added for environment variables
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Running under `manage.py test`
+TESTING = sys.argv[1:2] == ['test']
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -50,8 +54,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'food_ordering.metrics.MetricsMiddleware',  # Request metrics, served at /api/metrics/
+    'food_ordering.querylog.QueryInspectionMiddleware',  # Slow-query log and N+1 detection
+    'food_ordering.routers.ReplicaRoutingMiddleware',  # Safe requests read from replicas
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Added for static files in production
+    'food_ordering.middleware.WhiteNoiseMiddleware',  # Static files in production (async-capable WhiteNoise)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Added to support CORS
     'django.middleware.common.CommonMiddleware',
@@ -98,6 +105,114 @@ else:
         }
     }
 
+# Read replicas (food_ordering/routers.py): comma-separated database URLs,
+# added as 'replica_1', 'replica_2', ... Safe requests read from them; a
+# client that wrote reads from the primary for DATABASE_REPLICA_PIN_SECONDS.
+# Locally, two SQLite files work: DATABASE_REPLICA_URLS=sqlite:////path/replica.sqlite3,
+# refreshed from the primary with `python manage.py sync_replicas`.
+DATABASE_REPLICA_URLS = [url.strip() for url in config('DATABASE_REPLICA_URLS', default='').split(',') if url.strip()]
+if DATABASE_REPLICA_URLS:
+    import dj_database_url
+    DATABASES.update({
+        f'replica_{number}': {**dj_database_url.parse(url), 'TEST': {'MIRROR': 'default'}}
+        for number, url in enumerate(DATABASE_REPLICA_URLS, start=1)
+    })
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith('replica_')]
+
+# Country shards (food_ordering/sharding.py): COUNTRY=url pairs, comma-separated,
+# e.g. INDIA=postgres://...,AMERICA=postgres://..., added as 'shard_india', ...
+# Restaurants, menus, orders and payment methods live in their country's shard;
+# users stay on default and are mirrored into every shard. Run
+# `python manage.py prepare_shards` after setting it, and after bulk-loading users.
+DATABASE_SHARD_URLS = dict(
+    (country.strip().upper(), url.strip())
+    for country, url in (
+        pair.split('=', 1) for pair in config('DATABASE_SHARD_URLS', default='').split(',') if pair.strip()
+    )
+)
+if DATABASE_SHARD_URLS:
+    import dj_database_url
+    DATABASES.update({
+        f'shard_{country.lower()}': dj_database_url.parse(url)
+        for country, url in DATABASE_SHARD_URLS.items()
+    })
+DATABASE_SHARDS = {country: f'shard_{country.lower()}' for country in DATABASE_SHARD_URLS}
+
+DATABASE_ROUTERS = ['food_ordering.sharding.CountryShardRouter', 'food_ordering.routers.ReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = config('DATABASE_REPLICA_PIN_SECONDS', default=5, cast=int)
+
+
+# Cache
+# Two tiers: a small per-process LRU (food_ordering.cache.TwoTierCache) in front
+# of a shared backend. Set CACHE_URL=redis://host:6379/0 in production; without
+# it the shared tier is a per-process LocMemCache stand-in (dev and tests).
+
+CACHE_URL = config('CACHE_URL', default='')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'food_ordering.cache.TwoTierCache',
+        'OPTIONS': {
+            'SHARED_ALIAS': 'shared',
+            'LOCAL_MAX_ENTRIES': config('CACHE_LOCAL_MAX_ENTRIES', default=1000, cast=int),
+            'LOCAL_TIMEOUT': config('CACHE_LOCAL_TIMEOUT', default=5, cast=int),
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'food-ordering-shared',
+    },
+}
+
+
+# Order status event stream (/api/orders/events/)
+# InProcessBroker only reaches subscribers in the same process; use
+# orders.events.RedisBroker when running more than one worker.
+ORDER_EVENTS_BROKER = config('ORDER_EVENTS_BROKER', default='orders.events.InProcessBroker')
+ORDER_EVENTS_REDIS_URL = config('ORDER_EVENTS_REDIS_URL', default=CACHE_URL)
+
+
+# Request metrics (food_ordering/metrics.py, /api/metrics/)
+# METRICS_SAMPLE_RATE is the share of requests timed, 0 to 1; 0 turns the
+# middleware off. With several worker processes (gunicorn), point
+# METRICS_MULTIPROC_DIR at a directory they share and empty it on restart.
+METRICS_SAMPLE_RATE = config('METRICS_SAMPLE_RATE', default=1.0, cast=float)
+METRICS_MULTIPROC_DIR = config('METRICS_MULTIPROC_DIR', default='')
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=int)
+
+
+# Slow-query log and N+1 detection (food_ordering/querylog.py), logged to
+# the food_ordering.sql logger. A request running one SQL fingerprint more
+# than SQL_REPEAT_THRESHOLD times is flagged, and fails under manage.py test.
+SQL_SLOW_QUERY_MS = config('SQL_SLOW_QUERY_MS', default=200, cast=int)
+SQL_REPEAT_THRESHOLD = config('SQL_REPEAT_THRESHOLD', default=10, cast=int)
+SQL_REPEAT_RAISE = config('SQL_REPEAT_RAISE', default=TESTING, cast=bool)
+
+
+# Abandoned PENDING orders (orders/sweeper.py). With a non-zero
+# PENDING_ORDER_SWEEP_INTERVAL (seconds) each web process (wsgi.py or
+# asgi.py, never a management command) starts a scheduler thread; one of
+# them sweeps per interval, at most PENDING_ORDER_SWEEP_MAX_BATCHES batches
+# per database.
+# `manage.py sweep_pending_orders` does the same on demand.
+PENDING_ORDER_MAX_AGE_MINUTES = config('PENDING_ORDER_MAX_AGE_MINUTES', default=24 * 60, cast=int)
+PENDING_ORDER_SWEEP_ACTION = config('PENDING_ORDER_SWEEP_ACTION', default='cancel')
+PENDING_ORDER_SWEEP_INTERVAL = config('PENDING_ORDER_SWEEP_INTERVAL', default=0, cast=int)
+PENDING_ORDER_SWEEP_BATCH_SIZE = config('PENDING_ORDER_SWEEP_BATCH_SIZE', default=500, cast=int)
+PENDING_ORDER_SWEEP_MAX_BATCHES = config('PENDING_ORDER_SWEEP_MAX_BATCHES', default=20, cast=int)
+
+# Order archival (orders/archive.py): DELIVERED and CANCELLED orders older
+# than ORDER_ARCHIVE_AFTER_DAYS move to monthly archive tables. Scheduled
+# like the sweep above with a non-zero ORDER_ARCHIVE_INTERVAL (seconds);
+# `manage.py archive_orders` runs it on demand.
+ORDER_ARCHIVE_AFTER_DAYS = config('ORDER_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+ORDER_ARCHIVE_INTERVAL = config('ORDER_ARCHIVE_INTERVAL', default=0, cast=int)
+ORDER_ARCHIVE_BATCH_SIZE = config('ORDER_ARCHIVE_BATCH_SIZE', default=500, cast=int)
+ORDER_ARCHIVE_MAX_BATCHES = config('ORDER_ARCHIVE_MAX_BATCHES', default=20, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -163,7 +278,7 @@ CORS_ALLOW_CREDENTIALS = True
 # REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
@@ -212,6 +327,13 @@ LOGGING = {
         'handlers': ['console'],
         'level': 'INFO',
     },
+    'loggers': {
+        'food_ordering.sql': {
+            'handlers': ['console'],
+            'level': config('SQL_LOG_LEVEL', default='WARNING'),
+            'propagate': False,
+        },
+    },
 }
 
 # Static files storage for production
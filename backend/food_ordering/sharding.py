@@ -0,0 +1,489 @@
+"""
+Country sharding.
+
+With DATABASE_SHARD_URLS set (``INDIA=postgres://...,AMERICA=postgres://...``),
+settings.py adds one database alias per country (``shard_india``, ...),
+mapped in DATABASE_SHARDS. Restaurants, menus, orders and payment methods
+(SHARDED_APPS) then live in their country's shard. Everything else stays on
+``default``. Users are mirrored into every shard, so the sharded rows keep
+their foreign keys and joins to users inside one database.
+
+``CountryShardRouter`` picks the shard of each query:
+
+- a sharded instance being saved, or whose relations are followed, names its
+  own shard: the one it was read from, else the one for its ``country``.
+  A user names their home shard: their country's, else the first shard.
+- other queries go to the shard selected for the request.
+  ``ShardRoutingMixin`` (part of CountryFilterMixin) selects the requesting
+  user's home shard. On writes, admins may pick another one with the
+  ``country`` in the body.
+- ``for_country()`` and ``using_shard()`` select one around any other code.
+
+Admins read across shards. ``scatter()`` turns their querysets into a
+``ShardedQuerySet``, which runs on every shard and merges the rows in the
+queryset's order. Filtering, ordering and page-number or cursor pagination
+work unchanged. A lookup by primary key goes straight to one shard: each
+shard hands out ids from its own range, SHARD_ID_STRIDE apart, so an id
+names its shard. ``manage.py prepare_shards`` sets up the ranges and copies
+users into the shards.
+"""
+
+import contextvars
+import copy
+import heapq
+import itertools
+import types
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import QuerySet
+from django.db.models.fields import AutoFieldMixin
+
+SHARDED_APPS = ('restaurants', 'orders', 'payments')
+
+# Shard n (from 1, in DATABASE_SHARDS order) hands out ids from n * SHARD_ID_STRIDE
+SHARD_ID_STRIDE = 10 ** 12
+
+
+class ShardNotSelected(Exception):
+    """
+    A sharded model was queried with no instance to route by and no shard
+    selected for the request or block
+    """
+
+
+class ShardState:
+    """
+    The shard unhinted queries go to for the current request or block
+    """
+
+    __slots__ = ('alias',)
+
+    def __init__(self, alias):
+        self.alias = alias
+
+
+_state = contextvars.ContextVar('db_shard', default=None)
+
+
+def is_enabled():
+    return bool(settings.DATABASE_SHARDS)
+
+
+def is_sharded(model):
+    return is_enabled() and model._meta.app_label in SHARDED_APPS
+
+
+def sharded_models():
+    for app_label in SHARDED_APPS:
+        yield from apps.get_app_config(app_label).get_models()
+
+
+def shard_for_country(country):
+    try:
+        return settings.DATABASE_SHARDS[country]
+    except KeyError:
+        raise ShardNotSelected(f'No shard for country {country!r}') from None
+
+
+def home_shard(user):
+    """
+    The shard holding `user`'s payment methods: their country's, else the first
+    """
+    shards = settings.DATABASE_SHARDS
+    return shards.get(user.country) or next(iter(shards.values()))
+
+
+def id_range(alias):
+    """
+    (first, last + 1) of the ids `alias` hands out
+    """
+    number = list(settings.DATABASE_SHARDS.values()).index(alias) + 1
+    return number * SHARD_ID_STRIDE, (number + 1) * SHARD_ID_STRIDE
+
+
+def shard_for_pk(pk):
+    """
+    The shard that handed out `pk`, or None if it is outside every range
+    """
+    try:
+        number = int(pk) // SHARD_ID_STRIDE
+    except (TypeError, ValueError):
+        return None
+    aliases = list(settings.DATABASE_SHARDS.values())
+    return aliases[number - 1] if 1 <= number <= len(aliases) else None
+
+
+def shards_for(pks):
+    """
+    The shards that handed out `pks`, each once
+    """
+    return list(dict.fromkeys(alias for alias in map(shard_for_pk, pks) if alias))
+
+
+@contextmanager
+def using_shard(alias=None):
+    """
+    Send unhinted queries on sharded models in this block to `alias`.
+    Without one, select_shard() can pick it later in the block.
+    """
+    token = _state.set(ShardState(alias))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+def for_country(country):
+    return using_shard(shard_for_country(country))
+
+
+def select_shard(alias):
+    """
+    Switch the current request or block to `alias`. No-op outside using_shard().
+    """
+    state = _state.get()
+    if state is not None:
+        state.alias = alias
+
+
+def selected_shard():
+    state = _state.get()
+    return None if state is None else state.alias
+
+
+def instance_shard(instance):
+    """
+    The shard `instance` routes queries to, or None
+    """
+    shards = settings.DATABASE_SHARDS
+    db = instance._state.db
+    if instance._meta.app_label in SHARDED_APPS:
+        # Stored rows stay where they were read from; new ones go by country
+        if not instance._state.adding and db in shards.values():
+            return db
+        country = getattr(instance, 'country', None)
+        if country in shards:
+            return shards[country]
+        return db if db in shards.values() else None
+    if isinstance(instance, get_user_model()):
+        return home_shard(instance)
+    return None
+
+
+class CountryShardRouter:
+    def _shard(self, model, hints):
+        if not is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        alias = instance_shard(instance) if instance is not None else None
+        alias = alias or selected_shard()
+        if alias is None:
+            raise ShardNotSelected(
+                f'No shard selected for {model._meta.label}; '
+                f'run it under for_country() or using_shard()'
+            )
+        return alias
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Users are mirrored into every shard
+        pool = {DEFAULT_DB_ALIAS, *settings.DATABASE_SHARDS.values()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+
+def mirror_users(alias, users):
+    """
+    Insert or update copies of `users` in shard `alias`
+    """
+    User = get_user_model()
+    fields = [field.name for field in User._meta.concrete_fields if not field.primary_key]
+    # bulk_create marks what it saves as stored in `alias`; the originals stay on default
+    User._base_manager.using(alias).bulk_create(
+        [copy.copy(user) for user in users],
+        update_conflicts=True, unique_fields=['id'], update_fields=fields,
+    )
+
+
+def start_id_range(alias):
+    """
+    Make every sharded table in `alias` hand out ids from its range
+    """
+    connection = connections[alias]
+    start = id_range(alias)[0]
+    with connection.cursor() as cursor:
+        for model in sharded_models():
+            if not isinstance(model._meta.pk, AutoFieldMixin):
+                # Ids copied from elsewhere (ArchivedOrder, the archive tables)
+                continue
+            table, column = model._meta.db_table, model._meta.pk.column
+            if connection.vendor == 'sqlite':
+                # The next AUTOINCREMENT id is sqlite_sequence.seq + 1
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s AND seq < %s', [table, start - 1])
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                    'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                    [table, start - 1, table]
+                )
+            elif connection.vendor == 'postgresql':
+                quoted = connection.ops.quote_name(table)
+                cursor.execute(
+                    f'SELECT setval(pg_get_serial_sequence(%s, %s), '
+                    f'GREATEST(%s, (SELECT COALESCE(MAX({connection.ops.quote_name(column)}), 0) + 1 FROM {quoted})), false)',
+                    [table, column, start]
+                )
+            else:
+                raise NotImplementedError(f'No id ranges for {connection.vendor} shards')
+
+
+def scatter(queryset, aliases=None):
+    """
+    `queryset` run on every shard, or on those in `aliases`, as a
+    ShardedQuerySet. Returned unchanged when the model isn't sharded.
+    """
+    if not is_sharded(queryset.model):
+        return queryset
+    if aliases is None:
+        aliases = settings.DATABASE_SHARDS.values()
+    return ShardedQuerySet({alias: queryset.using(alias) for alias in aliases})
+
+
+def _sort_value(value):
+    # NULLs sort as larger than any value, as PostgreSQL does
+    return (value is None, value)
+
+
+class _Descending:
+    """
+    A sort value that orders in reverse, for descending keys of a merge
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+class ShardedQuerySet:
+    """
+    One queryset per shard, read as a single queryset.
+
+    Chaining (filter, order_by, values_list, ...) applies to every shard.
+    count() adds up and exists() checks any shard. Iterating and slicing
+    merge the rows in the queryset's order; iterator() merges them as the
+    shards stream them. A slice [a:b] reads the first b
+    rows of each shard, so deep pages cost more than with one database;
+    cursor pagination doesn't have that problem. get() by primary key asks only
+    the shard that owns the id. It also selects that shard for the rest of the
+    request, so the object's own queries go there.
+
+    The querysets needn't be on different shards: orders/archive.py merges
+    the orders table with its monthly archive tables the same way.
+
+    Methods of custom QuerySet classes, such as OrderQuerySet.transition, run
+    once with the ShardedQuerySet as `self`. Built from the operations above,
+    they gather across shards too.
+    """
+
+    def __init__(self, querysets):
+        self.querysets = querysets
+
+    @property
+    def _first(self):
+        return next(iter(self.querysets.values()))
+
+    @property
+    def model(self):
+        return self._first.model
+
+    @property
+    def query(self):
+        # Read-only: e.g. query.order_by, which is the same on every shard
+        return self._first.query
+
+    @property
+    def db(self):
+        return self._first.db
+
+    @property
+    def ordered(self):
+        return self._first.ordered
+
+    def _each(self, method, *args, **kwargs):
+        results = {
+            alias: getattr(queryset, method)(*args, **kwargs)
+            for alias, queryset in self.querysets.items()
+        }
+        values = list(results.values())
+        if all(isinstance(value, QuerySet) for value in values):
+            return ShardedQuerySet(results)
+        if all(isinstance(value, bool) for value in values):
+            return any(values)
+        if all(isinstance(value, int) for value in values):
+            return sum(values)
+        raise TypeError(f'{method}() has no scatter-gather form; call it on .querysets')
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attribute = getattr(type(self._first), name, None)
+        if not callable(attribute):
+            raise AttributeError(f'{type(self).__name__} has no attribute {name!r}')
+        if not hasattr(QuerySet, name):
+            return types.MethodType(attribute, self)
+        return lambda *args, **kwargs: self._each(name, *args, **kwargs)
+
+    def count(self):
+        return self._each('count')
+
+    def exists(self):
+        return self._each('exists')
+
+    def values_list(self, *fields, **kwargs):
+        """
+        Named rows also carry any ordering column missing from `fields`,
+        after them, so the shards' rows can be merged
+        """
+        if kwargs.get('named') and fields:
+            pk_name = self.model._meta.pk.attname
+            names = [pk_name if name == 'pk' else name for name, _ in self._order_keys() or []]
+            fields += tuple(name for name in names if name not in fields)
+        return self._each('values_list', *fields, **kwargs)
+
+    def _order_keys(self):
+        """
+        [(name, descending), ...] of the queryset's ordering, or None if it
+        can't be applied to fetched rows (expressions, random order)
+        """
+        query = self._first.query
+        ordering = query.order_by or (self.model._meta.ordering if query.default_ordering else ())
+        keys = []
+        for name in ordering:
+            if not isinstance(name, str) or name == '?':
+                return None
+            keys.append((name.lstrip('-'), name.startswith('-')))
+        return keys
+
+    def _value(self, row, name):
+        opts = self.model._meta
+        if name == 'pk':
+            name = opts.pk.attname
+        if isinstance(row, dict):
+            return row[name]
+        if isinstance(row, tuple):
+            return getattr(row, name)
+        if '__' not in name:
+            try:
+                # Compare foreign keys by id
+                name = opts.get_field(name).attname
+            except FieldDoesNotExist:
+                pass
+            return getattr(row, name)
+        for part in name.split('__'):
+            row = getattr(row, part)
+            if row is None:
+                break
+        return row
+
+    def _merge(self, results, strict):
+        rows = list(itertools.chain.from_iterable(results))
+        keys = self._order_keys()
+        try:
+            if keys is None:
+                raise TypeError('unsupported ordering')
+            # Stable sorts, least significant key first
+            for name, descending in reversed(keys):
+                rows.sort(key=lambda row: _sort_value(self._value(row, name)), reverse=descending)
+        except (AttributeError, KeyError, TypeError) as error:
+            if strict:
+                raise TypeError(f'Cannot merge {self.model.__name__} rows across shards: {error}') from error
+        return rows
+
+    def __iter__(self):
+        return iter(self._merge([list(queryset) for queryset in self.querysets.values()], strict=False))
+
+    def __len__(self):
+        return sum(len(queryset) for queryset in self.querysets.values())
+
+    def __bool__(self):
+        return self.exists()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            rows = self[key:key + 1]
+            if not rows:
+                raise IndexError('ShardedQuerySet index out of range')
+            return rows[0]
+        start = key.start or 0
+        if key.stop is None or key.step is not None or start < 0 or key.stop < 0:
+            raise TypeError('ShardedQuerySet slices need a non-negative start and stop, and no step')
+        rows = self._merge([list(queryset[:key.stop]) for queryset in self.querysets.values()], strict=True)
+        return rows[start:key.stop]
+
+    def iterator(self, chunk_size=None):
+        """
+        The merged rows, read lazily: each shard streams through its own
+        iterator(chunk_size) and heapq.merge holds one row per shard, so
+        memory stays bounded as with QuerySet.iterator()
+        """
+        streams = [queryset.iterator(chunk_size=chunk_size) for queryset in self.querysets.values()]
+        keys = self._order_keys()
+        if keys is None:
+            # Unordered anyway, as __iter__ leaves it
+            return itertools.chain.from_iterable(streams)
+
+        def sort_key(row):
+            values = [_sort_value(self._value(row, name)) for name, _ in keys]
+            return tuple(_Descending(value) if descending else value
+                         for value, (_, descending) in zip(values, keys))
+        return heapq.merge(*streams, key=sort_key)
+
+    def first(self):
+        rows = self[:1]
+        return rows[0] if rows else None
+
+    def in_bulk(self, *args, **kwargs):
+        found = {}
+        for queryset in self.querysets.values():
+            found.update(queryset.in_bulk(*args, **kwargs))
+        return found
+
+    def get(self, *args, **kwargs):
+        pk = kwargs.get('pk', kwargs.get(self.model._meta.pk.attname))
+        alias = shard_for_pk(pk) if pk is not None else None
+        if alias in self.querysets:
+            querysets = [self.querysets[alias]]
+        else:
+            querysets = self.querysets.values()
+
+        found = []
+        for queryset in querysets:
+            try:
+                found.append(queryset.get(*args, **kwargs))
+            except self.model.DoesNotExist:
+                pass
+        if not found:
+            raise self.model.DoesNotExist(f'{self.model._meta.object_name} matching query does not exist.')
+        if len(found) > 1:
+            raise self.model.MultipleObjectsReturned(
+                f'get() returned more than one {self.model._meta.object_name} across shards'
+            )
+
+        select_shard(found[0]._state.db)
+        return found[0]
@@ -2,9 +2,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+
+from users.permissions import IsAdmin
+from . import cache as app_cache
+from . import metrics
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -48,21 +52,62 @@ def api_root(request):
             'place_order': '/api/orders/{id}/place_order/',
             'cancel_order': '/api/orders/{id}/cancel/',
             'update_order_status': '/api/orders/{id}/update_status/',
+            'bulk_update_order_status': '/api/orders/bulk_update_status/',
+            'export_orders': '/api/orders/export/',
+            'order_events': '/api/orders/events/',
+            'order_events_ticket': '/api/orders/events/ticket/',
+            'cart': '/api/cart/',
+            'cart_items': '/api/cart/items/',
+            'cart_item': '/api/cart/items/{menu_item_id}/',
+            'cart_checkout': '/api/cart/checkout/',
+            
+            # Native async read paths (same responses, for ASGI deployments)
+            'async_restaurants': '/api/async/restaurants/',
+            'async_restaurant': '/api/async/restaurants/{id}/',
+            'async_restaurant_menu': '/api/async/restaurants/{id}/menu/',
+            'async_menu_items': '/api/async/menu-items/',
+            'async_my_orders': '/api/async/orders/my_orders/',
             
             # Payments
             'payment_methods': '/api/payment-methods/',
             'my_payment_methods': '/api/payment-methods/my_payment_methods/',
             'set_default_payment': '/api/payment-methods/{id}/set_default/',
+
+            # Monitoring
+            'cache_stats': '/api/cache/stats/',
+            'metrics': '/api/metrics/',
         }
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def cache_stats(request):
+    """
+    Cache hit/miss counters for the process serving this request (Admin only)
+    """
+    return Response(app_cache.stats.snapshot())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+@renderer_classes([metrics.PrometheusRenderer])
+def metrics_view(request):
+    """
+    Request and cache metrics in the Prometheus text format, added up over
+    every worker process when METRICS_MULTIPROC_DIR is set (Admin only)
+    """
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 urlpatterns = [
     # Admin
     path('admin/', admin.site.urls),
     
     # API Root
     path('api/', api_root, name='api-root'),
+    path('api/cache/stats/', cache_stats, name='cache-stats'),
+    path('api/metrics/', metrics_view, name='metrics'),
     
     # App URLs
     path('api/', include('users.urls')),
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'food_ordering.settings')
 
 application = get_wsgi_application()
+
+# Periodic housekeeping (the sweep, archiving) runs in server processes only
+from food_ordering import scheduler  # noqa: E402
+
+scheduler.start()
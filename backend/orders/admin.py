@@ -15,6 +15,10 @@ class OrderItemInline(admin.TabularInline):
         return obj.menu_item.name
     menu_item_name.short_description = 'Menu Item'
     
+    def get_queryset(self, request):
+        # menu_item_name reads the menu item of every row
+        return super().get_queryset(request).select_related('menu_item')
+    
     def has_add_permission(self, request, obj=None):
         return False
     
@@ -27,4 +31,7 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'restaurant', 'status', 'total_amount', 'created_at']
     list_filter = ['status', 'country', 'created_at']
     search_fields = ['user__username', 'restaurant__name']
+    # Plain <select>s would list every user/restaurant/payment method, and
+    # PaymentMethod.__str__ reads each one's user
+    raw_id_fields = ['user', 'restaurant', 'payment_method']
     inlines = [OrderItemInline]
\ No newline at end of file
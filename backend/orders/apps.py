@@ -1,8 +1,29 @@
 from django.apps import AppConfig
 
+
+def _sync_archive_tables(using, **kwargs):
+    # The archive tables aren't managed by migrations; follow any change
+    # the migrations made to the orders tables
+    from .archive import sync_tables
+    sync_tables(using)
+
+
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
     
     def ready(self):
-        import orders.admin  # Force import admin
\ No newline at end of file
+        import orders.admin  # Force import admin
+
+        from django.db.models.signals import post_migrate
+        post_migrate.connect(_sync_archive_tables, sender=self)
+
+        from django.conf import settings
+        if settings.PENDING_ORDER_SWEEP_INTERVAL:
+            from food_ordering import scheduler
+            from .sweeper import scheduled_sweep
+            scheduler.every(settings.PENDING_ORDER_SWEEP_INTERVAL, 'sweep_pending_orders', scheduled_sweep)
+        if settings.ORDER_ARCHIVE_INTERVAL:
+            from food_ordering import scheduler
+            from .archive import scheduled_archive
+            scheduler.every(settings.ORDER_ARCHIVE_INTERVAL, 'archive_orders', scheduled_archive)
\ No newline at end of file
@@ -0,0 +1,356 @@
+# orders/archive.py
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models import Q, Value
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order, OrderItem
+from .sweeper import order_databases
+from food_ordering import cache as app_cache
+from food_ordering import sharding
+
+# Orders in these statuses never change again
+ARCHIVE_STATUSES = ('DELIVERED', 'CANCELLED')
+
+# Invalidated by every archive run: the archive months cached per user
+ARCHIVE_TAG = 'orders:archive'
+
+# The archive_month of rows read from the orders table
+LIVE = Value(None, output_field=models.PositiveIntegerField())
+
+# Table names of the archive: the month is YYYYMM
+ARCHIVE_TABLE = re.compile(r'^(?:orders|order_items)_archive_(\d{6})$')
+
+logger = logging.getLogger(__name__)
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+@dataclass
+class ArchiveResult:
+    database: str
+    archived: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.archived / self.seconds if self.seconds else 0.0
+
+
+def month_of(created_at):
+    """
+    The archive month (YYYYMM, in UTC) of an order created at `created_at`
+    """
+    created_at = created_at.astimezone(dt_timezone.utc)
+    return created_at.year * 100 + created_at.month
+
+
+def _archive_field(field, **changes):
+    _, _, args, kwargs = field.deconstruct()
+    kwargs.update(changes)
+    return field.__class__(*args, **kwargs)
+
+
+def _archive_relation(field, **changes):
+    # Joins (restaurant__name, menu_item__price) still work; nothing
+    # enforces or cascades into the archive
+    return _archive_field(
+        field, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', **changes
+    )
+
+
+def _model(name, table, fields, **meta):
+    meta = type('Meta', (), {'app_label': 'orders', 'db_table': table, 'managed': False, **meta})
+    return type(name, (models.Model,), {'__module__': __name__, 'Meta': meta, **fields})
+
+
+def _build_models(month):
+    order_fields = {}
+    for field in Order._meta.concrete_fields:
+        if field.primary_key:
+            order_fields[field.name] = models.BigIntegerField(primary_key=True)
+        elif field.is_relation:
+            order_fields[field.name] = _archive_relation(field, db_index=False)
+        else:
+            order_fields[field.name] = _archive_field(field)
+    order_model = _model(
+        f'ArchivedOrder{month}', f'orders_archive_{month}', order_fields,
+        ordering=Order._meta.ordering,
+        # my_orders, newest first
+        indexes=[models.Index(fields=['user', '-created_at', '-id'], name=f'oa_{month}_user_idx')],
+    )
+
+    item_fields = {}
+    for field in OrderItem._meta.concrete_fields:
+        if field.primary_key:
+            item_fields[field.name] = models.BigIntegerField(primary_key=True)
+        elif field.name == 'order':
+            item_fields['order'] = models.ForeignKey(
+                order_model, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+            )
+        elif field.is_relation:
+            item_fields[field.name] = _archive_relation(field, db_index=False)
+        else:
+            item_fields[field.name] = _archive_field(field)
+    item_model = _model(f'ArchivedOrderItem{month}', f'order_items_archive_{month}', item_fields)
+    return order_model, item_model
+
+
+def archive_models(month):
+    """
+    (order model, item model) of the archive tables for `month`:
+    orders_archive_YYYYMM and order_items_archive_YYYYMM. They have the
+    columns of Order and OrderItem and are unmanaged; ensure_tables()
+    creates them when the first order of the month is archived.
+    """
+    with _models_lock:
+        if month not in _models:
+            _models[month] = _build_models(month)
+        return _models[month]
+
+
+def ensure_tables(month, using):
+    """
+    Create the archive tables of `month` in `using` if they don't exist yet.
+    Runs DDL, so not inside a transaction on SQLite.
+    """
+    connection = connections[using]
+    existing = set(connection.introspection.table_names())
+    missing = [model for model in archive_models(month) if model._meta.db_table not in existing]
+    if missing:
+        with connection.schema_editor() as editor:
+            for model in missing:
+                editor.create_model(model)
+
+
+def sync_tables(using):
+    """
+    Bring the archive tables in `using` in line with the current Order and
+    OrderItem columns: add the columns they lack (nullable, since archived
+    rows have no value for them) and drop those the live tables no longer
+    have. Run after every migrate (OrdersConfig.ready), so a migration of
+    Order or OrderItem doesn't break archiving or archive reads.
+
+    Only the column set is compared. A renamed column looks like a dropped
+    and an added one, so its archived values need a data migration of their
+    own first.
+    """
+    connection = connections[using]
+    tables = set(connection.introspection.table_names())
+    months = sorted({int(match.group(1)) for match in map(ARCHIVE_TABLE.match, tables) if match})
+    quote = connection.ops.quote_name
+    for month in months:
+        for model in archive_models(month):
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            with connection.cursor() as cursor:
+                existing = {column.name for column in connection.introspection.get_table_description(cursor, table)}
+            fields = {field.column: field for field in model._meta.local_fields}
+            added = [field for column, field in fields.items() if column not in existing]
+            dropped = sorted(existing - fields.keys())
+            if not added and not dropped:
+                continue
+
+            logger.info('Syncing archive table %s: adding %s, dropping %s',
+                        table, [field.column for field in added], dropped)
+            with connection.schema_editor() as editor:
+                for field in added:
+                    column = _archive_field(field, null=True)
+                    column.set_attributes_from_name(field.name)
+                    column.model = model
+                    editor.add_field(model, column)
+                for column in dropped:
+                    editor.execute(f'ALTER TABLE {quote(table)} DROP COLUMN {quote(column)}')
+
+
+def month_orders(month, using):
+    """
+    The orders archived in `month` in `using`, rows marked with the month
+    """
+    return archive_models(month)[0].objects.using(using).annotate(
+        archive_month=Value(month, output_field=models.PositiveIntegerField())
+    )
+
+
+def archived_months(user, using):
+    """
+    The months in which `user` has archived orders in `using`, newest
+    first. Cached until the next archive run.
+    """
+    return app_cache.get_or_set(
+        f'orders:archive:months:{using}:{user.pk}',
+        lambda: list(
+            ArchivedOrder.objects.using(using).filter(user=user)
+            .order_by('-month').values_list('month', flat=True).distinct()
+        ),
+        tags=[ARCHIVE_TAG]
+    )
+
+
+def with_archived(queryset, user):
+    """
+    `queryset` (orders of `user`, plain or a ShardedQuerySet) together with
+    `user`'s archived orders, read as one queryset.
+
+    Each archive month the user has orders in is queried next to the orders
+    table, and the rows are merged in order the way a ShardedQuerySet merges
+    shards, so filtering, ordering and both paginations keep working. Rows
+    carry `archive_month`: None for live orders, else the month whose tables
+    hold the order and its items. Returned unchanged when nothing of the
+    user's is archived.
+    """
+    live = queryset.querysets if isinstance(queryset, sharding.ShardedQuerySet) else {queryset.db: queryset}
+    parts = {}
+    for alias, orders in live.items():
+        parts[alias] = orders.annotate(archive_month=LIVE)
+        for month in archived_months(user, alias):
+            parts[alias, month] = month_orders(month, alias).filter(user=user)
+    if len(parts) == len(live):
+        return queryset
+    return sharding.ShardedQuerySet(parts)
+
+
+def find_archived(pk):
+    """
+    The ArchivedOrder for order `pk`, or None. With country shards it is
+    looked up in the shard that handed out the id.
+    """
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    index = ArchivedOrder.objects.filter(pk=pk)
+    if sharding.is_enabled():
+        alias = sharding.shard_for_pk(pk)
+        if alias is None:
+            return None
+        index = index.using(alias)
+    return index.first()
+
+
+def archived_order(index):
+    """
+    The archived order `index` (an ArchivedOrder) points to, as a queryset
+    of its archive table
+    """
+    return month_orders(index.month, index._state.db).filter(pk=index.pk)
+
+
+def stale_terminal(using, status, cutoff):
+    """
+    Orders in `status` created before `cutoff`, oldest first: a range scan
+    of orders_status_created_idx
+    """
+    return Order.objects.using(using).filter(status=status, created_at__lt=cutoff).order_by('created_at', 'id')
+
+
+def archive_orders(older_than, batch_size=500, max_batches=None, using=DEFAULT_DB_ALIAS):
+    """
+    Move DELIVERED and CANCELLED orders in `using` created more than
+    `older_than` (a timedelta) ago, with their items, into the monthly
+    archive tables, `batch_size` orders at a time.
+
+    Each batch reads the next (created_at, id) keys of one status, then in
+    one transaction copies the orders and their items with INSERT ...
+    SELECT into their month's tables, records them in ArchivedOrder and
+    deletes them from the orders tables. No model instances are loaded.
+    Those statuses are final, so nothing else writes the rows meanwhile.
+    """
+    cutoff = timezone.now() - older_than
+    result = ArchiveResult(using)
+    started = time.perf_counter()
+    months = set()
+    for status in ARCHIVE_STATUSES:
+        last = None
+        while max_batches is None or result.batches < max_batches:
+            batch = stale_terminal(using, status, cutoff)
+            if last is not None:
+                batch = batch.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+            rows = list(batch.values_list('created_at', 'id', 'user_id', 'country')[:batch_size])
+            if not rows:
+                break
+
+            last = rows[-1][:2]
+            for month in {month_of(created_at) for created_at, _, _, _ in rows} - months:
+                ensure_tables(month, using)
+                months.add(month)
+            result.archived += _archive_batch(using, status, rows)
+            result.batches += 1
+
+    if result.archived:
+        app_cache.invalidate_tags(ARCHIVE_TAG)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def scheduled_archive():
+    """
+    The scheduler's task (OrdersConfig.ready): one bounded archive run over
+    every database, as the ORDER_ARCHIVE_* settings describe
+    """
+    for database in order_databases():
+        result = archive_orders(
+            timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS),
+            batch_size=settings.ORDER_ARCHIVE_BATCH_SIZE,
+            max_batches=settings.ORDER_ARCHIVE_MAX_BATCHES,
+            using=database,
+        )
+        if result.archived:
+            logger.info(
+                'Archived %d orders from %s in %.2fs (%.0f rows/s)',
+                result.archived, database, result.seconds, result.rows_per_second
+            )
+
+
+def _copy_rows(cursor, connection, source, target, column, ids):
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in source._meta.concrete_fields)
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(
+        f'INSERT INTO {quote(target._meta.db_table)} ({columns}) '
+        f'SELECT {columns} FROM {quote(source._meta.db_table)} WHERE {quote(column)} IN ({placeholders})',
+        ids
+    )
+
+
+def _delete_rows(cursor, connection, model, column, ids):
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(
+        f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(column)} IN ({placeholders})',
+        ids
+    )
+
+
+def _archive_batch(using, status, rows):
+    by_month = {}
+    for created_at, order_id, _, _ in rows:
+        by_month.setdefault(month_of(created_at), []).append(order_id)
+    ids = [order_id for _, order_id, _, _ in rows]
+
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            for month, month_ids in by_month.items():
+                order_model, item_model = archive_models(month)
+                _copy_rows(cursor, connection, Order, order_model, 'id', month_ids)
+                _copy_rows(cursor, connection, OrderItem, item_model, 'order_id', month_ids)
+        ArchivedOrder.objects.using(using).bulk_create([
+            ArchivedOrder(id=order_id, user_id=user_id, country=country, status=status, month=month_of(created_at))
+            for created_at, order_id, user_id, country in rows
+        ])
+        # Items first, so the orders' DELETE has nothing left to cascade to
+        with connection.cursor() as cursor:
+            _delete_rows(cursor, connection, OrderItem, 'order_id', ids)
+            _delete_rows(cursor, connection, Order, 'id', ids)
+    return len(ids)
@@ -0,0 +1,253 @@
+# orders/cart.py
+import time
+from contextlib import contextmanager, nullcontext
+from decimal import Decimal
+
+from rest_framework.exceptions import ValidationError
+
+from .models import Order
+from .serializers import MAX_LINE_QUANTITY, save_order
+from food_ordering import cache as app_cache
+from food_ordering import sharding
+from restaurants.models import MenuItem
+
+# An untouched cart is dropped after a week
+CART_TIMEOUT = 60 * 60 * 24 * 7
+# How long one cart edit holds the cart, and how long the next one waits
+CART_LOCK_TIMEOUT = 5
+CART_LOCK_WAIT = 2.0
+CART_LOCK_POLL_INTERVAL = 0.05
+
+
+class CartBusy(Exception):
+    """
+    Another request is editing the same cart
+    """
+
+
+class CartChanged(Exception):
+    """
+    Menu prices changed since the items went into the cart. The cart now
+    holds the new prices; checking out again accepts them.
+    """
+
+
+def _on_shard(country):
+    return sharding.for_country(country) if sharding.is_enabled() else nullcontext()
+
+
+class Cart:
+    """
+    A user's basket, kept in the shared cache tier instead of as a PENDING
+    order: edits and abandoned carts never touch the database, and
+    checkout() writes a CONFIRMED order and its items in one transaction.
+
+    A cart holds items from one restaurant. Each line remembers the price
+    the item had when it was added, so checkout can tell the user about a
+    price change instead of silently charging the new price.
+
+    Edit it inside `with cart.locked():`, which serialises concurrent
+    requests for the same user across processes.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.key = f'cart:{user.pk}'
+        self.data = self.empty()
+
+    @staticmethod
+    def empty():
+        return {'restaurant': None, 'country': None, 'lines': {}}
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the cart for one edit, re-reading it once the lock is ours
+        """
+        store = app_cache.shared()
+        lock_key = f'{self.key}:lock'
+        deadline = time.monotonic() + CART_LOCK_WAIT
+        while not store.add(lock_key, 1, timeout=CART_LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                raise CartBusy
+            time.sleep(CART_LOCK_POLL_INTERVAL)
+        try:
+            self.load()
+            yield self
+        finally:
+            store.delete(lock_key)
+
+    def load(self):
+        self.data = app_cache.shared().get(self.key) or self.empty()
+        return self
+
+    def save(self):
+        if self.data['lines']:
+            app_cache.shared().set(self.key, self.data, timeout=CART_TIMEOUT)
+        else:
+            self.clear()
+
+    def clear(self):
+        self.data = self.empty()
+        app_cache.shared().delete(self.key)
+
+    # Reading the menu ------------------------------------------------------
+
+    def menu_items(self, ids=None):
+        """
+        MenuItems for `ids` (default: the cart's lines) with their
+        restaurants, in one query on the shard that holds them
+        """
+        ids = list(self.data['lines'] if ids is None else ids)
+        if not ids:
+            return {}
+        country = self.data['country']
+        if sharding.is_enabled() and country is None:
+            # The first item decides the cart's country; its id says where it lives
+            alias = sharding.shard_for_pk(ids[0])
+            if alias is None:
+                return {}
+            shard = sharding.using_shard(alias)
+        else:
+            shard = _on_shard(country)
+        with shard:
+            return MenuItem.objects.select_related('restaurant').in_bulk(ids)
+
+    def visible(self, menu_item):
+        """
+        Whether the user may order `menu_item` (CountryFilterMixin's rule)
+        """
+        return self.user.role == 'admin' or menu_item.country == self.user.country
+
+    # Editing -----------------------------------------------------------------
+
+    def add(self, menu_item_id, quantity=1, special_instructions=''):
+        """
+        Put `quantity` of a menu item in the cart (on top of any already there)
+        """
+        menu_item = self.menu_items([menu_item_id]).get(menu_item_id)
+        if menu_item is None or not self.visible(menu_item):
+            raise ValidationError({'menu_item': [f'Invalid pk "{menu_item_id}" - object does not exist.']})
+        if not menu_item.is_available:
+            raise ValidationError({'menu_item': [f'{menu_item.name} is not available right now.']})
+        if self.data['lines'] and menu_item.restaurant_id != self.data['restaurant']:
+            raise ValidationError({'menu_item': [
+                'Your cart holds items from another restaurant. Check out or empty it first.'
+            ]})
+
+        self.data['restaurant'] = menu_item.restaurant_id
+        self.data['country'] = menu_item.country
+        line = self.data['lines'].setdefault(menu_item_id, {'quantity': 0, 'special_instructions': ''})
+        if line['quantity'] + quantity > MAX_LINE_QUANTITY:
+            raise ValidationError({'quantity': [f'At most {MAX_LINE_QUANTITY} of one item per order.']})
+        line['quantity'] += quantity
+        line['price'] = str(menu_item.price)
+        if special_instructions:
+            line['special_instructions'] = special_instructions
+        self.save()
+
+    def update(self, menu_item_id, quantity, special_instructions=None):
+        """
+        Set a line's quantity; 0 removes it
+        """
+        line = self._line(menu_item_id)
+        if quantity == 0:
+            return self.remove(menu_item_id)
+        line['quantity'] = quantity
+        if special_instructions is not None:
+            line['special_instructions'] = special_instructions
+        self.save()
+
+    def remove(self, menu_item_id):
+        self._line(menu_item_id)
+        del self.data['lines'][menu_item_id]
+        self.save()
+
+    def _line(self, menu_item_id):
+        try:
+            return self.data['lines'][menu_item_id]
+        except KeyError:
+            raise ValidationError({'menu_item': [f'Menu item {menu_item_id} is not in your cart.']})
+
+    # Output and checkout -------------------------------------------------------
+
+    def to_representation(self, menu_items=None):
+        """
+        The cart at today's menu prices. `price_changed` and `available`
+        flag the lines checkout would stop at.
+        """
+        if menu_items is None:
+            menu_items = self.menu_items()
+        restaurant = next((menu_item.restaurant for menu_item in menu_items.values()), None)
+
+        items = []
+        total = Decimal('0.00')
+        for menu_item_id, line in self.data['lines'].items():
+            menu_item = menu_items.get(menu_item_id)
+            price = menu_item.price if menu_item else Decimal(line['price'])
+            subtotal = price * line['quantity']
+            if menu_item is not None and menu_item.is_available:
+                total += subtotal
+            items.append({
+                'menu_item': menu_item_id,
+                'menu_item_name': menu_item.name if menu_item else None,
+                'quantity': line['quantity'],
+                'price': str(price),
+                'subtotal': str(subtotal),
+                'special_instructions': line['special_instructions'],
+                'available': bool(menu_item and menu_item.is_available),
+                'price_changed': price != Decimal(line['price']),
+            })
+
+        return {
+            'restaurant': self.data['restaurant'],
+            'restaurant_name': restaurant.name if restaurant else None,
+            'country': self.data['country'],
+            'items': items,
+            'total_amount': str(total),
+        }
+
+    def checkout(self, **order_fields):
+        """
+        Write the cart as a CONFIRMED order with its items, in one
+        transaction, and empty the cart. `order_fields` are the validated
+        delivery_address, payment_method and special_instructions.
+        Raises CartChanged if a price moved since it was added.
+        """
+        if not self.data['lines']:
+            raise ValidationError({'items': ['Your cart is empty.']})
+
+        menu_items = self.menu_items()
+        unavailable = [
+            str(menu_item_id) for menu_item_id in self.data['lines']
+            if menu_item_id not in menu_items or not menu_items[menu_item_id].is_available
+        ]
+        if unavailable:
+            raise ValidationError({'items': [
+                f'No longer available: menu item(s) {", ".join(unavailable)}. Remove them to check out.'
+            ]})
+
+        changed = False
+        for menu_item_id, line in self.data['lines'].items():
+            price = str(menu_items[menu_item_id].price)
+            if Decimal(price) != Decimal(line['price']):
+                line['price'] = price
+                changed = True
+        if changed:
+            self.save()
+            raise CartChanged
+
+        restaurant = next(iter(menu_items.values())).restaurant
+        with _on_shard(self.data['country']):
+            order = save_order(
+                Order(
+                    user=self.user, restaurant=restaurant, country=restaurant.country,
+                    status='CONFIRMED', **order_fields
+                ),
+                [
+                    (menu_items[menu_item_id], line['quantity'], line['special_instructions'])
+                    for menu_item_id, line in self.data['lines'].items()
+                ]
+            )
+        self.clear()
+        return order
@@ -0,0 +1,207 @@
+# orders/events.py
+"""
+Order status event fan-out for the /api/orders/events/ stream.
+
+Status changes are published to three channels: the order's user
+(``user:<id>``), its country (``country:<COUNTRY>``) and ``all``. The broker
+is chosen with settings.ORDER_EVENTS_BROKER:
+
+- ``orders.events.InProcessBroker`` (default) only reaches subscribers in
+  the same process. Fine for tests and a single ASGI worker.
+- ``orders.events.RedisBroker`` uses Redis pub/sub so every worker on every
+  node sees every event.
+
+Browsers' EventSource can't send an Authorization header, so the stream
+also accepts ``?ticket=``: a random, single-use value from
+``issue_stream_ticket`` that expires after STREAM_TICKET_TIMEOUT seconds.
+Unlike a JWT in the query string, a ticket found in an access log is of no
+use to anyone.
+"""
+import asyncio
+import json
+import secrets
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from food_ordering import cache as app_cache
+
+# Seconds a stream ticket may wait to be redeemed
+STREAM_TICKET_TIMEOUT = 30
+
+
+def issue_stream_ticket(user):
+    """
+    A new single-use ticket that opens the event stream as `user`
+    """
+    ticket = secrets.token_urlsafe(32)
+    app_cache.shared().set(f'order-events:ticket:{ticket}', user.id, timeout=STREAM_TICKET_TIMEOUT)
+    return ticket
+
+
+def redeem_stream_ticket(ticket):
+    """
+    The user id `ticket` was issued for, or None if it is unknown, expired
+    or already used
+    """
+    key = f'order-events:ticket:{ticket}'
+    user_id = app_cache.shared().get(key)
+    # Only the caller whose delete removes it gets to use it
+    if user_id is None or not app_cache.shared().delete(key):
+        return None
+    return user_id
+
+
+def channels_for_order(order):
+    return [f'user:{order.user_id}', f'country:{order.country}', 'all']
+
+
+def channels_for_user(user):
+    """
+    Which channels a user may listen to: admins everything, managers their
+    country, members their own orders
+    """
+    if user.role == 'admin':
+        return ['all']
+    if user.role == 'manager':
+        return [f'country:{user.country}']
+    return [f'user:{user.id}']
+
+
+class BaseBroker:
+    def publish(self, channels, message):
+        """
+        Send `message` (a str) to every subscriber of any of `channels`.
+        Called from sync code; must not block on slow subscribers.
+        """
+        raise NotImplementedError
+
+    async def listen(self, channels, heartbeat):
+        """
+        Async generator of messages for `channels`. Yields None whenever
+        `heartbeat` seconds pass without a message.
+        """
+        raise NotImplementedError
+        yield
+
+
+class InProcessBroker(BaseBroker):
+    """
+    Fan-out to asyncio queues living in this process
+    """
+    # Events are dropped for a subscriber that falls this far behind
+    max_queue_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channels, message):
+        with self._lock:
+            targets = set()
+            for channel in channels:
+                targets.update(self._subscribers.get(channel, ()))
+
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, message)
+            except RuntimeError:
+                # Subscriber's event loop already closed
+                pass
+
+    @staticmethod
+    def _put(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    async def listen(self, channels, heartbeat):
+        queue = asyncio.Queue(maxsize=self.max_queue_size)
+        subscriber = (asyncio.get_running_loop(), queue)
+
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscriber)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                for channel in channels:
+                    subscribers = self._subscribers.get(channel)
+                    if subscribers is not None:
+                        subscribers.discard(subscriber)
+                        if not subscribers:
+                            del self._subscribers[channel]
+
+
+class RedisBroker(BaseBroker):
+    """
+    Redis pub/sub broker for multi-process / multi-node deployments.
+    Connects to settings.ORDER_EVENTS_REDIS_URL.
+    """
+    channel_prefix = 'order-events:'
+
+    def __init__(self):
+        import redis
+        import redis.asyncio
+
+        self._url = settings.ORDER_EVENTS_REDIS_URL
+        self._client = redis.Redis.from_url(self._url)
+        self._async_redis = redis.asyncio
+
+    def publish(self, channels, message):
+        with self._client.pipeline(transaction=False) as pipe:
+            for channel in channels:
+                pipe.publish(self.channel_prefix + channel, message)
+            pipe.execute()
+
+    async def listen(self, channels, heartbeat):
+        client = self._async_redis.Redis.from_url(self._url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(*[self.channel_prefix + channel for channel in channels])
+        try:
+            while True:
+                message = await pubsub.get_message(timeout=heartbeat)
+                if message is None:
+                    yield None
+                else:
+                    yield message['data'].decode('utf-8')
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.ORDER_EVENTS_BROKER)()
+    return _broker
+
+
+def publish_status_change(order, previous_status):
+    """
+    Announce an order's new status once the surrounding transaction commits
+    """
+    message = json.dumps({
+        'order_id': order.id,
+        'status': order.status,
+        'previous_status': previous_status,
+        'country': order.country,
+        'user_id': order.user_id,
+        'updated_at': order.updated_at.isoformat() if order.updated_at else None,
+    })
+    channels = channels_for_order(order)
+    transaction.on_commit(lambda: get_broker().publish(channels, message), using=order._state.db)
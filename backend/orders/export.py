@@ -0,0 +1,150 @@
+# orders/export.py
+import csv
+import io
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+
+from .models import Order
+from .serializers import OrderItemValuesSerializer, OrderValuesSerializer
+from food_ordering import sharding
+
+# Rows per fetch from the database cursor, and orders per chunk of output
+EXPORT_CHUNK_SIZE = 2000
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Lets ?format= and the Accept header pick an OrderViewSet.export format.
+    The export streams its own body; only error responses are rendered
+    here, as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode(self.charset)
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class OrderExport:
+    """
+    Orders and their items read in one pass: orders LEFT JOIN order_items
+    (plus users, restaurants and menu items for the names), ordered so each
+    order's lines arrive together, through a server-side cursor. Memory
+    holds one chunk of rows whatever the size of the export.
+
+    Each order renders through OrderValuesSerializer and its lines through
+    OrderItemValuesSerializer, so an NDJSON line is the order as the API
+    returns it. A CSV row is one item, with its order's columns repeated;
+    an order without items gets one row with the item columns empty.
+
+    With country shards the shards are exported one after the other, each
+    in the requested order.
+    """
+
+    def __init__(self, queryset, context=None):
+        # Every order field but 'items', which come from the same rows
+        self.order_serializer = OrderValuesSerializer(context, fields=OrderValuesSerializer.fields)
+        self.item_serializer = OrderItemValuesSerializer(context)
+        self.width = len(self.order_serializer.lookups)
+        self.id_column = self.order_serializer.lookups.index('id')
+        self.item_id_column = self.width + self.item_serializer.lookups.index('id')
+
+        if isinstance(queryset, sharding.ShardedQuerySet):
+            querysets = list(queryset.querysets.values())
+        else:
+            # Streaming outlives the request's replica or shard routing
+            querysets = [queryset.using(queryset.db)]
+        self.querysets = [self.joined(queryset) for queryset in querysets]
+
+    def joined(self, queryset):
+        ordering = queryset.query.order_by or Order._meta.ordering
+        item_lookups = [f'items__{lookup}' for lookup in self.item_serializer.lookups]
+        return (
+            self.order_serializer.values(queryset)
+            .values_list(*self.order_serializer.lookups, *item_lookups)
+            .order_by(*ordering, 'id', 'items__id')
+        )
+
+    def rows(self):
+        for queryset in self.querysets:
+            yield from queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    def chunks(self):
+        """
+        Lists of (order, [items]) representations, EXPORT_CHUNK_SIZE orders each
+        """
+        groups = itertools.groupby(self.rows(), key=lambda row: row[self.id_column])
+        while True:
+            orders = [list(rows) for _, rows in itertools.islice(groups, EXPORT_CHUNK_SIZE)]
+            if not orders:
+                return
+
+            order_rows = [rows[0][:self.width] for rows in orders]
+            item_rows = [
+                [row[self.width:] for row in rows if row[self.item_id_column] is not None]
+                for rows in orders
+            ]
+            items = iter(self.item_serializer.to_representation(itertools.chain.from_iterable(item_rows)))
+            yield [
+                (order, list(itertools.islice(items, len(lines))))
+                for order, lines in zip(self.order_serializer.to_representation(order_rows), item_rows)
+            ]
+
+    def ndjson(self):
+        for chunk in self.chunks():
+            yield ''.join(json.dumps({**order, 'items': items}) + '\n' for order, items in chunk)
+
+    def csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        item_fields = [name for name, _, _ in self.item_serializer.plan]
+        writer.writerow(
+            [name for name, _, _ in self.order_serializer.plan] + [f'item_{name}' for name in item_fields]
+        )
+        empty = [None] * len(item_fields)
+        for chunk in self.chunks():
+            for order, items in chunk:
+                for item in items or [None]:
+                    writer.writerow([*order.values(), *(item.values() if item else empty)])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def response(self, request, export_format):
+        """
+        The export as a streaming download. Under ASGI the body is an async
+        iterator that pulls one chunk at a time from a worker thread; Django
+        would otherwise read a sync iterator to the end before sending.
+        """
+        content = self.csv() if export_format == 'csv' else self.ndjson()
+        if isinstance(request, ASGIRequest):
+            content = _in_thread(content)
+
+        renderer = CSVRenderer if export_format == 'csv' else NDJSONRenderer
+        response = StreamingHttpResponse(content, content_type=f'{renderer.media_type}; charset=utf-8')
+        response['Content-Disposition'] = (
+            f'attachment; filename="orders-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"'
+        )
+        return response
+
+
+async def _in_thread(iterator):
+    # The request's sync thread, where the cursor and its connection live
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(iterator, None)) is not None:
+        yield chunk
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_orderitem_special_instructions_alter_order_country'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created_at', '-id'], name='orders_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['country', '-created_at', '-id'], name='orders_country_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='orders_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_keyset_indexes'),
+        ('payments', '0001_initial'),
+        ('restaurants', '0003_hot_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['country', 'status', '-created_at'], name='orders_country_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-created_at'], name='orders_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_hot_filter_indexes'),
+        ('payments', '0001_initial'),
+        ('restaurants', '0006_dietary_flags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['created_at', 'id'], name='orders_pending_created_idx'),
+        ),
+    ]
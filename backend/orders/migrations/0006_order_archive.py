@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_pending_orders_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('country', models.CharField(choices=[('INDIA', 'India'), ('AMERICA', 'America')], max_length=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('CONFIRMED', 'Confirmed'), ('PREPARING', 'Preparing'), ('OUT_FOR_DELIVERY', 'Out for Delivery'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('month', models.PositiveIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'orders_archive_index',
+                'indexes': [models.Index(fields=['user', 'month'], name='orders_archive_user_month_idx')],
+            },
+        ),
+    ]
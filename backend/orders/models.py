@@ -3,6 +3,26 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
+from .events import publish_status_change
+
+
+class OrderQuerySet(models.QuerySet):
+    def transition(self, new_status, from_statuses=None, updated_at=None):
+        """
+        Move every order in this queryset whose current status allows it to
+        `new_status`, in one conditional UPDATE. Optionally narrow the
+        allowed source statuses with `from_statuses`.
+        Returns the number of orders that changed.
+        """
+        sources = Order.statuses_leading_to(new_status)
+        if from_statuses is not None:
+            sources = [source for source in sources if source in from_statuses]
+        return self.filter(status__in=sources).update(
+            status=new_status,
+            updated_at=updated_at or timezone.now()
+        )
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
@@ -18,6 +38,17 @@ class Order(models.Model):
         ('AMERICA', 'America'),
     ]
 
+    # Which statuses an order may move to from each status.
+    # Every status change goes through OrderQuerySet.transition / transition_to.
+    ALLOWED_TRANSITIONS = {
+        'PENDING': ['CONFIRMED', 'CANCELLED'],
+        'CONFIRMED': ['PREPARING', 'CANCELLED'],
+        'PREPARING': ['OUT_FOR_DELIVERY', 'CANCELLED'],
+        'OUT_FOR_DELIVERY': ['DELIVERED', 'CANCELLED'],
+        'DELIVERED': [],
+        'CANCELLED': [],
+    }
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders')
     restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='orders')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
@@ -29,12 +60,55 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
     def __str__(self):
         return f"Order #{self.id} - {self.user.username} - {self.status}"
 
+    def transition_to(self, new_status, from_statuses=None):
+        """
+        Atomically move this order to `new_status` if the stored status
+        allows it: a single UPDATE ... WHERE id = ... AND status IN (...),
+        no read-modify-write. On success the instance is updated in memory
+        and the change is published; returns whether it applied.
+        """
+        stamp = timezone.now()
+        applied = Order.objects.using(self._state.db).filter(pk=self.pk).transition(
+            new_status, from_statuses=from_statuses, updated_at=stamp
+        ) == 1
+        if applied:
+            previous_status = self.status
+            self.status = new_status
+            self.updated_at = stamp
+            publish_status_change(self, previous_status)
+        return applied
+
+    @classmethod
+    def statuses_leading_to(cls, status):
+        """
+        Statuses from which an order may move to `status`
+        """
+        return [source for source, targets in cls.ALLOWED_TRANSITIONS.items() if status in targets]
+
     class Meta:
         db_table = 'orders'
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination (OrderKeysetPagination): admins, per country, per user
+            models.Index(fields=['-created_at', '-id'], name='orders_created_idx'),
+            models.Index(fields=['country', '-created_at', '-id'], name='orders_country_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_user_created_idx'),
+            # OrderViewSet ?status= filters, with and without CountryFilterMixin
+            models.Index(fields=['country', 'status', '-created_at'], name='orders_country_status_idx'),
+            models.Index(fields=['status', '-created_at'], name='orders_status_created_idx'),
+            # Stale PENDING orders, oldest first (orders/sweeper.py). Only
+            # PENDING rows are in it, so it stays small whatever the history
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(status='PENDING'),
+                name='orders_pending_created_idx',
+            ),
+        ]
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -51,4 +125,29 @@ class OrderItem(models.Model):
         return self.quantity * self.price
 
     class Meta:
-        db_table = 'order_items'
\ No newline at end of file
+        db_table = 'order_items'
+
+class ArchivedOrder(models.Model):
+    """
+    An order moved out of the orders table by orders/archive.py. The order
+    and its items now live in the archive tables of `month` (YYYYMM, from
+    created_at); this row says which, for retrieve and my_orders.
+    """
+    id = models.BigIntegerField(primary_key=True)  # The order's id
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    country = models.CharField(max_length=10, choices=Order.COUNTRY_CHOICES)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    month = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived order #{self.id} ({self.month})"
+
+    class Meta:
+        db_table = 'orders_archive_index'
+        indexes = [
+            # The months my_orders reads for a user
+            models.Index(fields=['user', 'month'], name='orders_archive_user_month_idx'),
+        ]
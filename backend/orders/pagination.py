@@ -0,0 +1,118 @@
+# orders/pagination.py
+from base64 import b64decode, b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class OrderKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over (created_at, id), newest first.
+
+    Each page is a range scan that seeks straight to the cursor position,
+    so there is no COUNT(*) and page 10,000 costs the same as page 1.
+    Matches the (country|user, -created_at, -id) indexes on Order.
+    The order is fixed, so ?ordering= is rejected rather than ignored.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering_query_param = api_settings.ORDERING_PARAM
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if request.query_params.get(self.ordering_query_param):
+            raise ValidationError({
+                self.ordering_query_param: 'Cursor pagination is always newest first; ordering is not supported.'
+            })
+        position = self.decode_cursor(request)
+
+        if position is None:
+            created_at, pk, reverse = None, None, False
+        else:
+            created_at, pk, reverse = position
+
+        if reverse:
+            queryset = queryset.order_by('created_at', 'id')
+            if created_at is not None:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+                )
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+            if created_at is not None:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                )
+
+        # Fetch one extra row to learn whether there's another page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor(last.created_at, last.id, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        first = self.page[0]
+        return self.encode_cursor(first.created_at, first.id, reverse=True)
+
+    def encode_cursor(self, created_at, pk, reverse):
+        token = f"{created_at.isoformat()}|{pk}|{int(reverse)}"
+        encoded = b64encode(token.encode('ascii')).decode('ascii')
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, encoded
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            token = b64decode(encoded.encode('ascii')).decode('ascii')
+            created_at, pk, reverse = token.split('|')
+            return datetime.fromisoformat(created_at), int(pk), bool(int(reverse))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
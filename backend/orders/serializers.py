@@ -1,14 +1,21 @@
 # orders/serializers.py
 from decimal import Decimal
 
-from django.db import transaction
+from django.db import router, transaction
 from rest_framework import serializers
 
+from . import archive
 from .models import Order, OrderItem
+from food_ordering import sharding
+from food_ordering.async_views import alist
+from food_ordering.metrics import TimedSerializerMixin
+from food_ordering.values_serializers import ValuesSerializer, decimal_converter
+from payments.models import PaymentMethod
+from restaurants.models import MenuItem
 from restaurants.serializers import MenuItemSerializer
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     menu_item_name = serializers.CharField(source='menu_item.name', read_only=True)
     menu_item_price = serializers.DecimalField(source='menu_item.price', max_digits=10, decimal_places=2, read_only=True)
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
@@ -19,13 +26,32 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'subtotal']
 
 
+class MenuItemIdField(serializers.PrimaryKeyRelatedField):
+    """
+    Accepts a menu item id without fetching it.
+    OrderCreateSerializer resolves every line's id in one query.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class OrderItemCreateSerializer(serializers.ModelSerializer):
+    menu_item = MenuItemIdField(queryset=MenuItem.objects.all())
+
     class Meta:
         model = OrderItem
         fields = ['menu_item', 'quantity', 'special_instructions']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Pass `fields` to render only some of the fields (OrderViewSet's ?fields=)
+    """
     items = OrderItemSerializer(many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     user_name = serializers.CharField(source='user.username', read_only=True)
@@ -38,48 +64,228 @@ class OrderSerializer(serializers.ModelSerializer):
             'country', 'total_amount', 'delivery_address', 'payment_method',
             'special_instructions', 'created_at', 'updated_at', 'items'
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'items']
+        # status only changes through the transition actions (Order.transition_to)
+        read_only_fields = ['id', 'user', 'status', 'created_at', 'updated_at', 'items']
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+# OrderItemSerializer.subtotal is a DecimalField(max_digits=10, decimal_places=2)
+_subtotal = decimal_converter(max_digits=10, decimal_places=2)
+
+
+class OrderItemValuesSerializer(ValuesSerializer):
+    """
+    Fast rendering of order lines, same output as OrderItemSerializer.
+    order_id rides along so OrderValuesSerializer can group the rows.
+    """
+    model = OrderItem
+    fields = OrderItemSerializer.Meta.fields
+    sources = {'menu_item_name': 'menu_item__name', 'menu_item_price': 'menu_item__price'}
+    computed = {
+        'subtotal': (('quantity', 'price'), lambda quantity, price: _subtotal(quantity * price)),
+    }
+
+    def __init__(self, context=None):
+        super().__init__(context)
+        self.order_column = self._column('order_id')
+
+
+class OrderValuesSerializer(ValuesSerializer):
+    """
+    Fast list rendering, same output as OrderSerializer.
+    The order lines for a whole page are read with one extra query (plus
+    one per archive month on the page), and only when 'items' is among the
+    requested fields.
+    """
+    model = Order
+    # 'items' is the last field and is filled in after the order columns
+    fields = [field for field in OrderSerializer.Meta.fields if field != 'items']
+    sources = {'user_name': 'user__username', 'restaurant_name': 'restaurant__name'}
+    displays = {'status_display': 'status'}
+
+    def __init__(self, context=None, fields=None):
+        super().__init__(context, fields)
+        self.include_items = fields is None or 'items' in fields
+        # Always selected: keyset pagination reads row.created_at / row.id,
+        # the lines are grouped by id, and read from the archive tables of
+        # row.archive_month for archived orders
+        self._column('id')
+        self._column('created_at')
+        self._column('archive_month')
+
+    def values(self, queryset):
+        # Archived orders (orders/archive.with_archived) carry their month already
+        if 'archive_month' not in queryset.query.annotations:
+            queryset = queryset.annotate(archive_month=archive.LIVE)
+        return super().values(queryset)
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        data = super().to_representation(rows)
+        if data and self.include_items:
+            item_serializer = OrderItemValuesSerializer(self.context)
+            item_rows = [row for items in self._item_rows(rows, item_serializer) for row in items]
+            self._attach_items(rows, data, item_serializer, item_rows)
+        return data
+
+    async def ato_representation(self, rows):
+        """
+        to_representation() for async views: the items come through the async ORM
+        """
+        rows = list(rows)
+        data = super().to_representation(rows)
+        if data and self.include_items:
+            item_serializer = OrderItemValuesSerializer(self.context)
+            item_rows = [row for items in self._item_rows(rows, item_serializer) for row in await alist(items)]
+            self._attach_items(rows, data, item_serializer, item_rows)
+        return data
+
+    def _item_rows(self, rows, item_serializer):
+        """
+        A queryset of the lines of `rows`: one for the live orders, and one
+        per archive month among them
+        """
+        order_ids = {}
+        for row in rows:
+            order_ids.setdefault(row.archive_month, []).append(row.id)
+
+        querysets = []
+        for month, ids in order_ids.items():
+            model = OrderItem if month is None else archive.archive_models(month)[1]
+            items = model.objects.filter(order_id__in=ids)
+            if sharding.is_enabled():
+                items = sharding.scatter(items, sharding.shards_for(ids))
+            querysets.append(item_serializer.values(items).order_by('order_id', 'id'))
+        return querysets
+
+    def _attach_items(self, rows, data, item_serializer, item_rows):
+        items_by_order = {}
+        for row, item in zip(item_rows, item_serializer.to_representation(item_rows)):
+            items_by_order.setdefault(row[item_serializer.order_column], []).append(item)
+
+        for row, order in zip(rows, data):
+            order['items'] = items_by_order.get(row.id, [])
 
 
-class OrderCreateSerializer(serializers.ModelSerializer):
+class OrderCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     items = OrderItemCreateSerializer(many=True)
 
     class Meta:
         model = Order
         fields = ['restaurant', 'country', 'delivery_address', 'payment_method', 'special_instructions', 'items']
+        # Always the restaurant's (see validate_restaurant)
+        read_only_fields = ['country']
+
+    def validate_restaurant(self, restaurant):
+        """
+        Managers and members order from restaurants in their own country;
+        others are reported like a restaurant that doesn't exist
+        """
+        user = self.context['request'].user
+        if user.role != 'admin' and restaurant.country != user.country:
+            raise serializers.ValidationError(f'Invalid pk "{restaurant.pk}" - object does not exist.')
+        return restaurant
+
+    def validate_items(self, items):
+        """
+        Swap menu item ids for MenuItem objects using a single query
+        """
+        menu_item_ids = {item_data['menu_item'] for item_data in items}
+        menu_items = MenuItem.objects.in_bulk(menu_item_ids)
+
+        missing = sorted(menu_item_ids - menu_items.keys())
+        if missing:
+            raise serializers.ValidationError(
+                f'Invalid pk "{missing[0]}" - object does not exist.'
+            )
+
+        for item_data in items:
+            item_data['menu_item'] = menu_items[item_data['menu_item']]
+        return items
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
+        return save_order(Order(**validated_data), [
+            (item_data['menu_item'], item_data.get('quantity', 1), item_data.get('special_instructions', ''))
+            for item_data in items_data
+        ])
 
-        # Calculate total FIRST before creating order
-        total = Decimal('0.00')
-        for item_data in items_data:
-            menu_item = item_data['menu_item']
-            quantity = item_data.get('quantity', 1)
-            price = menu_item.price
-            total += price * quantity
-
-        # Create order and items atomically
-        with transaction.atomic():
-            order = Order.objects.create(
-                **validated_data,
-                total_amount=total
+
+def save_order(order, lines):
+    """
+    Insert a new `order` and its lines, (menu_item, quantity,
+    special_instructions) tuples, in one transaction. Prices and the total
+    come from the MenuItem objects.
+    """
+    # Calculate total FIRST before creating order
+    order.total_amount = Decimal('0.00')
+    for menu_item, quantity, _ in lines:
+        order.total_amount += menu_item.price * quantity
+
+    # Create order and items atomically, in the database the order goes to
+    with transaction.atomic(using=router.db_for_write(Order, instance=order)):
+        order.save()
+
+        # Create order items in one INSERT
+        OrderItem.objects.using(order._state.db).bulk_create([
+            OrderItem(
+                order=order,
+                menu_item=menu_item,
+                quantity=quantity,
+                price=menu_item.price,
+                special_instructions=special_instructions
             )
+            for menu_item, quantity, special_instructions in lines
+        ])
+
+    return order
+
 
-            # Create order items
-            for item_data in items_data:
-                OrderItem.objects.create(
-                    order=order,
-                    menu_item=item_data['menu_item'],
-                    quantity=item_data.get('quantity', 1),
-                    price=item_data['menu_item'].price,
-                    special_instructions=item_data.get('special_instructions', '')
-                )
+# Most of one menu item a cart line (and so an order line) may hold
+MAX_LINE_QUANTITY = 99
 
-        return order
 
+class CartItemSerializer(serializers.Serializer):
+    menu_item = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_LINE_QUANTITY, default=1)
+    special_instructions = serializers.CharField(required=False, allow_blank=True, default='')
 
-class OrderStatusUpdateSerializer(serializers.ModelSerializer):
+
+class CartItemUpdateSerializer(serializers.Serializer):
+    # 0 removes the line
+    quantity = serializers.IntegerField(min_value=0, max_value=MAX_LINE_QUANTITY)
+    special_instructions = serializers.CharField(required=False, allow_blank=True)
+
+
+class CartCheckoutSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ['delivery_address', 'payment_method', 'special_instructions']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # Only the requesting user's own payment methods
+        fields['payment_method'].queryset = PaymentMethod.objects.filter(user=self.context['request'].user)
+        return fields
+
+
+class OrderStatusUpdateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['status']
+
+
+class OrderBulkStatusUpdateSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
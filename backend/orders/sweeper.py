@@ -0,0 +1,137 @@
+# orders/sweeper.py
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .events import publish_status_change
+from .models import Order, OrderItem
+from food_ordering import sharding
+
+ACTIONS = ('cancel', 'delete')
+
+logger = logging.getLogger(__name__)
+
+# status = 'PENDING' spelled out in the SQL: SQLite only uses a partial index
+# when the query repeats its WHERE clause literally, not as a bound parameter
+IS_PENDING = RawSQL('"status" = \'PENDING\'', (), output_field=BooleanField())
+
+
+@dataclass
+class SweepResult:
+    database: str
+    swept: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.swept / self.seconds if self.seconds else 0.0
+
+
+def order_databases():
+    """
+    Every database holding orders: each country shard, else the default
+    """
+    if sharding.is_enabled():
+        return list(settings.DATABASE_SHARDS.values())
+    return [DEFAULT_DB_ALIAS]
+
+
+def stale_pending(using, cutoff):
+    """
+    PENDING orders created before `cutoff`, oldest first: a range scan of
+    orders_pending_created_idx
+    """
+    return Order.objects.using(using).filter(IS_PENDING, created_at__lt=cutoff).order_by('created_at', 'id')
+
+
+def sweep_pending_orders(older_than, action='cancel', batch_size=500, max_batches=None, using=DEFAULT_DB_ALIAS):
+    """
+    Cancel (or delete, with their items) the PENDING orders in `using` that
+    are older than `older_than` (a timedelta), `batch_size` at a time.
+
+    Each batch reads the next (created_at, id) keys after the previous
+    batch's last one, then changes those rows with one conditional UPDATE
+    (cancel) or UPDATE plus two DELETEs (delete), in its own transaction.
+    No model instances are loaded. An order placed while the sweep runs is
+    no longer PENDING, so the UPDATE leaves it alone.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f'action must be one of {", ".join(ACTIONS)}')
+
+    cutoff = timezone.now() - older_than
+    result = SweepResult(using)
+    started = time.perf_counter()
+    last = None
+    while max_batches is None or result.batches < max_batches:
+        batch = stale_pending(using, cutoff)
+        if last is not None:
+            batch = batch.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+        rows = list(batch.values_list('created_at', 'id', 'user_id', 'country')[:batch_size])
+        if not rows:
+            break
+
+        last = rows[-1][:2]
+        result.swept += _sweep_batch(using, rows, action)
+        result.batches += 1
+
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def scheduled_sweep():
+    """
+    The scheduler's task (OrdersConfig.ready): one bounded sweep of every
+    database, as the PENDING_ORDER_* settings describe
+    """
+    for database in order_databases():
+        result = sweep_pending_orders(
+            timedelta(minutes=settings.PENDING_ORDER_MAX_AGE_MINUTES),
+            action=settings.PENDING_ORDER_SWEEP_ACTION,
+            batch_size=settings.PENDING_ORDER_SWEEP_BATCH_SIZE,
+            max_batches=settings.PENDING_ORDER_SWEEP_MAX_BATCHES,
+            using=database,
+        )
+        if result.swept:
+            logger.info(
+                'Swept %d stale PENDING orders from %s in %.2fs (%.0f rows/s)',
+                result.swept, database, result.seconds, result.rows_per_second
+            )
+
+
+def _sweep_batch(using, rows, action):
+    ids = [order_id for _, order_id, _, _ in rows]
+    stamp = timezone.now()
+    with transaction.atomic(using=using):
+        # Claims the rows: an order placed in the meantime fails its
+        # PENDING -> CONFIRMED transition instead of losing its items
+        swept = Order.objects.using(using).filter(id__in=ids).transition(
+            'CANCELLED', from_statuses=['PENDING'], updated_at=stamp
+        )
+        if not swept:
+            return 0
+
+        claimed = Order.objects.using(using).filter(id__in=ids, status='CANCELLED', updated_at=stamp)
+        if action == 'delete':
+            # One DELETE each, items first and nothing fetched: delete()
+            # would load every claimed order to collect its cascades
+            OrderItem.objects.using(using).filter(order__in=claimed)._raw_delete(using)
+            claimed._raw_delete(using)
+            return swept
+
+        if swept < len(ids):
+            # Some were placed or cancelled meanwhile: announce only ours
+            applied = set(claimed.values_list('id', flat=True))
+            rows = [row for row in rows if row[1] in applied]
+        for _, order_id, user_id, country in rows:
+            order = Order(id=order_id, user_id=user_id, country=country, status='CANCELLED', updated_at=stamp)
+            order._state.db = using
+            publish_status_change(order, 'PENDING')
+    return swept
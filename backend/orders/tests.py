@@ -1,3 +1,1235 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.core.cache import cache
+from django.db import router
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import archive, events
+from .events import BaseBroker
+from .models import ArchivedOrder, Order, OrderItem
+from .serializers import OrderSerializer, OrderValuesSerializer
+from .sweeper import sweep_pending_orders
+from food_ordering import cache as app_cache
+from food_ordering import metrics, scheduler, sharding
+from food_ordering.cache import TwoTierCache
+from food_ordering.routers import ReplicaRoutingMiddleware, replica_reads
+from food_ordering.querylog import QueryInspector, RepeatedQueryError, fingerprint
+from payments.models import PaymentMethod
+from restaurants.models import Restaurant, MenuCategory, MenuItem
+from users.models import User
+
+
+class OrderCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(
+            username='captain_marvel', password='pass12345', role='manager', country='INDIA'
+        )
+        cls.restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        category = MenuCategory.objects.create(name='Main Course', restaurant=cls.restaurant)
+        cls.menu_items = MenuItem.objects.bulk_create([
+            MenuItem(
+                name=f'Dish {i}', price=Decimal('2.50') + i, category=category,
+                restaurant=cls.restaurant, country='INDIA'
+            )
+            for i in range(80)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def _payload(self, lines):
+        return {
+            'restaurant': self.restaurant.id,
+            'delivery_address': 'Titan Tower, Mumbai',
+            'items': [
+                {'menu_item': menu_item.id, 'quantity': 2}
+                for menu_item in self.menu_items[:lines]
+            ],
+        }
+
+    def _create(self, lines):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/orders/', self._payload(lines), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return len(queries)
+
+    def test_creates_items_and_total(self):
+        self._create(3)
+
+        order = Order.objects.get()
+        self.assertEqual(order.status, 'PENDING')
+        self.assertEqual(order.total_amount, Decimal('2.50') * 2 + Decimal('3.50') * 2 + Decimal('4.50') * 2)
+        self.assertEqual(
+            sorted(OrderItem.objects.values_list('menu_item_id', 'quantity', 'price')),
+            [(item.id, 2, item.price) for item in self.menu_items[:3]]
+        )
+
+    def test_query_count_does_not_grow_with_lines(self):
+        self.assertEqual(self._create(2), self._create(80))
+
+    def test_restaurant_must_be_in_the_users_country(self):
+        america = Restaurant.objects.create(
+            name='Burger Palace', address='5th Avenue, New York', country='AMERICA',
+            phone_number='+1-212-5550100'
+        )
+        payload = {**self._payload(1), 'restaurant': america.id}
+
+        response = self.client.post('/api/orders/', payload, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('restaurant', response.data)
+        self.assertFalse(Order.objects.exists())
+
+    def test_country_comes_from_the_restaurant(self):
+        admin = User.objects.create_user(
+            username='nick_fury', password='pass12345', role='admin', country='AMERICA'
+        )
+        self.client.force_authenticate(admin)
+
+        response = self.client.post('/api/orders/', {**self._payload(1), 'country': 'AMERICA'}, format='json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['country'], 'INDIA')
+        self.assertEqual(Order.objects.get().country, 'INDIA')
+
+    def test_unknown_menu_item_is_rejected(self):
+        payload = self._payload(1)
+        payload['items'].append({'menu_item': 999999, 'quantity': 1})
+
+        response = self.client.post('/api/orders/', payload, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.data)
+        self.assertFalse(Order.objects.exists())
+
+
+class RecordingBroker(BaseBroker):
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channels, message):
+        self.published.append((channels, json.loads(message)))
+
+
+class OrderTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(
+            username='captain_marvel', password='pass12345', role='manager', country='INDIA'
+        )
+        cls.restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+
+    def setUp(self):
+        self.broker = RecordingBroker()
+        previous, events._broker = events._broker, self.broker
+        self.addCleanup(setattr, events, '_broker', previous)
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def _order(self, order_status='PENDING'):
+        return Order.objects.create(
+            user=self.manager, restaurant=self.restaurant, country='INDIA', status=order_status,
+            delivery_address='Titan Tower, Mumbai', total_amount=Decimal('500')
+        )
+
+    def test_queryset_transition_only_moves_legal_sources(self):
+        orders = [self._order(order_status) for order_status in ['PENDING', 'CONFIRMED', 'DELIVERED']]
+
+        changed = Order.objects.filter(id__in=[order.id for order in orders]).transition('CANCELLED')
+        self.assertEqual(changed, 2)
+        self.assertEqual(Order.objects.filter(status='CANCELLED').count(), 2)
+
+        self.assertEqual(Order.objects.transition('PREPARING', from_statuses=['PENDING']), 0)
+
+    def test_event_is_published_on_commit(self):
+        order = self._order()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(order.transition_to('CONFIRMED'))
+            self.assertEqual(self.broker.published, [])
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(order.status, 'CONFIRMED')
+        [(channels, message)] = self.broker.published
+        self.assertEqual(channels, [f'user:{self.manager.id}', 'country:INDIA', 'all'])
+        self.assertEqual(
+            (message['order_id'], message['status'], message['previous_status']),
+            (order.id, 'CONFIRMED', 'PENDING')
+        )
+
+    def test_lost_race_changes_and_publishes_nothing(self):
+        order = self._order()
+        # Another request cancels it after this instance was read
+        Order.objects.filter(pk=order.pk).update(status='CANCELLED')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(order.transition_to('CONFIRMED'))
+
+        self.assertEqual(order.status, 'PENDING')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'CANCELLED')
+        self.assertEqual(self.broker.published, [])
+
+    def test_place_order_twice(self):
+        order = self._order()
+        url = f'/api/orders/{order.id}/place_order/'
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(url).status_code, 200)
+            response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.broker.published), 1)
+
+    def test_cancel(self):
+        order = self._order('DELIVERED')
+        response = self.client.post(f'/api/orders/{order.id}/cancel/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Cannot cancel a delivered order')
+
+        order = self._order('PREPARING')
+        self.assertEqual(self.client.post(f'/api/orders/{order.id}/cancel/').status_code, 200)
+        response = self.client.post(f'/api/orders/{order.id}/cancel/')
+        self.assertEqual(response.data['error'], 'Order is already cancelled')
+
+    def test_update_status_moves_one_step_at_a_time(self):
+        order = self._order('CONFIRMED')
+        url = f'/api/orders/{order.id}/update_status/'
+
+        for payload in [{'status': 'DELIVERED'}, {'status': 'CONFIRMED'}, {}]:
+            with self.subTest(payload=payload):
+                response = self.client.patch(url, payload, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('status', response.data)
+
+        response = self.client.patch(url, {'status': 'PREPARING'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['order']['status'], 'PREPARING')
+
+    def test_bulk_update_status(self):
+        confirmed, pending, delivered = [self._order(order_status) for order_status in ['CONFIRMED', 'PENDING', 'DELIVERED']]
+        america = Order.objects.create(
+            user=self.manager, country='AMERICA', status='CONFIRMED', delivery_address='5th Avenue, New York',
+            total_amount=Decimal('20'), restaurant=Restaurant.objects.create(
+                name='Burger Palace', address='5th Avenue, New York', country='AMERICA',
+                phone_number='+1-212-5550100'
+            )
+        )
+        ids = [confirmed.id, pending.id, delivered.id, america.id, 999999, confirmed.id]
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/api/orders/bulk_update_status/', {'ids': ids, 'status': 'PREPARING'}, format='json'
+            )
+        # The locking read and one UPDATE (plus savepoints)
+        self.assertEqual([query['sql'].split()[0] for query in queries if 'SAVEPOINT' not in query['sql']],
+                         ['SELECT', 'UPDATE'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['results'], [
+            {'id': confirmed.id, 'result': 'updated', 'status': 'PREPARING'},
+            {'id': pending.id, 'result': 'invalid_transition', 'status': 'PENDING'},
+            {'id': delivered.id, 'result': 'invalid_transition', 'status': 'DELIVERED'},
+            # Another country's order is out of a manager's reach
+            {'id': america.id, 'result': 'not_found'},
+            {'id': 999999, 'result': 'not_found'},
+        ])
+        self.assertEqual(
+            dict(Order.objects.values_list('id', 'status')),
+            {confirmed.id: 'PREPARING', pending.id: 'PENDING', delivered.id: 'DELIVERED', america.id: 'CONFIRMED'}
+        )
+        [(_, message)] = self.broker.published
+        self.assertEqual(
+            (message['order_id'], message['status'], message['previous_status']),
+            (confirmed.id, 'PREPARING', 'CONFIRMED')
+        )
+
+    def test_status_is_read_only_on_the_order(self):
+        admin = User.objects.create_user(
+            username='nick_fury', password='pass12345', role='admin', country='AMERICA'
+        )
+        self.client.force_authenticate(admin)
+        order = self._order()
+
+        response = self.client.patch(f'/api/orders/{order.id}/', {'status': 'DELIVERED'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PENDING')
+
+
+class OrderEventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create_user(
+            username='thor', password='pass12345', role='member', country='INDIA'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_in_process_broker_fans_out_to_listeners(self):
+        async def listen():
+            broker = events.InProcessBroker()
+            listener = broker.listen(['user:1'], heartbeat=0.05)
+            received = asyncio.ensure_future(anext(listener))
+            # Let the listener subscribe
+            await asyncio.sleep(0)
+            broker.publish(['country:INDIA'], 'not for user 1')
+            broker.publish(['user:1', 'all'], 'for user 1')
+            messages = [await received, await anext(listener)]
+            await listener.aclose()
+            return messages, broker._subscribers
+
+        messages, subscribers = asyncio.run(listen())
+
+        # The message, then a heartbeat
+        self.assertEqual(messages, ['for user 1', None])
+        self.assertEqual(subscribers, {})
+
+    async def open_stream(self, **params):
+        return await AsyncClient().get('/api/orders/events/', params)
+
+    async def test_needs_credentials(self):
+        response = await self.open_stream()
+        self.assertEqual(response.status_code, 401)
+
+    async def test_jwt_in_the_query_string_is_refused(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.member).access_token))()
+        response = await self.open_stream(token=token)
+        self.assertEqual(response.status_code, 401)
+
+    async def test_ticket_opens_the_stream_once(self):
+        client = APIClient()
+        client.force_authenticate(self.member)
+        response = await sync_to_async(client.post)('/api/orders/events/ticket/')
+        self.assertEqual(response.status_code, 201)
+        ticket = response.data['ticket']
+
+        stream = await self.open_stream(ticket=ticket)
+        self.assertEqual(stream.status_code, 200)
+        self.assertEqual(stream['Content-Type'], 'text/event-stream')
+        self.assertEqual(await anext(aiter(stream.streaming_content)), b'retry: 5000\n\n')
+
+        self.assertEqual((await self.open_stream(ticket=ticket)).status_code, 401)
+        self.assertEqual((await self.open_stream(ticket='made-up')).status_code, 401)
+
+    def test_ticket_needs_authentication(self):
+        self.assertEqual(APIClient().post('/api/orders/events/ticket/').status_code, 401)
+
+
+class CartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(
+            username='captain_marvel', password='pass12345', role='manager', country='INDIA'
+        )
+        cls.member = User.objects.create_user(
+            username='thor', password='pass12345', role='member', country='INDIA'
+        )
+        cls.restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        category = MenuCategory.objects.create(name='Main Course', restaurant=cls.restaurant)
+        cls.paneer = MenuItem.objects.create(name='Paneer Tikka', price=Decimal('250'), category=category)
+        cls.naan = MenuItem.objects.create(name='Garlic Naan', price=Decimal('45.50'), category=category)
+        other = Restaurant.objects.create(
+            name='Spice Garden', address='12 Park Street, Kolkata', country='INDIA',
+            phone_number='+91-33-12345678'
+        )
+        cls.other_dish = MenuItem.objects.create(
+            name='Fish Curry', price=Decimal('300'),
+            category=MenuCategory.objects.create(name='Mains', restaurant=other)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def add(self, menu_item, quantity=1):
+        return self.client.post('/api/cart/items/', {'menu_item': menu_item.id, 'quantity': quantity}, format='json')
+
+    def test_cart_edits_never_write_orders(self):
+        self.add(self.paneer, 2)
+        self.add(self.naan)
+        self.add(self.naan)
+        response = self.client.patch(f'/api/cart/items/{self.paneer.id}/', {'quantity': 3}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(item['menu_item'], item['quantity']) for item in response.data['items']],
+                         [(self.paneer.id, 3), (self.naan.id, 2)])
+        self.assertEqual(response.data['total_amount'], '841.00')
+
+        response = self.client.delete(f'/api/cart/items/{self.naan.id}/')
+        self.assertEqual([item['menu_item'] for item in response.data['items']], [self.paneer.id])
+        self.assertFalse(Order.objects.exists())
+
+    def test_checkout_writes_a_confirmed_order_and_empties_the_cart(self):
+        self.add(self.paneer, 2)
+        self.add(self.naan, 3)
+
+        # The menu items, the order and items INSERTs in a savepoint, and
+        # the order and its lines read back for the response
+        with self.assertNumQueries(7):
+            response = self.client.post('/api/cart/checkout/', {'delivery_address': 'Titan Tower, Mumbai'},
+                                        format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(response.data['order']['items']), 2)
+
+        order = Order.objects.get()
+        self.assertEqual((order.status, order.user, order.restaurant), ('CONFIRMED', self.manager, self.restaurant))
+        self.assertEqual(order.total_amount, Decimal('636.50'))
+        self.assertEqual(
+            sorted(order.items.values_list('menu_item_id', 'quantity', 'price')),
+            [(self.paneer.id, 2, Decimal('250')), (self.naan.id, 3, Decimal('45.50'))]
+        )
+        self.assertEqual(self.client.get('/api/cart/').data['items'], [])
+        self.assertEqual(self.client.post('/api/cart/checkout/', {'delivery_address': 'x'}).status_code, 400)
+
+    def test_items_are_validated_against_the_menu(self):
+        self.assertEqual(self.client.post('/api/cart/items/', {'menu_item': 999999}).status_code, 400)
+        self.add(self.paneer)
+        response = self.add(self.other_dish)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('another restaurant', str(response.data['menu_item']))
+        self.assertEqual(self.add(self.paneer, 99).status_code, 400)
+
+        MenuItem.objects.filter(pk=self.naan.pk).update(is_available=False)
+        self.assertEqual(self.add(self.naan).status_code, 400)
+
+    def test_price_change_stops_checkout_once(self):
+        self.add(self.paneer)
+        MenuItem.objects.filter(pk=self.paneer.pk).update(price=Decimal('275'))
+
+        cart = self.client.get('/api/cart/').data
+        self.assertEqual((cart['items'][0]['price'], cart['items'][0]['price_changed']), ('275.00', True))
+
+        response = self.client.post('/api/cart/checkout/', {'delivery_address': 'Titan Tower, Mumbai'})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.post('/api/cart/checkout/', {'delivery_address': 'Titan Tower, Mumbai'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get().total_amount, Decimal('275'))
+
+    def test_payment_method_must_be_the_users_own(self):
+        self.add(self.paneer)
+        theirs = PaymentMethod.objects.create(user=self.member, payment_type='UPI')
+        mine = PaymentMethod.objects.create(user=self.manager, payment_type='CASH_ON_DELIVERY')
+
+        response = self.client.post('/api/cart/checkout/', {'delivery_address': 'x', 'payment_method': theirs.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('payment_method', response.data)
+
+        response = self.client.post('/api/cart/checkout/', {'delivery_address': 'x', 'payment_method': mine.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get().payment_method, mine)
+
+    def test_members_cannot_fill_a_cart_or_check_out(self):
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.add(self.paneer).status_code, 403)
+        self.assertEqual(self.client.post('/api/cart/checkout/', {'delivery_address': 'x'}).status_code, 403)
+        self.assertEqual(self.client.get('/api/cart/').status_code, 200)
+
+
+class PendingOrderSweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(
+            username='captain_marvel', password='pass12345', role='manager', country='INDIA'
+        )
+        restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        category = MenuCategory.objects.create(name='Main Course', restaurant=restaurant)
+        dish = MenuItem.objects.create(name='Paneer Tikka', price=Decimal('250'), category=category)
+
+        for age, status in [(48, 'PENDING')] * 5 + [(1, 'PENDING'), (48, 'CONFIRMED')]:
+            order = Order.objects.create(
+                user=cls.manager, restaurant=restaurant, country='INDIA', status=status,
+                delivery_address='Titan Tower, Mumbai', total_amount=Decimal('250')
+            )
+            OrderItem.objects.create(order=order, menu_item=dish, quantity=1, price=dish.price)
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(hours=age))
+
+    def test_cancels_stale_pending_orders_in_batches(self):
+        # Per batch: the keys, one UPDATE and a savepoint around it
+        with self.assertNumQueries(3 * 4 + 1):
+            result = sweep_pending_orders(timedelta(hours=24), batch_size=2)
+
+        self.assertEqual((result.swept, result.batches), (5, 3))
+        self.assertEqual(
+            sorted(Order.objects.values_list('status', flat=True)),
+            ['CANCELLED'] * 5 + ['CONFIRMED', 'PENDING']
+        )
+        self.assertEqual(OrderItem.objects.count(), 7)
+
+    def test_delete_removes_orders_and_their_items(self):
+        result = sweep_pending_orders(timedelta(hours=24), action='delete', batch_size=2, max_batches=2)
+
+        self.assertEqual((result.swept, result.batches), (4, 2))
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(OrderItem.objects.count(), 3)
+        self.assertFalse(OrderItem.objects.exclude(order__in=Order.objects.all()).exists())
+
+    def test_delete_batch_runs_one_statement_per_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            sweep_pending_orders(timedelta(hours=24), action='delete', batch_size=5, max_batches=1)
+
+        statements = [query['sql'] for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(
+            [re.match(r'(SELECT|UPDATE|DELETE)\b.*?"(\w+)"', sql).groups() for sql in statements],
+            [('SELECT', 'orders'), ('UPDATE', 'orders'), ('DELETE', 'order_items'), ('DELETE', 'orders')]
+        )
+        # Only the orders this batch claimed
+        for sql in statements[2:]:
+            self.assertIn('"status" = \'CANCELLED\'', sql)
+            self.assertIn('"updated_at" = ', sql)
+
+    def test_scheduled_task_runs_once_per_interval_across_processes(self):
+        cache.clear()
+        runs = []
+        task = scheduler.PeriodicTask('test_task', 60, lambda: runs.append(1))
+
+        self.assertTrue(task.run_once())
+        self.assertFalse(scheduler.PeriodicTask('test_task', 60, lambda: runs.append(2)).run_once())
+        self.assertEqual(runs, [1])
+
+    def test_scheduled_tasks_wait_for_a_server_process(self):
+        self.addCleanup(scheduler.stop_all)
+        task = scheduler.every(3600, 'test_task', lambda: None)
+        # Registered from AppConfig.ready() in every process, e.g. migrate
+        self.assertFalse(task.thread.is_alive())
+
+        scheduler.start()
+        self.assertTrue(task.thread.is_alive())
+        self.assertTrue(scheduler.every(60, 'another_task', lambda: None).thread.is_alive())
+
+
+class OrderArchiveTests(TransactionTestCase):
+    """
+    Creating the archive tables is DDL, which SQLite won't run inside the
+    transaction a TestCase wraps each test in
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(
+            username='captain_marvel', password='pass12345', role='manager', country='INDIA'
+        )
+        self.outsider = User.objects.create_user(
+            username='captain_america', password='pass12345', role='member', country='AMERICA'
+        )
+        restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        category = MenuCategory.objects.create(name='Main Course', restaurant=restaurant)
+        paneer = MenuItem.objects.create(name='Paneer Tikka', price=Decimal('250'), category=category)
+        naan = MenuItem.objects.create(name='Garlic Naan', price=Decimal('45.50'), category=category)
+
+        orders = [
+            (100, 'DELIVERED', [(paneer, 2), (naan, 1)]), (140, 'DELIVERED', [(naan, 3)]),
+            (100, 'CANCELLED', []), (180, 'CANCELLED', [(paneer, 1)]),
+            (10, 'DELIVERED', [(naan, 1)]), (100, 'PREPARING', [(paneer, 1)]),
+        ]
+        for age, status, lines in orders:
+            order = Order.objects.create(
+                user=self.manager, restaurant=restaurant, country='INDIA', status=status,
+                delivery_address='Titan Tower, Mumbai', total_amount=Decimal('0')
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menu_item=menu_item, quantity=quantity, price=menu_item.price)
+                for menu_item, quantity in lines
+            ])
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=age))
+
+    def tearDown(self):
+        cache.clear()
+        months = set(ArchivedOrder.objects.values_list('month', flat=True))
+        with connection.schema_editor() as editor:
+            for month in months:
+                for model in archive.archive_models(month):
+                    editor.delete_model(model)
+
+    def _client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_moves_old_finished_orders_and_their_items(self):
+        result = archive.archive_orders(timedelta(days=90), batch_size=1)
+
+        self.assertEqual((result.archived, result.batches), (4, 4))
+        self.assertEqual(sorted(Order.objects.values_list('status', flat=True)), ['DELIVERED', 'PREPARING'])
+        self.assertEqual(OrderItem.objects.count(), 2)
+        self.assertEqual(ArchivedOrder.objects.count(), 4)
+
+        months = sorted(set(ArchivedOrder.objects.values_list('month', flat=True)))
+        archived = [archive.archive_models(month) for month in months]
+        self.assertEqual(sum(orders.objects.count() for orders, _ in archived), 4)
+        self.assertEqual(sum(items.objects.count() for _, items in archived), 4)
+        self.assertEqual(archive.archive_orders(timedelta(days=90)).archived, 0)
+
+    def test_batch_deletes_without_loading_orders(self):
+        with CaptureQueriesContext(connection) as queries:
+            archive.archive_orders(timedelta(days=90), batch_size=2, max_batches=1)
+
+        deletes = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('DELETE')]
+        self.assertEqual([re.match(r'DELETE FROM "(\w+)"', sql).group(1) for sql in deletes], ['order_items', 'orders'])
+        self.assertFalse([query for query in queries.captured_queries if '"orders"."delivery_address"' in query['sql']])
+        self.assertEqual(Order.objects.count(), 4)
+
+    def test_archived_orders_read_as_before(self):
+        client = self._client(self.manager)
+        archived_ids = list(
+            Order.objects.filter(status__in=archive.ARCHIVE_STATUSES, created_at__lt=timezone.now() - timedelta(days=90))
+            .values_list('id', flat=True)
+        )
+        requests = [
+            ('/api/orders/my_orders/', {}),
+            ('/api/orders/my_orders/', {'pagination': 'cursor'}),
+            ('/api/orders/my_orders/', {'fields': 'id,status'}),
+        ] + [(f'/api/orders/{order_id}/', {}) for order_id in archived_ids]
+        expected = [client.get(path, params).json() for path, params in requests]
+
+        archive.archive_orders(timedelta(days=90))
+        self.assertEqual([client.get(path, params).json() for path, params in requests], expected)
+        self.assertFalse(Order.objects.filter(id__in=archived_ids).exists())
+
+        # Still scoped like live orders
+        response = self._client(self.outsider).get(f'/api/orders/{archived_ids[0]}/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self._client(self.outsider).get('/api/orders/my_orders/').data['count'], 0)
+
+    def test_sync_tables_follows_the_orders_columns(self):
+        archive.archive_orders(timedelta(days=90), batch_size=2, max_batches=1)
+        month = ArchivedOrder.objects.values_list('month', flat=True).first()
+        orders_model = archive.archive_models(month)[0]
+        table = orders_model._meta.db_table
+        # As if a migration had since added special_instructions to Order
+        # and removed a legacy column
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {table} DROP COLUMN special_instructions')
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN legacy_code varchar(10) NOT NULL DEFAULT ''")
+
+        archive.sync_tables('default')
+
+        with connection.cursor() as cursor:
+            columns = [column.name for column in connection.introspection.get_table_description(cursor, table)]
+        self.assertEqual(sorted(columns), sorted(field.column for field in Order._meta.concrete_fields))
+        # Archiving and archive reads work again
+        self.assertEqual(archive.archive_orders(timedelta(days=90)).archived, 2)
+        self.assertEqual(self._client(self.manager).get('/api/orders/my_orders/').data['count'], 6)
+
+
+class OrderValuesSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='nick_fury', password='pass12345', role='admin', country='AMERICA'
+        )
+        restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        category = MenuCategory.objects.create(name='Main Course', restaurant=restaurant)
+        paneer = MenuItem.objects.create(name='Paneer Tikka', price=Decimal('250'), category=category)
+        naan = MenuItem.objects.create(name='Garlic Naan', price=Decimal('45.50'), category=category)
+
+        for status, lines in [('PENDING', [(paneer, 2), (naan, 3)]), ('CANCELLED', []), ('CONFIRMED', [(naan, 1)])]:
+            order = Order.objects.create(
+                user=cls.admin, restaurant=restaurant, country='INDIA', status=status,
+                delivery_address='Titan Tower, Mumbai', total_amount=Decimal('0'),
+                special_instructions=None if lines else 'Leave at the door'
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menu_item=menu_item, quantity=quantity, price=menu_item.price)
+                for menu_item, quantity in lines
+            ])
+
+    def test_rows_match_model_serializer(self):
+        queryset = Order.objects.select_related('user', 'restaurant').prefetch_related('items__menu_item')
+        queryset = queryset.order_by('-created_at', '-id')
+        context = {'request': APIRequestFactory().get('/api/')}
+
+        expected = OrderSerializer(queryset, many=True, context=context).data
+        values_serializer = OrderValuesSerializer(context)
+        actual = values_serializer.to_representation(values_serializer.values(queryset))
+
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_list_reads_lines_for_the_page_in_one_query(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        # COUNT, the page of orders, and the lines of every order on it
+        with self.assertNumQueries(3):
+            response = client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([len(order['items']) for order in response.data['results']], [1, 0, 2])
+
+        response = client.get('/api/orders/', {'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_export_streams_orders_with_their_items_in_one_query(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        expected = client.get('/api/orders/').json()['results']
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/orders/export/', {'format': 'ndjson'})
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+        response = client.get('/api/orders/export/', {'status': 'CANCELLED', 'created_at__gte': '2000-01-01'})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([(row['status'], row['item_id']) for row in rows], [('CANCELLED', '')])
+
+        # One row per line, order columns repeated
+        response = client.get('/api/orders/export/')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['item_menu_item_name'] for row in rows], ['Garlic Naan', '', 'Paneer Tikka', 'Garlic Naan'])
+
+    def test_export_is_admin_only(self):
+        manager = User.objects.create_user(
+            username='captain_marvel', password='pass12345', role='manager', country='INDIA'
+        )
+        client = APIClient()
+        client.force_authenticate(manager)
+        self.assertEqual(client.get('/api/orders/export/').status_code, 403)
+
+    def test_async_my_orders_matches_sync(self):
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.admin).access_token}'}
+
+        for params in [{}, {'fields': 'id,status,items'}]:
+            expected = self.client.get('/api/orders/my_orders/', params, headers=headers)
+            # COUNT, the page of orders, and their lines
+            with self.assertNumQueries(3):
+                response = self.client.get('/api/async/orders/my_orders/', params, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected.json())
+
+
+class OrderKeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='nick_fury', password='pass12345', role='admin', country='AMERICA'
+        )
+        restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        Order.objects.bulk_create([
+            Order(user=cls.admin, restaurant=restaurant, country='INDIA',
+                  delivery_address='Titan Tower, Mumbai', total_amount=Decimal('500'))
+            for _ in range(45)
+        ])
+        # The 25 newest share a timestamp, across the first page boundary
+        start = timezone.now() - timedelta(days=1)
+        for position, order in enumerate(Order.objects.order_by('id')):
+            order.created_at = start + timedelta(minutes=min(position, 20))
+            order.save(update_fields=['created_at'])
+        cls.expected = list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_next_pages_cover_every_order_once(self):
+        ids, url, pages = [], '/api/orders/?pagination=cursor&fields=id', []
+        while url:
+            page = self.client.get(url).json()
+            pages.append(page)
+            ids += [order['id'] for order in page['results']]
+            url = page['next']
+
+        self.assertEqual(ids, self.expected)
+        self.assertEqual([len(page['results']) for page in pages], [20, 20, 5])
+        self.assertIsNone(pages[0]['previous'])
+
+        # And back again from the last page
+        previous = self.client.get(pages[2]['previous']).json()
+        self.assertEqual([order['id'] for order in previous['results']], self.expected[20:40])
+        first = self.client.get(previous['previous']).json()
+        self.assertEqual([order['id'] for order in first['results']], self.expected[:20])
+        self.assertIsNone(first['previous'])
+
+    def test_bad_cursor(self):
+        response = self.client.get('/api/orders/', {'pagination': 'cursor', 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_ordering_is_rejected(self):
+        response = self.client.get('/api/orders/', {'pagination': 'cursor', 'ordering': 'total_amount'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+
+
+class OrderSparseFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='nick_fury', password='pass12345', role='admin', country='AMERICA'
+        )
+        restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        category = MenuCategory.objects.create(name='Main Course', restaurant=restaurant)
+        paneer = MenuItem.objects.create(name='Paneer Tikka', price=Decimal('250'), category=category)
+        cls.order = Order.objects.create(
+            user=cls.admin, restaurant=restaurant, country='INDIA',
+            delivery_address='Titan Tower, Mumbai', total_amount=Decimal('500')
+        )
+        OrderItem.objects.create(order=cls.order, menu_item=paneer, quantity=2, price=paneer.price)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_summary_fields_skip_items_and_unused_joins(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/orders/', {'fields': 'id,restaurant_name,status,total_amount,created_at'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.data['results'][0]),
+            ['id', 'restaurant_name', 'status', 'total_amount', 'created_at']
+        )
+        # COUNT and the page itself; no order_items query and no users join
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('order_items', queries[1]['sql'])
+        self.assertNotIn('"users"', queries[1]['sql'])
+
+    def test_expand_items(self):
+        response = self.client.get('/api/orders/my_orders/', {'fields': 'id,status', 'expand': 'items'})
+
+        self.assertEqual(response.status_code, 200)
+        order = response.data['results'][0]
+        self.assertEqual(list(order), ['id', 'status', 'items'])
+        self.assertEqual(order['items'][0]['menu_item_name'], 'Paneer Tikka')
+
+    def test_action_response_is_sparse(self):
+        response = self.client.post(f'/api/orders/{self.order.id}/place_order/?fields=id,status')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['order'], {'id': self.order.id, 'status': 'CONFIRMED'})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/orders/', {'fields': 'id,secret'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.data)
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        app_cache.stats.reset()
+
+    def test_invalidated_tag_hides_its_values(self):
+        app_cache.cache_set('menu:1', 'old', tags=['restaurant:1:menu'])
+        app_cache.cache_set('menu:2', 'other', tags=['restaurant:2:menu'])
+        self.assertEqual(app_cache.cache_get('menu:1', tags=['restaurant:1:menu']), 'old')
+
+        app_cache.invalidate_tags('restaurant:1:menu')
+
+        self.assertIsNone(app_cache.cache_get('menu:1', tags=['restaurant:1:menu']))
+        self.assertEqual(app_cache.cache_get('menu:2', tags=['restaurant:2:menu']), 'other')
+
+    def test_local_tier_expires(self):
+        two_tier = TwoTierCache('', {'OPTIONS': {'SHARED_ALIAS': 'shared', 'LOCAL_TIMEOUT': 0.05}})
+        two_tier.set('greeting', 'hello')
+        # Another process overwrites it in the shared tier
+        two_tier.shared.set('greeting', 'namaste')
+
+        self.assertEqual(two_tier.get('greeting'), 'hello')
+        time.sleep(0.06)
+        self.assertEqual(two_tier.get('greeting'), 'namaste')
+
+    def test_get_or_set_computes_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return 'menu'
+
+        self.assertEqual(app_cache.get_or_set('menu:1', compute), 'menu')
+        self.assertEqual(app_cache.get_or_set('menu:1', compute), 'menu')
+        self.assertEqual(len(calls), 1)
+
+    def test_stampede_waits_for_the_lock_holder(self):
+        # Another caller holds the lock and stores the value shortly
+        app_cache.shared().add('menu:1:lock', 1)
+        threading.Timer(0.1, cache.set, ('menu:1', 'theirs')).start()
+
+        self.assertEqual(app_cache.get_or_set('menu:1', lambda: 'ours'), 'theirs')
+        self.assertEqual(app_cache.stats.snapshot()['stampede_waits'], 1)
+        self.assertEqual(app_cache.stats.snapshot()['computes'], 0)
+
+    def test_stampede_wait_gives_up(self):
+        app_cache.shared().add('menu:1:lock', 1)
+        previous, app_cache.STAMPEDE_WAIT = app_cache.STAMPEDE_WAIT, 0.1
+        self.addCleanup(setattr, app_cache, 'STAMPEDE_WAIT', previous)
+
+        self.assertEqual(app_cache.get_or_set('menu:1', lambda: 'ours'), 'ours')
+        self.assertEqual(app_cache.stats.snapshot()['computes'], 1)
+
+
+class AsyncMiddlewareTests(SimpleTestCase):
+    def test_every_middleware_runs_natively_under_asgi(self):
+        """
+        One sync-only middleware would put every request back on a thread
+        """
+        for path in settings.MIDDLEWARE:
+            with self.subTest(middleware=path):
+                self.assertTrue(getattr(import_string(path), 'async_capable', True), path)
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='nick_fury', password='pass12345', role='admin', country='AMERICA'
+        )
+        cls.member = User.objects.create_user(
+            username='thor', password='pass12345', role='member', country='INDIA'
+        )
+        restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        cls.order = Order.objects.create(
+            user=cls.admin, restaurant=restaurant, country='INDIA',
+            delivery_address='Titan Tower, Mumbai', total_amount=Decimal('500')
+        )
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _metrics(self):
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_records_viewset_actions(self):
+        self.client.post(f'/api/orders/{self.order.id}/place_order/')
+
+        text = self._metrics()
+        labels = '{view="OrderViewSet.place_order",method="POST"}'
+        self.assertIn(f'food_ordering_http_request_duration_seconds_count{labels} 1', text)
+        self.assertIn(f'food_ordering_http_request_db_queries_count{labels} 1', text)
+        self.assertIn(f'food_ordering_http_request_serializer_duration_seconds_count{labels} 1', text)
+        self.assertIn(
+            'food_ordering_http_requests_total{view="OrderViewSet.place_order",method="POST",status="200"} 1',
+            text
+        )
+        self.assertIn('food_ordering_cache_operations_total{operation="local_hits"}', text)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    def test_adds_up_worker_files(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        other_worker = {
+            'histograms': {},
+            'counters': {'http_requests_total': [[['OrderViewSet.list', 'GET', '200'], 4]]},
+            'cache': {'misses': 2},
+        }
+        with open(os.path.join(directory.name, 'metrics-1.json'), 'w') as snapshot:
+            json.dump(other_worker, snapshot)
+
+        with override_settings(METRICS_MULTIPROC_DIR=directory.name):
+            self.client.get('/api/orders/')
+            text = self._metrics()
+
+        self.assertIn('food_ordering_http_requests_total{view="OrderViewSet.list",method="GET",status="200"} 5', text)
+        self.assertIn(f'metrics-{os.getpid()}.json', os.listdir(directory.name))
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_off_removes_middleware(self):
+        self.client.get('/api/orders/')
+        self.assertEqual(metrics.registry.snapshot()['counters']['http_requests_total'], [])
+
+
+class AsyncRequestMetricsTests(TransactionTestCase):
+    """
+    Under a real event loop the async ORM runs queries in an executor
+    thread, on that thread's connection
+    """
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.member = User.objects.create_user(
+            username='thor', password='pass12345', role='member', country='INDIA'
+        )
+        Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+
+    def get(self, path):
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.member).access_token}'}
+        return asyncio.run(AsyncClient().get(path, headers=headers))
+
+    def queries(self, view):
+        histograms = metrics.registry.snapshot()['histograms']
+        series = dict((tuple(labels), values) for labels, values in histograms['http_request_db_queries'])
+        # [buckets..., above the last bucket, sum]
+        return series[view, 'GET'][-1]
+
+    @override_settings(SQL_SLOW_QUERY_MS=0)
+    def test_async_view_queries_are_counted(self):
+        cache.clear()
+        with self.assertLogs('food_ordering.sql', 'WARNING') as logs:
+            self.assertEqual(self.get('/api/async/restaurants/').status_code, 200)
+        self.assertEqual(self.get('/api/restaurants/').status_code, 200)
+
+        # The user snapshot (a cache miss), COUNT and the page
+        self.assertEqual(self.queries('AsyncRestaurantListView'), 3)
+        self.assertEqual(len(logs.output), 3)
+        self.assertTrue(all('in AsyncRestaurantListView' in line for line in logs.output))
+        # The snapshot is cached by now
+        self.assertEqual(self.queries('RestaurantViewSet.list'), 2)
+
+class QueryInspectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='nick_fury', password='pass12345', role='admin', country='AMERICA'
+        )
+        restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        category = MenuCategory.objects.create(name='Main Course', restaurant=restaurant)
+        cls.order = Order.objects.create(
+            user=cls.admin, restaurant=restaurant, country='INDIA',
+            delivery_address='Titan Tower, Mumbai', total_amount=Decimal('1200')
+        )
+        for number in range(12):
+            menu_item = MenuItem.objects.create(name=f'Dish {number}', price=Decimal('100'), category=category)
+            OrderItem.objects.create(order=cls.order, menu_item=menu_item, quantity=1, price=menu_item.price)
+
+    def test_fingerprint_drops_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 7 AND name = 'O''Brien' AND x IN (%s, %s, %s) LIMIT 21"),
+            'SELECT * FROM t WHERE id = ? AND name = ? AND x IN (...) LIMIT ?'
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO "t" ("a", "b2") VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO "t" ("a", "b2") VALUES (...)'
+        )
+
+    def test_repeated_query_raises_with_origin(self):
+        with self.assertRaises(RepeatedQueryError) as raised:
+            with QueryInspector(view='test', repeat_threshold=2, raise_on_repeat=True):
+                for item in OrderItem.objects.filter(order=self.order):
+                    item.menu_item.name
+
+        self.assertIn('ran the same query 3 times', str(raised.exception))
+        self.assertIn('orders/tests.py', str(raised.exception))
+
+    def test_slow_queries_are_logged(self):
+        with self.assertLogs('food_ordering.sql', 'WARNING') as logs:
+            with QueryInspector(view='test', slow_query_ms=0):
+                Order.objects.count()
+
+        self.assertIn('Slow query', logs.output[0])
+
+    def test_admin_order_page_loads_items_in_one_query(self):
+        self.client.force_login(self.admin)
+
+        response = self.client.get(f'/admin/orders/order/{self.order.id}/change/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Dish 11')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    """
+    Routing decisions only; no query reaches the (unconfigured) replica
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.reads = []
+
+    def _request(self, method, token='Bearer member-token', write=False):
+        def view(request):
+            self.reads.append(router.db_for_read(Order))
+            if write:
+                router.db_for_write(Order)
+                self.reads.append(router.db_for_read(Order))
+            return HttpResponse()
+
+        request = getattr(self.factory, method)('/api/orders/my_orders/', HTTP_AUTHORIZATION=token)
+        ReplicaRoutingMiddleware(view)(request)
+
+    def test_safe_requests_read_from_replica(self):
+        self._request('get')
+        self._request('post')
+        self.assertEqual(self.reads, ['replica_1', 'default'])
+
+    def test_reads_after_a_write_stay_on_primary(self):
+        self._request('get', write=True)
+        self.assertEqual(self.reads, ['replica_1', 'default'])
+
+    def test_writer_is_pinned_to_primary(self):
+        self._request('post', write=True)
+        self._request('get')
+        self._request('get', token='Bearer other-token')
+        self.assertEqual(self.reads[-2:], ['default', 'replica_1'])
+
+        with override_settings(DATABASE_REPLICA_PIN_SECONDS=0):
+            cache.clear()
+            self._request('post', write=True)
+            self._request('get')
+        self.assertEqual(self.reads[-1], 'replica_1')
+
+    def test_primary_outside_requests(self):
+        self.assertEqual(router.db_for_read(Order), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Order), 'replica_1')
+
+
+SHARDS = {'INDIA': 'shard_india', 'AMERICA': 'shard_america'}
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class CountryShardRoutingTests(SimpleTestCase):
+    """
+    Routing decisions only; the shards aren't configured databases
+    """
+
+    def test_new_rows_go_to_their_country(self):
+        self.assertEqual(router.db_for_write(Order, instance=Order(country='AMERICA')), 'shard_america')
+        self.assertEqual(router.db_for_write(Restaurant, instance=Restaurant(country='INDIA')), 'shard_india')
+
+    def test_stored_rows_stay_where_they_were_read(self):
+        order = Order(id=1, country='INDIA')
+        order._state.adding = False
+        order._state.db = 'shard_america'
+        self.assertEqual(router.db_for_read(OrderItem, instance=order), 'shard_america')
+
+    def test_users_route_to_their_home_shard(self):
+        self.assertEqual(router.db_for_read(Order, instance=User(country='AMERICA')), 'shard_america')
+        self.assertEqual(router.db_for_read(Order, instance=User(role='admin')), 'shard_india')
+        # Users themselves stay on default
+        self.assertEqual(router.db_for_read(User), 'default')
+
+    def test_unhinted_queries_need_a_selected_shard(self):
+        with self.assertRaises(sharding.ShardNotSelected):
+            router.db_for_read(MenuItem)
+        with sharding.for_country('AMERICA'):
+            self.assertEqual(router.db_for_read(MenuItem), 'shard_america')
+        with sharding.using_shard():
+            sharding.select_shard('shard_india')
+            self.assertEqual(router.db_for_write(Order), 'shard_india')
+
+    def test_ids_name_their_shard(self):
+        self.assertEqual(sharding.id_range('shard_america'), (2 * 10 ** 12, 3 * 10 ** 12))
+        self.assertEqual(sharding.shard_for_pk(2 * 10 ** 12 + 5), 'shard_america')
+        self.assertEqual(sharding.shard_for_pk('1000000000001'), 'shard_india')
+        self.assertIsNone(sharding.shard_for_pk(7))
+        self.assertEqual(sharding.shards_for([10 ** 12, 2 * 10 ** 12, 10 ** 12 + 1]), ['shard_india', 'shard_america'])
+
+
+class ShardedQuerySetTests(TestCase):
+    """
+    Gathering logic, with each "shard" a slice of the default database
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        names = {'INDIA': ['Bombay Canteen', 'Dum Pukht', 'Indian Accent'],
+                 'AMERICA': ['Alinea', 'Canlis', 'Eleven Madison Park', 'Per Se']}
+        for country, restaurant_names in names.items():
+            for name in restaurant_names:
+                Restaurant.objects.create(name=name, address='x', country=country, phone_number='1')
+
+    def _sharded(self, queryset):
+        return sharding.ShardedQuerySet({
+            country: queryset.filter(country=country) for country in ('INDIA', 'AMERICA')
+        })
+
+    def test_slices_merge_in_queryset_order(self):
+        sharded = self._sharded(Restaurant.objects.order_by('name'))
+        expected = list(Restaurant.objects.order_by('name').values_list('name', flat=True))
+        self.assertEqual([restaurant.name for restaurant in sharded[2:5]], expected[2:5])
+        self.assertEqual(sharded.count(), 7)
+        self.assertTrue(sharded.filter(name='Per Se').exists())
+
+        descending = self._sharded(Restaurant.objects.order_by('-name'))
+        rows = descending.values_list('id', named=True)[:3]
+        # The ordering column comes along so rows can be merged
+        self.assertEqual([row.name for row in rows], expected[::-1][:3])
+
+    def test_iterator_merges_shard_streams_in_order(self):
+        Restaurant.objects.filter(name__in=['Canlis', 'Dum Pukht']).update(is_active=False)
+        for ordering in [('name',), ('-name',), ('is_active', '-name')]:
+            with self.subTest(ordering=ordering):
+                sharded = self._sharded(Restaurant.objects.order_by(*ordering))
+                # Nothing is read up front
+                with self.assertNumQueries(0):
+                    rows = sharded.iterator(chunk_size=2)
+
+                self.assertEqual(
+                    [restaurant.name for restaurant in rows],
+                    list(Restaurant.objects.order_by(*ordering).values_list('name', flat=True))
+                )
+
+    def test_get_searches_every_shard(self):
+        restaurant = Restaurant.objects.get(name='Canlis')
+        self.assertEqual(self._sharded(Restaurant.objects.all()).get(pk=restaurant.pk), restaurant)
+        with self.assertRaises(Restaurant.DoesNotExist):
+            self._sharded(Restaurant.objects.all()).get(name='Nowhere')
+
+    def test_updates_add_up(self):
+        sharded = self._sharded(Restaurant.objects.all())
+        self.assertEqual(sharded.update(description='Updated'), 7)
 
-# Create your tests here.
@@ -1,11 +1,24 @@
 # orders/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import OrderViewSet
+from .views import OrderViewSet, CartViewSet, AsyncMyOrdersView, order_events, order_events_ticket
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet, basename='order')
 
+cart = CartViewSet.as_view({'get': 'retrieve', 'delete': 'destroy'})
+cart_items = CartViewSet.as_view({'post': 'add_item'})
+cart_item = CartViewSet.as_view({'patch': 'update_item', 'delete': 'remove_item'})
+cart_checkout = CartViewSet.as_view({'post': 'checkout'})
+
 urlpatterns = [
+    path('cart/', cart, name='cart'),
+    path('cart/items/', cart_items, name='cart-items'),
+    path('cart/items/<int:menu_item_id>/', cart_item, name='cart-item'),
+    path('cart/checkout/', cart_checkout, name='cart-checkout'),
+    # Before the router, which would otherwise treat "events" as an order id
+    path('orders/events/', order_events, name='order-events'),
+    path('orders/events/ticket/', order_events_ticket, name='order-events-ticket'),
+    path('async/orders/my_orders/', AsyncMyOrdersView.as_view(), name='async-order-my-orders'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,29 +1,152 @@
 # orders/views.py
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.functional import cached_property
+from django.views.decorators.http import require_GET
 from rest_framework import viewsets, status, filters
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 
+from . import archive
+from .cart import Cart, CartBusy, CartChanged
+from .export import CSVRenderer, NDJSONRenderer, OrderExport
 from .models import Order, OrderItem
-from .serializers import OrderSerializer, OrderCreateSerializer, OrderStatusUpdateSerializer
-from users.permissions import CanPlaceOrder, CanCancelOrder
-from users.mixins import CountryFilterMixin
+from .serializers import (
+    OrderSerializer,
+    OrderCreateSerializer,
+    OrderStatusUpdateSerializer,
+    OrderBulkStatusUpdateSerializer,
+    OrderValuesSerializer,
+    CartItemSerializer,
+    CartItemUpdateSerializer,
+    CartCheckoutSerializer
+)
+from .pagination import OrderKeysetPagination
+from .events import (
+    STREAM_TICKET_TIMEOUT,
+    channels_for_user,
+    get_broker,
+    issue_stream_ticket,
+    publish_status_change,
+    redeem_stream_ticket,
+)
+from users.authentication import CachedJWTAuthentication
+from users.models import User
+from users.permissions import CanPlaceOrder, CanCancelOrder, IsAdmin, IsManager
+from users.mixins import CountryFilterMixin, ShardRoutingMixin, ValuesListMixin
+from food_ordering import sharding
+from food_ordering.async_views import AsyncReadView
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
 
 
-class OrderViewSet(CountryFilterMixin, viewsets.ModelViewSet):
+class OrderViewSet(ValuesListMixin, CountryFilterMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing orders.
+
+    Order payloads (list, retrieve, my_orders and the action responses)
+    accept ?fields=id,status,... to return only some fields. Items are left
+    out of such a sparse payload, and never loaded, unless 'items' is one
+    of the fields or ?expand=items is given. Without ?fields= the full
+    payload is returned.
+
+    Retrieve and my_orders also read orders that orders/archive.py moved to
+    the archive tables. Everything else sees only live orders.
     """
-    queryset = Order.objects.all().select_related('user', 'restaurant', 'payment_method').prefetch_related('items')
+    queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    values_serializer_class = OrderValuesSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
-    filterset_fields = ['status', 'restaurant', 'country']
+    # ?created_at__gte= / ?created_at__lt= select a date range
+    filterset_fields = {
+        'status': ['exact'],
+        'restaurant': ['exact'],
+        'country': ['exact'],
+        'created_at': ['gte', 'lt'],
+    }
     search_fields = ['user__username', 'restaurant__name']
     ordering_fields = ['created_at', 'updated_at', 'total_amount']
     ordering = ['-created_at']
 
+    # Relations each output field needs joined
+    field_relations = {'user_name': 'user', 'restaurant_name': 'restaurant'}
+
+    @cached_property
+    def requested_fields(self):
+        """
+        The OrderSerializer fields picked with ?fields= (plus ?expand=items),
+        or None for all of them
+        """
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+
+        fields = [name.strip() for name in fields.split(',') if name.strip()]
+        if 'items' in self.request.query_params.get('expand', '').split(','):
+            fields.append('items')
+
+        unknown = sorted(set(fields) - set(OrderSerializer.Meta.fields))
+        if unknown:
+            raise ValidationError({'fields': [f'Unknown field(s): {", ".join(unknown)}']})
+        return fields
+
+    @property
+    def includes_items(self):
+        return self.requested_fields is None or 'items' in self.requested_fields
+
+    def get_queryset(self):
+        """
+        Join and prefetch only what the requested fields render
+        """
+        queryset = super().get_queryset()
+
+        fields = self.requested_fields or OrderSerializer.Meta.fields
+        relations = [self.field_relations[name] for name in fields if name in self.field_relations]
+        if relations:
+            queryset = queryset.select_related(*relations)
+
+        if self.includes_items:
+            queryset = queryset.prefetch_related(
+                Prefetch('items', queryset=OrderItem.objects.select_related('menu_item'))
+            )
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.get_serializer_class() is OrderSerializer:
+            kwargs.setdefault('fields', self.requested_fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_values_serializer(self, **kwargs):
+        kwargs.setdefault('fields', self.requested_fields)
+        return super().get_values_serializer(**kwargs)
+
+    def order_data(self, order):
+        """
+        The (possibly sparse) representation of `order` for action responses
+        """
+        return OrderSerializer(
+            order, fields=self.requested_fields, context=self.get_serializer_context()
+        ).data
+
+    @property
+    def paginator(self):
+        """
+        Opt-in keyset pagination with ?pagination=cursor.
+        Cursor pages are always newest first and skip the COUNT(*).
+        """
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = OrderKeysetPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
     def get_serializer_class(self):
         """
         Use different serializers for different actions
@@ -32,6 +155,8 @@ class OrderViewSet(CountryFilterMixin, viewsets.ModelViewSet):
             return OrderCreateSerializer
         elif self.action == 'update_status':
             return OrderStatusUpdateSerializer
+        elif self.action == 'bulk_update_status':
+            return OrderBulkStatusUpdateSerializer
         return OrderSerializer
 
     def get_permissions(self):
@@ -43,17 +168,40 @@ class OrderViewSet(CountryFilterMixin, viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated, CanPlaceOrder]
         elif self.action in ['place_order', 'cancel']:
             permission_classes = [IsAuthenticated, CanPlaceOrder]
+        elif self.action == 'bulk_update_status':
+            permission_classes = [IsAuthenticated, IsManager]
+        elif self.action == 'export':
+            permission_classes = [IsAuthenticated, IsAdmin]
         else:
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        An order, or failing that an archived one from the archive tables
+        """
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            index = archive.find_archived(kwargs['pk'])
+            if index is None or not self.is_country_visible(index.country):
+                raise
+
+        serializer = self.get_values_serializer()
+        data = serializer.to_representation(serializer.values(archive.archived_order(index)))
+        if not data:
+            raise Http404('No Order matches the given query.')
+        return Response(data[0])
+
     def perform_create(self, serializer):
         """
-        Set the user and country when creating an order
+        Set the user and country when creating an order.
+        An order belongs to its restaurant's country (and country shard),
+        which for managers and members is their own (validate_restaurant).
         """
         serializer.save(
             user=self.request.user,
-            country=self.request.user.country
+            country=serializer.validated_data['restaurant'].country
         )
 
     @action(detail=True, methods=['post'])
@@ -63,23 +211,20 @@ class OrderViewSet(CountryFilterMixin, viewsets.ModelViewSet):
         """
         order = self.get_object()
         
-        if order.user != request.user and request.user.role not in ['admin', 'manager']:
+        if order.user_id != request.user.id and request.user.role not in ['admin', 'manager']:
             return Response(
                 {'error': 'You can only place your own orders'},
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        if order.status != 'PENDING':
+        if not order.transition_to('CONFIRMED', from_statuses=['PENDING']):
             return Response(
                 {'error': 'Order has already been placed'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        order.status = 'CONFIRMED'
-        order.save()
-
         return Response(
-            {'status': 'Order placed successfully', 'order': OrderSerializer(order).data},
+            {'status': 'Order placed successfully', 'order': self.order_data(order)},
             status=status.HTTP_200_OK
         )
 
@@ -90,21 +235,19 @@ class OrderViewSet(CountryFilterMixin, viewsets.ModelViewSet):
         """
         order = self.get_object()
 
-        if order.status == 'CANCELLED':
-            return Response(
-                {'error': 'Order is already cancelled'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        if order.status == 'DELIVERED':
+        if not order.transition_to('CANCELLED'):
+            # Only the failure path re-reads the status, to explain why
+            order.refresh_from_db(fields=['status'])
+            if order.status == 'CANCELLED':
+                return Response(
+                    {'error': 'Order is already cancelled'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             return Response(
                 {'error': 'Cannot cancel a delivered order'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        order.status = 'CANCELLED'
-        order.save()
-
         return Response(
             {'status': 'Order cancelled successfully'},
             status=status.HTTP_200_OK
@@ -113,31 +256,289 @@ class OrderViewSet(CountryFilterMixin, viewsets.ModelViewSet):
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         """
-        Update order status (Admin and Manager only)
+        Update order status (Admin and Manager only).
+
+        Only moves allowed by Order.ALLOWED_TRANSITIONS from the stored
+        status apply, one step at a time; anything else (skipping a step,
+        the current status, a missing status, or losing a race with another
+        change) is a 400 and publishes nothing.
         """
         order = self.get_object()
         serializer = self.get_serializer(order, data=request.data, partial=True)
 
-        if serializer.is_valid():
-            serializer.save()
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if 'status' not in serializer.validated_data:
+            return Response({'status': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        new_status = serializer.validated_data['status']
+        if not order.transition_to(new_status):
+            order.refresh_from_db(fields=['status'])
             return Response(
-                {'status': 'Order status updated successfully', 'order': OrderSerializer(order).data},
-                status=status.HTTP_200_OK
+                {'status': [f'Cannot change status from {order.status} to {new_status}.']},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'status': 'Order status updated successfully', 'order': self.order_data(order)},
+            status=status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request):
+        """
+        Move many orders to one status (Admin and Manager only).
+        Body: {"ids": [...], "status": "OUT_FOR_DELIVERY"}
+
+        Costs two queries per database whatever the number of ids, in one
+        transaction: read the orders' statuses with SELECT ... FOR UPDATE,
+        then one conditional UPDATE of those whose status may legally move
+        to the target. The row locks keep concurrent changes out until
+        commit, so the statuses read are the ones the UPDATE replaced and
+        are reported as each event's previous_status. Managers only reach
+        orders from their own country.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        new_status = serializer.validated_data['status']
+        sources = Order.statuses_leading_to(new_status)
+
+        scope = self.scatter_for_admin(
+            self.get_queryset().select_related(None).prefetch_related(None).filter(id__in=ids)
+        )
+        databases = scope.querysets if isinstance(scope, sharding.ShardedQuerySet) else {scope.db: scope}
+
+        stamp = timezone.now()
+        current = {}
+        applied = set()
+        for alias, queryset in databases.items():
+            with transaction.atomic(using=alias):
+                # Locked in id order, so two bulk updates can't deadlock
+                rows = queryset.select_for_update().order_by('id').values_list(
+                    'id', 'status', 'user_id', 'country'
+                )
+                movable = []
+                for order_id, order_status, user_id, country in rows:
+                    current[order_id] = order_status
+                    if order_status in sources:
+                        movable.append(order_id)
+                        order = Order(id=order_id, user_id=user_id, country=country,
+                                      status=new_status, updated_at=stamp)
+                        order._state.db = alias
+                        publish_status_change(order, order_status)
+                if movable:
+                    queryset.filter(id__in=movable).transition(new_status, updated_at=stamp)
+                    applied.update(movable)
+
+        results = []
+        for order_id in ids:
+            if order_id in applied:
+                results.append({'id': order_id, 'result': 'updated', 'status': new_status})
+            elif order_id not in current:
+                results.append({'id': order_id, 'result': 'not_found'})
+            else:
+                results.append({
+                    'id': order_id,
+                    'result': 'invalid_transition',
+                    'status': current[order_id],
+                })
+
+        return Response(
+            {'updated': len(applied), 'results': results},
+            status=status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Stream every order matching the list filters, with its items, as a
+        CSV (default, one row per item) or NDJSON (?format=ndjson, one order
+        per line) download (Admin only). One query, no COUNT, no pages.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        return OrderExport(queryset, self.get_serializer_context()).response(
+            request._request, request.accepted_renderer.format
+        )
 
     @action(detail=False, methods=['get'])
     def my_orders(self, request):
         """
-        Get current user's orders
+        Get current user's orders, archived ones included
+        """
+        queryset = self.scatter_for_admin(self.get_queryset().filter(user=request.user))
+        return self.values_list_response(archive.with_archived(queryset, request.user))
+
+
+class CartViewSet(ShardRoutingMixin, viewsets.ViewSet):
+    """
+    The current user's cart, kept in the cache until checkout.
+
+    GET    /api/cart/                        the cart at today's prices
+    DELETE /api/cart/                        empty it
+    POST   /api/cart/items/                  {"menu_item", "quantity", "special_instructions"}
+    PATCH  /api/cart/items/<menu_item_id>/   {"quantity"} (0 removes the line)
+    DELETE /api/cart/items/<menu_item_id>/
+    POST   /api/cart/checkout/               {"delivery_address", "payment_method", "special_instructions"}
+
+    Checkout writes a CONFIRMED order. Like placing orders, editing the
+    cart is for Admins and Managers only.
+    """
+    permission_classes = [IsAuthenticated, CanPlaceOrder]
+
+    def edit(self, request, change, *args):
+        """
+        Apply `change` (a Cart method) under the cart lock and return the cart
+        """
+        cart = Cart(request.user)
+        try:
+            with cart.locked():
+                getattr(cart, change)(*args)
+        except CartBusy:
+            return Response(
+                {'error': 'Your cart is being updated by another request, try again'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(cart.to_representation())
+
+    def retrieve(self, request):
+        return Response(Cart(request.user).load().to_representation())
+
+    def destroy(self, request):
+        return self.edit(request, 'clear')
+
+    def add_item(self, request):
+        serializer = CartItemSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        return self.edit(request, 'add', data['menu_item'], data['quantity'], data['special_instructions'])
+
+    def update_item(self, request, menu_item_id):
+        serializer = CartItemUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        return self.edit(request, 'update', menu_item_id, data['quantity'], data.get('special_instructions'))
+
+    def remove_item(self, request, menu_item_id):
+        return self.edit(request, 'remove', menu_item_id)
+
+    def checkout(self, request):
+        """
+        Turn the cart into a CONFIRMED order: one transaction for the order
+        and its items. 409 with the repriced cart if a menu price changed.
         """
-        queryset = self.get_queryset().filter(user=request.user)
-        page = self.paginate_queryset(queryset)
+        serializer = CartCheckoutSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        cart = Cart(request.user)
+        try:
+            with cart.locked():
+                order = cart.checkout(**serializer.validated_data)
+        except CartBusy:
+            return Response(
+                {'error': 'Your cart is being updated by another request, try again'},
+                status=status.HTTP_409_CONFLICT
+            )
+        except CartChanged:
+            return Response(
+                {'error': 'Some prices changed since you added the items. Review your cart and check out again.',
+                 'cart': cart.to_representation()},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        # Two reads (the order and its lines) instead of one per line
+        serializer = OrderValuesSerializer({'request': request})
+        rows = serializer.values(Order.objects.using(order._state.db).filter(pk=order.pk))
+        return Response(
+            {'status': 'Order placed successfully', 'order': serializer.to_representation(rows)[0]},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class AsyncMyOrdersView(AsyncReadView):
+    """
+    GET /api/async/orders/my_orders/: my_orders on the event loop.
+    Page-number pagination only; ?pagination=cursor stays on the sync endpoint.
+    """
+    viewset_class = OrderViewSet
+    action = 'my_orders'
+
+    async def respond(self, viewset):
+        user = viewset.request.user
+        queryset = viewset.scatter_for_admin(viewset.get_queryset().filter(user=user))
+        # A cache hit, or one query on the archive index
+        queryset = await sync_to_async(archive.with_archived)(queryset, user)
+        return await self.paginated(viewset, queryset)
+
+
+# Seconds between keepalive comments on an idle event stream
+EVENT_STREAM_HEARTBEAT = 15
+
+
+def _authenticate_event_stream(request):
+    """
+    Resolve the JWT user from the Authorization header, or from a stream
+    ticket in ?ticket= since browsers' EventSource can't send headers.
+    None if unauthenticated.
+    """
+    authenticator = CachedJWTAuthentication()
+    header = authenticator.get_header(request)
+    if header is None:
+        user_id = redeem_stream_ticket(request.GET.get('ticket', ''))
+        user = User.objects.filter(pk=user_id, is_active=True).first() if user_id else None
+        if user is None:
+            return None
+    else:
+        raw_token = authenticator.get_raw_token(header)
+        if not raw_token:
+            return None
+        try:
+            user = authenticator.get_user(authenticator.get_validated_token(raw_token))
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+    if user.role not in ['admin', 'manager', 'member']:
+        return None
+    return user
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def order_events_ticket(request):
+    """
+    POST /api/orders/events/ticket/: a single-use ticket for opening the
+    event stream with ?ticket=, valid for STREAM_TICKET_TIMEOUT seconds
+    """
+    return Response(
+        {'ticket': issue_stream_ticket(request.user), 'expires_in': STREAM_TICKET_TIMEOUT},
+        status=status.HTTP_201_CREATED
+    )
+
+
+@require_GET
+async def order_events(request):
+    """
+    Server-Sent Events stream of order status changes (serve under ASGI).
+    Members get their own orders, managers their country, admins everything.
+    """
+    user = await sync_to_async(_authenticate_event_stream)(request)
+    if user is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided or are invalid.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    channels = channels_for_user(user)
 
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+    async def stream():
+        yield 'retry: 5000\n\n'
+        async for message in get_broker().listen(channels, EVENT_STREAM_HEARTBEAT):
+            if message is None:
+                yield ': keepalive\n\n'
+            else:
+                yield f'event: status\ndata: {message}\n\n'
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,8 +1,9 @@
 # payments/serializers.py
 from rest_framework import serializers
 from .models import PaymentMethod
+from food_ordering.metrics import TimedSerializerMixin
 
-class PaymentMethodSerializer(serializers.ModelSerializer):
+class PaymentMethodSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     payment_type_display = serializers.CharField(source='get_payment_type_display', read_only=True)
     
     class Meta:
@@ -8,9 +8,11 @@ from .models import PaymentMethod
 from .serializers import PaymentMethodSerializer
 from .permissions import CanUpdatePaymentMethod
 from users.permissions import IsAdmin
+from users.mixins import ShardRoutingMixin
+from food_ordering import sharding
 
 
-class PaymentMethodViewSet(viewsets.ModelViewSet):
+class PaymentMethodViewSet(ShardRoutingMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing payment methods.
     - All users can CREATE their own payment methods (needed for checkout)
@@ -46,7 +48,7 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
         if user.role == 'admin':
-            return PaymentMethod.objects.all()
+            return sharding.scatter(PaymentMethod.objects.all())
         return PaymentMethod.objects.filter(user=user)
 
     def perform_create(self, serializer):
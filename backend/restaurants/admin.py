@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Restaurant, MenuItem
+from .models import Restaurant, MenuCategory, MenuItem
 
 print("=" * 50)
 print("RESTAURANTS ADMIN.PY IS LOADING!")
@@ -11,9 +11,20 @@ class RestaurantAdmin(admin.ModelAdmin):
     list_filter = ['is_active']
     search_fields = ['name', 'address']
 
+class MenuCategoryListFilter(admin.RelatedFieldListFilter):
+    """
+    Category choices with their restaurants in one query
+    (MenuCategory.__str__ includes the restaurant name)
+    """
+    def field_choices(self, field, request, model_admin):
+        categories = MenuCategory.objects.select_related('restaurant').order_by('restaurant__name', 'name')
+        return [(category.pk, str(category)) for category in categories]
+
 @admin.register(MenuItem)
 class MenuItemAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'price', 'is_available']
-    list_filter = ['category', 'is_available', 'is_vegetarian']
+    list_filter = [('category', MenuCategoryListFilter), 'is_available', 'is_vegetarian']
+    list_select_related = ['category__restaurant', 'restaurant']
+    raw_id_fields = ['category', 'restaurant']
     search_fields = ['name']
 
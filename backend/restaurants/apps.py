@@ -5,4 +5,5 @@ class RestaurantsConfig(AppConfig):
     name = 'restaurants'
     
     def ready(self):
-        import restaurants.admin  # Explicitly import admin
\ No newline at end of file
+        import restaurants.admin  # Explicitly import admin
+        import restaurants.signals  # Menu cache invalidation, search index
\ No newline at end of file
@@ -0,0 +1,105 @@
+# restaurants/cache.py
+from food_ordering import cache as app_cache
+
+from .models import MenuCategory, MenuItem
+from .serializers import MenuCategorySerializer, MenuItemSerializer
+
+# Menus change a few times a day; the tag bump on every write is what
+# actually keeps them fresh, the timeout only bounds memory.
+MENU_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def menu_tag(restaurant_id):
+    return f'restaurant:{restaurant_id}:menu'
+
+
+def invalidate_menu(restaurant_id):
+    """
+    Make every cached copy of this restaurant's menu stale
+    """
+    app_cache.invalidate_tags(menu_tag(restaurant_id))
+
+
+def _active_categories(restaurant):
+    return MenuCategory.objects.filter(restaurant=restaurant, is_active=True)
+
+
+def _available_items(categories):
+    return MenuItem.objects.filter(
+        category_id__in=[category.id for category in categories],
+        is_available=True
+    )
+
+
+def build_menu(restaurant):
+    """
+    Build the menu payload for a restaurant with two queries:
+    one for the active categories and one for all their available items.
+    """
+    categories = list(_active_categories(restaurant))
+    return _assemble_menu(restaurant, categories, _available_items(categories))
+
+
+async def abuild_menu(restaurant):
+    """
+    build_menu() through the async ORM
+    """
+    categories = [category async for category in _active_categories(restaurant)]
+    items = [item async for item in _available_items(categories)]
+    return _assemble_menu(restaurant, categories, items)
+
+
+def _assemble_menu(restaurant, categories, items):
+    items_by_category = {category.id: [] for category in categories}
+    for item in items:
+        items_by_category[item.category_id].append(item)
+
+    menu_data = []
+    for category in categories:
+        # Point the relations at the objects we already hold so the
+        # serializers' restaurant_name/category_name lookups stay in memory
+        category.restaurant = restaurant
+        category_items = items_by_category[category.id]
+        for item in category_items:
+            item.category = category
+            item.restaurant = restaurant
+        menu_data.append({
+            'category': MenuCategorySerializer(category).data,
+            'items': MenuItemSerializer(category_items, many=True).data
+        })
+    return menu_data
+
+
+def get_cached_menu(restaurant_id):
+    """
+    Return the cached menu entry ({'country': ..., 'menu': [...]}) or None
+    """
+    return app_cache.cache_get(f'menu:{restaurant_id}', tags=[menu_tag(restaurant_id)])
+
+
+def cache_menu(restaurant):
+    """
+    Return the menu entry for a restaurant, building and caching it on a miss.
+    Concurrent misses for the same menu build it once.
+    """
+    return app_cache.get_or_set(
+        f'menu:{restaurant.id}',
+        lambda: {'country': restaurant.country, 'menu': build_menu(restaurant)},
+        timeout=MENU_CACHE_TIMEOUT,
+        tags=[menu_tag(restaurant.id)],
+    )
+
+
+async def acache_menu(restaurant):
+    """
+    cache_menu() for async views
+    """
+    async def build():
+        return {'country': restaurant.country, 'menu': await abuild_menu(restaurant)}
+
+    return await app_cache.aget_or_set(
+        f'menu:{restaurant.id}',
+        build,
+        timeout=MENU_CACHE_TIMEOUT,
+        tags=[menu_tag(restaurant.id)],
+    )
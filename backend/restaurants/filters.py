@@ -0,0 +1,40 @@
+# restaurants/filters.py
+import django_filters
+from rest_framework.exceptions import ValidationError
+
+from .models import MenuItem
+
+
+class MenuItemFilter(django_filters.FilterSet):
+    """
+    The dietary filters go through MenuItem.dietary_flags:
+    ?is_vegan=true&is_gluten_free=true, or the shorthand
+    ?dietary=vegan,gluten_free (all of them must apply)
+    """
+    is_vegetarian = django_filters.BooleanFilter(method='filter_dietary_flag')
+    is_vegan = django_filters.BooleanFilter(method='filter_dietary_flag')
+    is_gluten_free = django_filters.BooleanFilter(method='filter_dietary_flag')
+    dietary = django_filters.CharFilter(method='filter_dietary')
+    # Plain id matches: no lookup query to validate the restaurant or
+    # category first (which async views couldn't run anyway)
+    restaurant = django_filters.NumberFilter(field_name='restaurant_id')
+    category = django_filters.NumberFilter(field_name='category_id')
+
+    class Meta:
+        model = MenuItem
+        fields = ['category', 'restaurant', 'is_available']
+
+    def filter_dietary_flag(self, queryset, name, value):
+        if value is None:
+            return queryset
+        return queryset.with_dietary(**{name.removeprefix('is_'): value})
+
+    def filter_dietary(self, queryset, name, value):
+        names = [part.strip() for part in value.split(',') if part.strip()]
+        unknown = [part for part in names if part not in MenuItem.DIETARY_BITS]
+        if unknown:
+            raise ValidationError({name: [
+                f'Unknown dietary flag(s): {", ".join(unknown)}. '
+                f'Choose from {", ".join(MenuItem.DIETARY_BITS)}.'
+            ]})
+        return queryset.with_dietary(**dict.fromkeys(names, True))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0002_restaurant_country'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='menucategory',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['restaurant', 'display_order', 'name'], name='menucategory_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['category', 'name'], name='menuitem_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['country', 'is_active', 'name'], name='restaurant_country_active_idx'),
+        ),
+    ]
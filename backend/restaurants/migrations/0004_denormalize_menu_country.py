@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_denormalized_fields(apps, schema_editor):
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+    MenuCategory = apps.get_model('restaurants', 'MenuCategory')
+    MenuItem = apps.get_model('restaurants', 'MenuItem')
+    db_alias = schema_editor.connection.alias
+
+    MenuCategory.objects.using(db_alias).update(
+        country=Subquery(
+            Restaurant.objects.filter(pk=OuterRef('restaurant_id')).values('country')[:1]
+        )
+    )
+    categories = MenuCategory.objects.filter(pk=OuterRef('category_id'))
+    MenuItem.objects.using(db_alias).update(
+        restaurant_id=Subquery(categories.values('restaurant_id')[:1]),
+        country=Subquery(categories.values('country')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+    # The backfill UPDATEs must commit before menuitem.restaurant becomes
+    # NOT NULL: PostgreSQL refuses to ALTER a table with pending trigger
+    # events (its deferred FK checks) in the same transaction.
+    atomic = False
+
+    dependencies = [
+        ('restaurants', '0003_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menucategory',
+            name='country',
+            field=models.CharField(choices=[('INDIA', 'India'), ('AMERICA', 'America')], default='INDIA', editable=False, max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='country',
+            field=models.CharField(choices=[('INDIA', 'India'), ('AMERICA', 'America')], default='INDIA', editable=False, max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='restaurant',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurants.restaurant'),
+        ),
+        migrations.RunPython(populate_denormalized_fields, migrations.RunPython.noop, atomic=True),
+        migrations.AlterField(
+            model_name='menuitem',
+            name='restaurant',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurants.restaurant'),
+        ),
+        migrations.AddIndex(
+            model_name='menucategory',
+            index=models.Index(fields=['country', 'display_order'], name='menucategory_country_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['country', 'name'], name='menuitem_country_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['country', 'name'], name='menuitem_country_available_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations
+
+# Search tables and the source columns they index, with their weight class.
+# Kept literal here so later changes to restaurants/search.py don't rewrite
+# history; `manage.py rebuild_search_index` refills them with current code.
+SEARCH_TABLES = {
+    'restaurants_restaurant_search': (
+        'restaurants_restaurant', {'name': 'A', 'description': 'B', 'address': 'C'}
+    ),
+    'restaurants_menuitem_search': (
+        'restaurants_menuitem', {'name': 'A', 'description': 'B'}
+    ),
+}
+
+
+def create_search_tables(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    for table, (source_table, weights) in SEARCH_TABLES.items():
+        columns = ', '.join(weights)
+        if vendor == 'sqlite':
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {table} USING fts5({columns}, "
+                f"tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            schema_editor.execute(
+                f'INSERT INTO {table} (rowid, {columns}) SELECT id, {columns} FROM {source_table}'
+            )
+        elif vendor == 'postgresql':
+            document = ' || '.join(
+                f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weight}')"
+                for column, weight in weights.items()
+            )
+            schema_editor.execute(
+                f'CREATE TABLE {table} ('
+                f'id bigint PRIMARY KEY REFERENCES {source_table} (id) '
+                f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                f'document tsvector NOT NULL)'
+            )
+            schema_editor.execute(f'CREATE INDEX {table}_document_idx ON {table} USING GIN (document)')
+            schema_editor.execute(
+                f'INSERT INTO {table} (id, document) SELECT id, {document} FROM {source_table}'
+            )
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        for table in SEARCH_TABLES:
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0004_denormalize_menu_country'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
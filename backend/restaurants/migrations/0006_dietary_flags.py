@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:18
+
+from django.db import migrations, models
+from django.db.models import Case, IntegerField, Value, When
+
+
+def populate_dietary_flags(apps, schema_editor):
+    MenuItem = apps.get_model('restaurants', 'MenuItem')
+    db_alias = schema_editor.connection.alias
+
+    # 1 = vegetarian, 2 = vegan, 4 = gluten free (MenuItem.DIETARY_BITS)
+    bits = [('is_vegetarian', 1), ('is_vegan', 2), ('is_gluten_free', 4)]
+    MenuItem.objects.using(db_alias).update(dietary_flags=sum(
+        (Case(When(**{field: True}, then=Value(bit)), default=Value(0), output_field=IntegerField())
+         for field, bit in bits),
+        Value(0)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='dietary_flags',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_dietary_flags, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['restaurant', 'dietary_flags', 'is_available', 'category'], name='menuitem_restaurant_facet_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['country', 'dietary_flags', 'is_available', 'category'], name='menuitem_country_facet_idx'),
+        ),
+    ]
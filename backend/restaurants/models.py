@@ -1,9 +1,42 @@
 # restaurants/models.py
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import OuterRef, Subquery
 from django.conf import settings
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
 
+class RestaurantQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        update() that keeps the denormalized menu rows in step when it
+        changes `country`, like Restaurant.save() does: the menu rows of the
+        updated restaurants take their new country and their cached menus
+        are invalidated. Other post_save work (the search index) is skipped,
+        as for any bulk update.
+        """
+        if 'country' not in kwargs:
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            ids = list(self.values_list('pk', flat=True))
+            count = super().update(**kwargs)
+            # `country` may be an expression; read back what was stored
+            country = Subquery(
+                Restaurant.objects.using(self.db).filter(pk=OuterRef('restaurant_id')).values('country')[:1]
+            )
+            MenuCategory.objects.using(self.db).filter(restaurant_id__in=ids).update(country=country)
+            MenuItem.objects.using(self.db).filter(restaurant_id__in=ids).update(country=country)
+            transaction.on_commit(lambda: _invalidate_menus(ids), using=self.db)
+        return count
+
+
+def _invalidate_menus(restaurant_ids):
+    from .cache import invalidate_menu
+
+    for restaurant_id in restaurant_ids:
+        invalidate_menu(restaurant_id)
+
+
 class Restaurant(models.Model):
     COUNTRY_CHOICES = [
         ('INDIA', 'India'),
@@ -32,14 +65,48 @@ class Restaurant(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            # RestaurantViewSet: country (CountryFilterMixin) + ?is_active=, by name
+            models.Index(fields=['country', 'is_active', 'name'], name='restaurant_country_active_idx'),
+        ]
+
+    objects = RestaurantQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored country so save() knows when to propagate it
+        instance._loaded_country = instance.__dict__.get('country')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        country_changed = (
+            not self._state.adding and
+            getattr(self, '_loaded_country', None) != self.country
+        )
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        # The menu rows never disagree with the restaurant about its country
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            if country_changed:
+                self.propagate_country()
+        self._loaded_country = self.country
+
+    def propagate_country(self):
+        """
+        Copy this restaurant's country onto its denormalized menu rows.
+        Two bulk UPDATEs in one transaction, no per-row saves (so no
+        per-row signals either).
+        """
+        using = self._state.db
+        with transaction.atomic(using=using):
+            MenuCategory.objects.using(using).filter(restaurant=self).update(country=self.country)
+            MenuItem.objects.using(using).filter(restaurant=self).update(country=self.country)
 
 class MenuCategory(models.Model):
     name = models.CharField(max_length=50)
@@ -51,15 +118,103 @@ class MenuCategory(models.Model):
     )
     is_active = models.BooleanField(default=True)
     display_order = models.PositiveIntegerField(default=0)
+    # Denormalized from restaurant so CountryFilterMixin can filter without a join.
+    # Kept in sync by save() here and Restaurant.propagate_country().
+    country = models.CharField(max_length=10, choices=Restaurant.COUNTRY_CHOICES, editable=False)
 
     class Meta:
         verbose_name_plural = 'Menu Categories'
         ordering = ['display_order', 'name']
+        indexes = [
+            # Active categories of a restaurant in display order (menu, ?is_active=true)
+            models.Index(
+                fields=['restaurant', 'display_order', 'name'],
+                condition=models.Q(is_active=True),
+                name='menucategory_active_idx',
+            ),
+            models.Index(fields=['country', 'display_order'], name='menucategory_country_idx'),
+        ]
 
     def __str__(self):
         return f"{self.restaurant.name} - {self.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_owner = (instance.__dict__.get('restaurant_id'), instance.__dict__.get('country'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.country = self.restaurant.country
+        owner_changed = (
+            not self._state.adding and
+            getattr(self, '_loaded_owner', None) != (self.restaurant_id, self.country)
+        )
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            if owner_changed:
+                # Category moved to another restaurant (or was out of sync)
+                MenuItem.objects.using(using).filter(category=self).update(
+                    restaurant_id=self.restaurant_id, country=self.country
+                )
+        self._loaded_owner = (self.restaurant_id, self.country)
+
+class MenuItemQuerySet(models.QuerySet):
+    def with_dietary(self, **flags):
+        """
+        Filter on the dietary booleans through the dietary_flags bitmask,
+        e.g. with_dietary(vegan=True, gluten_free=False). Compiles to
+        dietary_flags IN (...), which the facet indexes can seek on.
+        """
+        values = range(1 << len(MenuItem.DIETARY_BITS))
+        for name, wanted in flags.items():
+            bit = MenuItem.DIETARY_BITS[name]
+            values = [value for value in values if bool(value & bit) == wanted]
+        return self.filter(dietary_flags__in=list(values))
+
+    def facet_counts(self):
+        """
+        Item counts per dietary flag, category and availability for this
+        queryset, from one GROUP BY over (dietary_flags, category, is_available)
+        """
+        groups = (
+            self.order_by()
+            .values_list('dietary_flags', 'category_id', 'category__name', 'is_available')
+            .annotate(count=models.Count('*'))
+        )
+
+        dietary = dict.fromkeys(MenuItem.DIETARY_BITS, 0)
+        categories = {}
+        availability = {'true': 0, 'false': 0}
+        total = 0
+        for flags, category_id, category_name, is_available, count in groups:
+            total += count
+            for name, bit in MenuItem.DIETARY_BITS.items():
+                if flags & bit:
+                    dietary[name] += count
+            category = categories.setdefault(
+                category_id, {'id': category_id, 'name': category_name, 'count': 0}
+            )
+            category['count'] += count
+            availability['true' if is_available else 'false'] += count
+
+        return {
+            'total': total,
+            'dietary': dietary,
+            'category': sorted(categories.values(), key=lambda category: category['name']),
+            'is_available': availability,
+        }
+
+
 class MenuItem(models.Model):
+    # Bit in dietary_flags for each is_<name> boolean
+    DIETARY_BITS = {
+        'vegetarian': 1,
+        'vegan': 2,
+        'gluten_free': 4,
+    }
+
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -76,9 +231,73 @@ class MenuItem(models.Model):
     preparation_time = models.PositiveIntegerField(help_text="Preparation time in minutes", default=15)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized from category.restaurant so country filtering and restaurant
+    # lookups skip the menu_item -> menu_category -> restaurant join.
+    # Kept in sync by save() here, MenuCategory.save() and Restaurant.propagate_country().
+    restaurant = models.ForeignKey(
+        'Restaurant',
+        on_delete=models.CASCADE,
+        related_name='+',
+        editable=False
+    )
+    country = models.CharField(max_length=10, choices=Restaurant.COUNTRY_CHOICES, editable=False)
+    # is_vegetarian / is_vegan / is_gluten_free packed as DIETARY_BITS, so a
+    # dietary filter plus facet counts is one pass over a narrow index.
+    # Kept in sync by save(); set it yourself when using bulk_create/update.
+    dietary_flags = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    objects = MenuItemQuerySet.as_manager()
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Available items per category by name (menu, ?is_available=true)
+            models.Index(
+                fields=['category', 'name'],
+                condition=models.Q(is_available=True),
+                name='menuitem_available_idx',
+            ),
+            # MenuItemViewSet for managers/members, by name, optionally ?is_available=true
+            models.Index(fields=['country', 'name'], name='menuitem_country_idx'),
+            models.Index(
+                fields=['country', 'name'],
+                condition=models.Q(is_available=True),
+                name='menuitem_country_available_idx',
+            ),
+            # MenuItemQuerySet.with_dietary / facet_counts, per restaurant or per country
+            models.Index(
+                fields=['restaurant', 'dietary_flags', 'is_available', 'category'],
+                name='menuitem_restaurant_facet_idx',
+            ),
+            models.Index(
+                fields=['country', 'dietary_flags', 'is_available', 'category'],
+                name='menuitem_country_facet_idx',
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.category.restaurant.name} - {self.name} (${self.price})"
\ No newline at end of file
+        return f"{self.restaurant.name} - {self.name} (${self.price})"
+
+    @classmethod
+    def dietary_flags_for(cls, is_vegetarian=False, is_vegan=False, is_gluten_free=False):
+        flags = {'vegetarian': is_vegetarian, 'vegan': is_vegan, 'gluten_free': is_gluten_free}
+        return sum(bit for name, bit in cls.DIETARY_BITS.items() if flags[name])
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The restaurant whose cached menu lists this item until it moves
+        instance._loaded_restaurant_id = instance.__dict__.get('restaurant_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.restaurant_id = self.category.restaurant_id
+        self.country = self.category.country
+        self.dietary_flags = self.dietary_flags_for(
+            self.is_vegetarian, self.is_vegan, self.is_gluten_free
+        )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'is_vegetarian', 'is_vegan', 'is_gluten_free'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'dietary_flags'}
+        super().save(*args, **kwargs)
+        self._loaded_restaurant_id = self.restaurant_id
\ No newline at end of file
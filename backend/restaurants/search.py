@@ -0,0 +1,184 @@
+# restaurants/search.py
+"""
+Full-text search for restaurants and menu items.
+
+Each indexed model has a companion table holding an inverted index, keyed by
+the model's id:
+
+- SQLite: an FTS5 virtual table (rowid = id), ranked with bm25()
+- PostgreSQL: (id, document tsvector) with a GIN index, ranked with ts_rank()
+
+The tables are created by migration 0005_search_index, kept current by the
+handlers in signals.py, and can be refilled with
+``python manage.py rebuild_search_index`` (e.g. after bulk_create, which
+sends no signals). On any other database FullTextSearchFilter falls back to
+DRF's SearchFilter.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+
+from .models import Restaurant, MenuItem
+
+SUPPORTED_VENDORS = ('sqlite', 'postgresql')
+
+# Words beyond this are ignored, to bound the cost of a query
+MAX_SEARCH_WORDS = 8
+
+WORD_RE = re.compile(r'\w+')
+
+# bm25() column weights for the setweight() classes PostgreSQL uses
+BM25_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 2.0, 'D': 1.0}
+
+
+class SearchIndex:
+    """
+    The search table for `model`. `weights` maps each indexed text field to
+    its weight class, 'A' (strongest) to 'D'.
+    """
+
+    def __init__(self, model, weights):
+        self.model = model
+        self.weights = weights
+        self.source_table = model._meta.db_table
+        self.table = f'{self.source_table}_search'
+
+    def is_supported(self, using):
+        return connections[using].vendor in SUPPORTED_VENDORS
+
+    def _document_sql(self):
+        """
+        PostgreSQL tsvector expression over the source table's columns
+        """
+        return ' || '.join(
+            f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weight}')"
+            for column, weight in self.weights.items()
+        )
+
+    def _execute(self, using, statements):
+        with connections[using].cursor() as cursor:
+            for sql, params in statements:
+                cursor.execute(sql, params)
+
+    def update(self, ids, using='default'):
+        """
+        (Re)index the source rows with these ids, reading their current
+        values from the source table inside the caller's transaction
+        """
+        ids = list(ids)
+        if not ids or not self.is_supported(using):
+            return
+
+        if connections[using].vendor == 'postgresql':
+            self._execute(using, [(
+                f'INSERT INTO {self.table} (id, document) '
+                f'SELECT id, {self._document_sql()} FROM {self.source_table} WHERE id = ANY(%s) '
+                f'ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document',
+                [ids],
+            )])
+        else:
+            columns = ', '.join(self.weights)
+            placeholders = ', '.join(['%s'] * len(ids))
+            self._execute(using, [
+                (f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', ids),
+                (f'INSERT INTO {self.table} (rowid, {columns}) '
+                 f'SELECT id, {columns} FROM {self.source_table} WHERE id IN ({placeholders})', ids),
+            ])
+
+    def remove(self, ids, using='default'):
+        ids = list(ids)
+        if not ids or not self.is_supported(using):
+            return
+
+        key = 'id' if connections[using].vendor == 'postgresql' else 'rowid'
+        placeholders = ', '.join(['%s'] * len(ids))
+        self._execute(using, [(f'DELETE FROM {self.table} WHERE {key} IN ({placeholders})', ids)])
+
+    def rebuild(self, using='default'):
+        """
+        Refill the whole index from the source table. Returns the row count.
+        """
+        if not self.is_supported(using):
+            return 0
+
+        if connections[using].vendor == 'postgresql':
+            statements = [
+                (f'DELETE FROM {self.table}', []),
+                (f'INSERT INTO {self.table} (id, document) '
+                 f'SELECT id, {self._document_sql()} FROM {self.source_table}', []),
+            ]
+        else:
+            columns = ', '.join(self.weights)
+            statements = [
+                (f'DELETE FROM {self.table}', []),
+                (f'INSERT INTO {self.table} (rowid, {columns}) '
+                 f'SELECT id, {columns} FROM {self.source_table}', []),
+            ]
+        self._execute(using, statements)
+        return self.model._default_manager.using(using).count()
+
+    def search(self, queryset, words):
+        """
+        Narrow `queryset` to rows matching every word (as a prefix) and
+        annotate them with `search_rank`, higher is better
+        """
+        source_id = f'"{self.source_table}"."id"'
+
+        if connections[queryset.db].vendor == 'postgresql':
+            query = ' & '.join(f'{word}:*' for word in words)
+            matches = RawSQL(
+                f"SELECT id FROM {self.table} WHERE document @@ to_tsquery('simple', %s)", [query]
+            )
+            rank = RawSQL(
+                f"(SELECT ts_rank(document, to_tsquery('simple', %s)) FROM {self.table} "
+                f"WHERE {self.table}.id = {source_id})",
+                [query], output_field=FloatField()
+            )
+        else:
+            query = ' '.join(f'"{word}"*' for word in words)
+            weights = ', '.join(str(BM25_WEIGHTS[weight]) for weight in self.weights.values())
+            matches = RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [query])
+            # bm25() is lower for better matches
+            rank = RawSQL(
+                f'(SELECT -bm25({self.table}, {weights}) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s AND rowid = {source_id})',
+                [query], output_field=FloatField()
+            )
+
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+RESTAURANT_SEARCH = SearchIndex(Restaurant, {'name': 'A', 'description': 'B', 'address': 'C'})
+MENU_ITEM_SEARCH = SearchIndex(MenuItem, {'name': 'A', 'description': 'B'})
+
+SEARCH_INDEXES = [RESTAURANT_SEARCH, MENU_ITEM_SEARCH]
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    ?search= backed by the view's `search_index`.
+
+    Every word must match, as a prefix, in any indexed field. Results come
+    best match first unless ?ordering= is given; the view's default
+    ordering breaks ties. The queryset is already scoped by
+    CountryFilterMixin, so results never leave the user's country.
+    Put this after OrderingFilter in filter_backends.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        index = getattr(view, 'search_index', None)
+        if index is None or not index.is_supported(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        words = WORD_RE.findall(' '.join(self.get_search_terms(request)))[:MAX_SEARCH_WORDS]
+        if not words:
+            return queryset
+
+        queryset = index.search(queryset, words)
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('-search_rank', *(queryset.query.order_by or ['pk']))
+        return queryset
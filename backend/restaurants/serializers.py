@@ -1,15 +1,22 @@
 # restaurants/serializers.py
 from rest_framework import serializers
 from .models import Restaurant, MenuCategory, MenuItem
+from food_ordering.metrics import TimedSerializerMixin
+from food_ordering.values_serializers import ValuesSerializer
 
-class RestaurantSerializer(serializers.ModelSerializer):
+class RestaurantSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Restaurant
         fields = ['id', 'name', 'slug', 'description', 'address', 'country', 'phone_number',
                  'email', 'logo', 'banner', 'is_active', 'owner', 'created_at', 'updated_at']
         read_only_fields = ['id', 'slug', 'created_at', 'updated_at']
 
-class MenuCategorySerializer(serializers.ModelSerializer):
+class RestaurantValuesSerializer(ValuesSerializer):
+    """Fast list rendering, same output as RestaurantSerializer"""
+    model = Restaurant
+    fields = RestaurantSerializer.Meta.fields
+
+class MenuCategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     restaurant_name = serializers.CharField(source='restaurant.name', read_only=True)
     
     class Meta:
@@ -17,9 +24,9 @@ class MenuCategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'restaurant', 'restaurant_name', 'is_active', 'display_order']
         read_only_fields = ['id']
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
-    restaurant_name = serializers.CharField(source='category.restaurant.name', read_only=True)
+    restaurant_name = serializers.CharField(source='restaurant.name', read_only=True)
     
     class Meta:
         model = MenuItem
@@ -28,7 +35,13 @@ class MenuItemSerializer(serializers.ModelSerializer):
                  'restaurant_name', 'preparation_time', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class MenuItemDetailSerializer(serializers.ModelSerializer):
+class MenuItemValuesSerializer(ValuesSerializer):
+    """Fast list rendering, same output as MenuItemSerializer"""
+    model = MenuItem
+    fields = MenuItemSerializer.Meta.fields
+    sources = {'category_name': 'category__name', 'restaurant_name': 'restaurant__name'}
+
+class MenuItemDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Detailed serializer with nested category and restaurant info"""
     category = MenuCategorySerializer(read_only=True)
     
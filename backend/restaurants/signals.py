@@ -0,0 +1,62 @@
+# restaurants/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Restaurant, MenuCategory, MenuItem
+from .cache import invalidate_menu
+from .search import RESTAURANT_SEARCH, MENU_ITEM_SEARCH
+
+
+def _invalidate_on_commit(restaurant_id, using):
+    # After commit, so a reader can't rebuild the menu from pre-commit rows
+    # between the invalidation and the write becoming visible
+    transaction.on_commit(lambda: invalidate_menu(restaurant_id), using=using)
+
+
+@receiver([post_save, post_delete], sender=Restaurant)
+def restaurant_changed(sender, instance, using, **kwargs):
+    """
+    Restaurant name and country are part of the cached menu payload
+    """
+    _invalidate_on_commit(instance.id, using)
+
+
+def _invalidate_owners(restaurant_id, loaded_restaurant_id, using):
+    _invalidate_on_commit(restaurant_id, using)
+    # Moved to another restaurant: the old menu lists it as well
+    if loaded_restaurant_id is not None and loaded_restaurant_id != restaurant_id:
+        _invalidate_on_commit(loaded_restaurant_id, using)
+
+
+@receiver([post_save, post_delete], sender=MenuCategory)
+def menu_category_changed(sender, instance, using, **kwargs):
+    loaded_restaurant_id, _ = getattr(instance, '_loaded_owner', (None, None))
+    _invalidate_owners(instance.restaurant_id, loaded_restaurant_id, using)
+
+
+@receiver([post_save, post_delete], sender=MenuItem)
+def menu_item_changed(sender, instance, using, **kwargs):
+    _invalidate_owners(instance.restaurant_id, getattr(instance, '_loaded_restaurant_id', None), using)
+
+
+# Search index: written in the same transaction as the row itself
+
+@receiver(post_save, sender=Restaurant)
+def index_restaurant(sender, instance, using, **kwargs):
+    RESTAURANT_SEARCH.update([instance.id], using=using)
+
+
+@receiver(post_delete, sender=Restaurant)
+def unindex_restaurant(sender, instance, using, **kwargs):
+    RESTAURANT_SEARCH.remove([instance.id], using=using)
+
+
+@receiver(post_save, sender=MenuItem)
+def index_menu_item(sender, instance, using, **kwargs):
+    MENU_ITEM_SEARCH.update([instance.id], using=using)
+
+
+@receiver(post_delete, sender=MenuItem)
+def unindex_menu_item(sender, instance, using, **kwargs):
+    MENU_ITEM_SEARCH.remove([instance.id], using=using)
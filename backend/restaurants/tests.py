@@ -1,3 +1,479 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.permissions import BasePermission
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Restaurant, MenuCategory, MenuItem
+from .serializers import (
+    RestaurantSerializer,
+    RestaurantValuesSerializer,
+    MenuItemSerializer,
+    MenuItemValuesSerializer
+)
+from .views import RestaurantViewSet
+from users.models import User
+
+
+class ValuesSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='nick_fury', password='pass12345', role='admin', country='AMERICA'
+        )
+        cls.restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678', owner=cls.admin
+        )
+        Restaurant.objects.create(
+            name='Burger Palace', address='5th Avenue, New York', country='AMERICA',
+            phone_number='+1-212-5550100', is_active=False
+        )
+        category = MenuCategory.objects.create(name='Main Course', restaurant=cls.restaurant)
+        MenuItem.objects.create(
+            name='Paneer Tikka', price=Decimal('250'), category=category, is_vegetarian=True
+        )
+        MenuItem.objects.create(
+            name='Butter Chicken', price=Decimal('349.50'), category=category,
+            image='menu_items/butter_chicken.jpg'
+        )
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def assertSameOutput(self, serializer_class, values_serializer_class, queryset):
+        request = APIRequestFactory().get('/api/')
+        context = {'request': request}
+
+        expected = serializer_class(queryset, many=True, context=context).data
+        values_serializer = values_serializer_class(context)
+        actual = values_serializer.to_representation(values_serializer.values(queryset))
+
+        self.assertEqual(self.render(actual), self.render(expected))
+
+    def test_restaurant_rows_match_model_serializer(self):
+        self.assertSameOutput(
+            RestaurantSerializer, RestaurantValuesSerializer, Restaurant.objects.order_by('name')
+        )
+
+    def test_menu_item_rows_match_model_serializer(self):
+        self.assertSameOutput(
+            MenuItemSerializer, MenuItemValuesSerializer,
+            MenuItem.objects.select_related('category', 'restaurant').order_by('name')
+        )
+
+    def test_list_endpoint_uses_values_rows(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        with self.assertNumQueries(2):
+            response = client.get('/api/menu-items/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['name'] for item in response.data['results']],
+            ['Butter Chicken', 'Paneer Tikka']
+        )
+        self.assertEqual(response.data['results'][1]['price'], '250.00')
+
+
+class FullTextSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create_user(
+            username='thor', password='pass12345', role='member', country='INDIA'
+        )
+        cls.taj = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', description='Mughlai curries', address='123 MG Road, Mumbai',
+            country='INDIA', phone_number='+91-22-12345678'
+        )
+        cls.spice = Restaurant.objects.create(
+            name='Spice Route', description='Curry house near the Taj hotel', address='Colaba, Mumbai',
+            country='INDIA', phone_number='+91-22-87654321'
+        )
+        Restaurant.objects.create(
+            name='Taj Diner', address='5th Avenue, New York', country='AMERICA', phone_number='+1-212-5550100'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.member)
+
+    def search(self, url, term, **params):
+        response = self.client.get(url, {'search': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data['results']]
+
+    def test_ranked_prefix_matches_within_country(self):
+        # 'Taj' in a name outranks 'Taj' in a description; the AMERICA row is out of scope
+        self.assertEqual(
+            self.search('/api/restaurants/', 'ta'),
+            ['Taj Mahal Restaurant', 'Spice Route']
+        )
+        # Every word has to match
+        self.assertEqual(self.search('/api/restaurants/', 'curr hous'), ['Spice Route'])
+        self.assertEqual(self.search('/api/restaurants/', 'taj', ordering='-name'), ['Taj Mahal Restaurant', 'Spice Route'])
+
+    def test_index_follows_writes(self):
+        category = MenuCategory.objects.create(name='Main Course', restaurant=self.taj)
+        item = MenuItem.objects.create(name='Paneer Tikka', price=Decimal('250'), category=category)
+        self.assertEqual(self.search('/api/menu-items/', 'panee'), ['Paneer Tikka'])
+
+        item.name = 'Chicken Tikka'
+        item.save()
+        self.assertEqual(self.search('/api/menu-items/', 'paneer'), [])
+        self.assertEqual(self.search('/api/menu-items/', 'chick tik'), ['Chicken Tikka'])
+
+        item.delete()
+        self.assertEqual(self.search('/api/menu-items/', 'chicken'), [])
+
+
+class MenuCountryTests(TestCase):
+    """
+    MenuCategory and MenuItem carry a copy of their restaurant's country
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.taj = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        cls.burgers = Restaurant.objects.create(
+            name='Burger Palace', address='5th Avenue, New York', country='AMERICA',
+            phone_number='+1-212-5550100'
+        )
+        cls.category = MenuCategory.objects.create(name='Main Course', restaurant=cls.taj)
+        cls.item = MenuItem.objects.create(name='Paneer Tikka', price=Decimal('250'), category=cls.category)
+
+    def assertMenuCountry(self, restaurant, country):
+        self.category.refresh_from_db()
+        self.item.refresh_from_db()
+        self.assertEqual((self.category.restaurant_id, self.category.country), (restaurant.id, country))
+        self.assertEqual((self.item.restaurant_id, self.item.country), (restaurant.id, country))
+
+    def test_new_rows_take_the_restaurants_country(self):
+        self.assertMenuCountry(self.taj, 'INDIA')
+
+    def test_restaurant_save_propagates_country(self):
+        restaurant = Restaurant.objects.get(pk=self.taj.pk)
+        restaurant.country = 'AMERICA'
+        restaurant.save()
+        self.assertMenuCountry(self.taj, 'AMERICA')
+
+        # Nothing to copy when the country didn't change
+        with CaptureQueriesContext(connection) as queries:
+            restaurant.save(update_fields=['name'])
+        self.assertFalse([query for query in queries if 'restaurants_menu' in query['sql']])
+
+    def test_failed_propagation_rolls_back_the_save(self):
+        def fail_menu_items(execute, sql, params, many, context):
+            if sql.startswith('UPDATE "restaurants_menuitem"'):
+                raise DatabaseError('menu items unavailable')
+            return execute(sql, params, many, context)
+
+        restaurant = Restaurant.objects.get(pk=self.taj.pk)
+        restaurant.country = 'AMERICA'
+        with connection.execute_wrapper(fail_menu_items), self.assertRaises(DatabaseError):
+            restaurant.save()
+
+        self.assertEqual(Restaurant.objects.get(pk=self.taj.pk).country, 'INDIA')
+        self.assertMenuCountry(self.taj, 'INDIA')
+
+    def test_queryset_update_propagates_country(self):
+        Restaurant.objects.filter(pk=self.taj.pk).update(country='AMERICA')
+        self.assertMenuCountry(self.taj, 'AMERICA')
+
+    def test_category_move_carries_its_items(self):
+        category = MenuCategory.objects.get(pk=self.category.pk)
+        category.restaurant = self.burgers
+        category.save()
+        self.assertMenuCountry(self.burgers, 'AMERICA')
+
+
+class MenuFacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create_user(
+            username='thor', password='pass12345', role='member', country='INDIA'
+        )
+        cls.restaurant = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        mains = MenuCategory.objects.create(name='Main Course', restaurant=cls.restaurant)
+        breads = MenuCategory.objects.create(name='Breads', restaurant=cls.restaurant)
+        for name, category, flags in [
+            ('Paneer Tikka', mains, {'is_vegetarian': True, 'is_gluten_free': True}),
+            ('Dal Tadka', mains, {'is_vegetarian': True, 'is_vegan': True, 'is_gluten_free': True}),
+            ('Butter Chicken', mains, {'is_gluten_free': True}),
+            ('Garlic Naan', breads, {'is_vegetarian': True, 'is_available': False}),
+        ]:
+            MenuItem.objects.create(name=name, price=Decimal('100'), category=category, **flags)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.member)
+
+    def test_save_keeps_dietary_flags_in_sync(self):
+        item = MenuItem.objects.get(name='Butter Chicken')
+        self.assertEqual(item.dietary_flags, MenuItem.DIETARY_BITS['gluten_free'])
+
+        item.is_gluten_free = False
+        item.save(update_fields=['is_gluten_free'])
+        item.refresh_from_db()
+        self.assertEqual(item.dietary_flags, 0)
+
+    def test_facet_counts_follow_filters(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/menu-items/facets/', {
+                'restaurant': self.restaurant.id, 'dietary': 'vegetarian'
+            })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['name'] for item in response.data['results']],
+            ['Dal Tadka', 'Garlic Naan', 'Paneer Tikka']
+        )
+        facets = response.data['facets']
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual(facets['dietary'], {'vegetarian': 3, 'vegan': 1, 'gluten_free': 2})
+        self.assertEqual([(c['name'], c['count']) for c in facets['category']], [('Breads', 1), ('Main Course', 2)])
+        self.assertEqual(facets['is_available'], {'true': 2, 'false': 1})
+
+    def test_boolean_filters_use_the_bitmask(self):
+        response = self.client.get('/api/menu-items/', {'is_vegetarian': 'false', 'is_gluten_free': 'true'})
+        self.assertEqual([item['name'] for item in response.data['results']], ['Butter Chicken'])
+
+        response = self.client.get('/api/menu-items/facets/', {'dietary': 'vegan,spicy'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('dietary', response.data)
+
+
+class RepeatedQueryTests(TestCase):
+    """
+    More rows than SQL_REPEAT_THRESHOLD, so an N+1 fails the test
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='nick_fury', password='pass12345', role='admin', country='AMERICA'
+        )
+        for number in range(12):
+            restaurant = Restaurant.objects.create(
+                name=f'Restaurant {number}', address='123 MG Road, Mumbai', country='INDIA',
+                phone_number='+91-22-12345678'
+            )
+            category = MenuCategory.objects.create(name='Main Course', restaurant=restaurant)
+            MenuItem.objects.create(name=f'Dish {number}', price=Decimal('100'), category=category)
+
+    def test_category_list_joins_restaurant(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        with self.assertNumQueries(2):
+            response = client.get('/api/categories/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['restaurant_name'], 'Restaurant 0')
+
+    def test_admin_menu_item_list(self):
+        self.client.force_login(self.admin)
+
+        response = self.client.get('/admin/restaurants/menuitem/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Restaurant 11 - Main Course')
+
+
+class AsyncReadPathTests(TestCase):
+    """
+    The /api/async/ endpoints answer exactly like their sync twins
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='nick_fury', password='pass12345', role='admin', country='AMERICA'
+        )
+        cls.member = User.objects.create_user(
+            username='thor', password='pass12345', role='member', country='INDIA'
+        )
+        cls.restaurants = {}
+        for name, country in [('Taj Mahal Restaurant', 'INDIA'), ('Burger Palace', 'AMERICA')]:
+            restaurant = Restaurant.objects.create(
+                name=name, address='123 MG Road', country=country, phone_number='+91-22-12345678'
+            )
+            category = MenuCategory.objects.create(name='Main Course', restaurant=restaurant)
+            MenuItem.objects.create(name=f'{name} Special', price=Decimal('100'), category=category)
+            MenuItem.objects.create(
+                name=f'{name} Salad', price=Decimal('80'), category=category, is_vegetarian=True
+            )
+            cls.restaurants[country] = restaurant
+
+    def get(self, path, user, **params):
+        token = RefreshToken.for_user(user).access_token
+        return self.client.get(path, params, headers={'Authorization': f'Bearer {token}'})
+
+    def assertSameResponse(self, sync_path, async_path, user, **params):
+        sync_response = self.get(sync_path, user, **params)
+        async_response = self.get(async_path, user, **params)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.json(), sync_response.json())
+        return async_response
+
+    def test_list_detail_and_menu_match_sync(self):
+        india = self.restaurants['INDIA'].id
+        for user in [self.admin, self.member]:
+            with self.subTest(user=user.username):
+                response = self.assertSameResponse('/api/restaurants/', '/api/async/restaurants/', user)
+                self.assertEqual(response.json()['count'], 2 if user is self.admin else 1)
+                self.assertSameResponse(f'/api/restaurants/{india}/', f'/api/async/restaurants/{india}/', user)
+                self.assertSameResponse(
+                    f'/api/restaurants/{india}/menu/', f'/api/async/restaurants/{india}/menu/', user
+                )
+                self.assertSameResponse(
+                    '/api/menu-items/', '/api/async/menu-items/', user, is_vegetarian='true'
+                )
+
+    def test_menu_miss_builds_and_caches(self):
+        india = self.restaurants['INDIA'].id
+        response = self.get(f'/api/async/restaurants/{india}/menu/', self.member)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()[0]['items']), 2)
+        with self.assertNumQueries(0):
+            self.get(f'/api/async/restaurants/{india}/menu/', self.member)
+
+    def test_errors_match_sync(self):
+        america = self.restaurants['AMERICA'].id
+        self.assertEqual(self.client.get('/api/async/restaurants/').status_code, 401)
+        self.assertSameResponse(f'/api/restaurants/{america}/', f'/api/async/restaurants/{america}/', self.member)
+        response = self.assertSameResponse(
+            f'/api/restaurants/{america}/menu/', f'/api/async/restaurants/{america}/menu/', self.member
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.assertSameResponse('/api/restaurants/', '/api/async/restaurants/', self.member, page=5)
+        self.assertEqual(response.status_code, 404)
+
+
+class NoAmericanMenus(BasePermission):
+    def has_object_permission(self, request, view, obj):
+        return obj.country != 'AMERICA'
+
+
+class GuardedRestaurantViewSet(RestaurantViewSet):
+    def get_permissions(self):
+        return [*super().get_permissions(), NoAmericanMenus()]
+
+
+class MenuCacheTests(TestCase):
+    """
+    RestaurantViewSet.menu serves cached menus only where get_object()
+    would have found the restaurant
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='nick_fury', password='pass12345', role='admin', country='AMERICA'
+        )
+        cls.member = User.objects.create_user(
+            username='thor', password='pass12345', role='member', country='INDIA'
+        )
+        cls.taj = Restaurant.objects.create(
+            name='Taj Mahal Restaurant', address='123 MG Road, Mumbai', country='INDIA',
+            phone_number='+91-22-12345678'
+        )
+        cls.burgers = Restaurant.objects.create(
+            name='Burger Palace', address='5th Avenue, New York', country='AMERICA',
+            phone_number='+1-212-5550100'
+        )
+        for restaurant in [cls.taj, cls.burgers]:
+            category = MenuCategory.objects.create(name='Main Course', restaurant=restaurant)
+            MenuItem.objects.create(name=f'{restaurant.name} Special', price=Decimal('100'), category=category)
+        cls.item = MenuItem.objects.get(restaurant=cls.taj)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, path, user, **params):
+        token = RefreshToken.for_user(user).access_token
+        return self.client.get(path, params, headers={'Authorization': f'Bearer {token}'})
+
+    def menu_names(self, response):
+        return [item['name'] for category in response.json() for item in category['items']]
+
+    def test_miss_builds_then_hit_costs_no_queries(self):
+        path = f'/api/restaurants/{self.taj.id}/menu/'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(path, self.member)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queries.captured_queries)
+
+        with self.assertNumQueries(0):
+            hit = self.get(path, self.member)
+        self.assertEqual(hit.json(), response.json())
+
+    def test_save_invalidates_menu(self):
+        path = f'/api/restaurants/{self.taj.id}/menu/'
+        self.get(path, self.member)
+
+        self.item.name = 'Paneer Tikka'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.save()
+
+        self.assertEqual(self.menu_names(self.get(path, self.member)), ['Paneer Tikka'])
+
+    def test_moves_invalidate_both_menus(self):
+        taj, burgers = f'/api/restaurants/{self.taj.id}/menu/', f'/api/restaurants/{self.burgers.id}/menu/'
+        specials = ['Burger Palace Special', 'Taj Mahal Restaurant Special']
+
+        for path in [taj, burgers]:
+            self.get(path, self.admin)
+        category = MenuCategory.objects.get(restaurant=self.taj)
+        category.restaurant = self.burgers
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        self.assertEqual(self.menu_names(self.get(taj, self.admin)), [])
+        self.assertEqual(sorted(self.menu_names(self.get(burgers, self.admin))), specials)
+
+        item = MenuItem.objects.get(pk=self.item.pk)
+        item.category = MenuCategory.objects.create(name='Starters', restaurant=self.taj)
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        self.assertEqual(self.menu_names(self.get(taj, self.admin)), ['Taj Mahal Restaurant Special'])
+        self.assertEqual(self.menu_names(self.get(burgers, self.admin)), ['Burger Palace Special'])
+
+    def test_cached_menu_of_another_country_is_404(self):
+        for path in [f'/api/restaurants/{self.burgers.id}/menu/', f'/api/async/restaurants/{self.burgers.id}/menu/']:
+            with self.subTest(path=path):
+                # The admin's request leaves the menu cached
+                self.assertEqual(self.get(path, self.admin).status_code, 200)
+                self.assertEqual(self.get(path, self.member).status_code, 404)
+
+    def test_query_parameters_reach_the_filter_backends(self):
+        path = f'/api/restaurants/{self.taj.id}/menu/'
+        self.get(path, self.member)
+
+        self.assertEqual(self.get(path, self.member, is_active='false').status_code, 404)
+
+    def test_hit_checks_object_permissions(self):
+        view = GuardedRestaurantViewSet.as_view({'get': 'menu'})
+        factory = APIRequestFactory()
+        for restaurant, status_code in [(self.taj, 200), (self.burgers, 403)]:
+            with self.subTest(restaurant=restaurant.name):
+                path = f'/api/restaurants/{restaurant.id}/menu/'
+                self.assertEqual(self.get(path, self.admin).status_code, 200)
 
-# Create your tests here.
+                request = factory.get(path)
+                force_authenticate(request, user=self.admin)
+                with self.assertNumQueries(0):
+                    response = view(request, pk=str(restaurant.id))
+                self.assertEqual(response.status_code, status_code)
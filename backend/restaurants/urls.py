@@ -1,7 +1,10 @@
 # restaurants/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RestaurantViewSet, MenuCategoryViewSet, MenuItemViewSet
+from .views import (
+    RestaurantViewSet, MenuCategoryViewSet, MenuItemViewSet,
+    AsyncRestaurantListView, AsyncRestaurantDetailView, AsyncRestaurantMenuView, AsyncMenuItemListView
+)
 
 router = DefaultRouter()
 router.register(r'restaurants', RestaurantViewSet, basename='restaurant')
@@ -10,4 +13,9 @@ router.register(r'menu-items', MenuItemViewSet, basename='menuitem')
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+    # Native async versions of the hot read paths (see food_ordering/async_views.py)
+    path('async/restaurants/', AsyncRestaurantListView.as_view(), name='async-restaurant-list'),
+    path('async/restaurants/<int:pk>/', AsyncRestaurantDetailView.as_view(), name='async-restaurant-detail'),
+    path('async/restaurants/<int:pk>/menu/', AsyncRestaurantMenuView.as_view(), name='async-restaurant-menu'),
+    path('async/menu-items/', AsyncMenuItemListView.as_view(), name='async-menuitem-list'),
+]
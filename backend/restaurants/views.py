@@ -10,23 +10,31 @@ from .serializers import (
     RestaurantSerializer, 
     MenuCategorySerializer, 
     MenuItemSerializer,
-    MenuItemDetailSerializer
+    MenuItemDetailSerializer,
+    RestaurantValuesSerializer,
+    MenuItemValuesSerializer
 )
+from .cache import get_cached_menu, cache_menu, acache_menu
+from .filters import MenuItemFilter
+from .search import FullTextSearchFilter, RESTAURANT_SEARCH, MENU_ITEM_SEARCH
 from users.permissions import IsAdmin, IsManager, IsMember
-from users.mixins import CountryFilterMixin
+from users.mixins import CountryFilterMixin, ValuesListMixin
+from food_ordering.async_views import AsyncReadView, aget_object
 
 
-class RestaurantViewSet(CountryFilterMixin, viewsets.ModelViewSet):
+class RestaurantViewSet(ValuesListMixin, CountryFilterMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and managing restaurants.
     All roles can view, but filtering by country for managers/members.
     """
     queryset = Restaurant.objects.all()
     serializer_class = RestaurantSerializer
+    values_serializer_class = RestaurantValuesSerializer
     permission_classes = [IsAuthenticated, IsMember]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['country', 'is_active']
-    search_fields = ['name', 'description', 'address']
+    search_index = RESTAURANT_SEARCH
+    search_fields = ['name', 'description', 'address']  # fallback without a search index
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
 
@@ -43,33 +51,47 @@ class RestaurantViewSet(CountryFilterMixin, viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def menu(self, request, pk=None):
         """
-        Get all menu items for a specific restaurant
+        Get all menu items for a specific restaurant.
+        Served from the per-restaurant menu cache; a hit costs no queries.
         """
-        restaurant = self.get_object()
-        categories = MenuCategory.objects.filter(
-            restaurant=restaurant, 
-            is_active=True
-        ).prefetch_related('menu_items')
-        
-        menu_data = []
-        for category in categories:
-            items = MenuItem.objects.filter(
-                category=category,
-                is_available=True
-            )
-            menu_data.append({
-                'category': MenuCategorySerializer(category).data,
-                'items': MenuItemSerializer(items, many=True).data
-            })
-        
-        return Response(menu_data)
+        # Anything we can't answer from the cache goes through get_object
+        # for the usual 404/permission handling
+        entry = self.cached_menu(pk)
+        if entry is None:
+            entry = cache_menu(self.get_object())
+
+        return Response(entry['menu'])
+
+    def cached_menu(self, pk):
+        """
+        The cached menu entry of restaurant `pk` when it may stand in for
+        get_object(), else None.
+
+        get_object() scopes the queryset by country, runs the filter
+        backends and checks object permissions. Here the country scoping is
+        is_country_visible(), a request with query parameters is left to the
+        filter backends, and the object permissions see a Restaurant with
+        the pk and country of the entry, all a cached menu knows.
+        """
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            return None
+        if self.request.query_params:
+            return None
+
+        entry = get_cached_menu(pk)
+        if entry is None or not self.is_country_visible(entry['country']):
+            return None
+        self.check_object_permissions(self.request, Restaurant(pk=pk, country=entry['country']))
+        return entry
 
 
 class MenuCategoryViewSet(CountryFilterMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing menu categories.
     """
-    queryset = MenuCategory.objects.all()
+    queryset = MenuCategory.objects.select_related('restaurant')
     serializer_class = MenuCategorySerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -88,17 +110,19 @@ class MenuCategoryViewSet(CountryFilterMixin, viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
-class MenuItemViewSet(CountryFilterMixin, viewsets.ModelViewSet):
+class MenuItemViewSet(ValuesListMixin, CountryFilterMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and managing menu items.
     All roles can view, filtered by country.
     """
-    queryset = MenuItem.objects.all().select_related('category__restaurant')
+    queryset = MenuItem.objects.all().select_related('category', 'restaurant')
     serializer_class = MenuItemSerializer
+    values_serializer_class = MenuItemValuesSerializer
     permission_classes = [IsAuthenticated, IsMember]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'is_available', 'is_vegetarian', 'is_vegan', 'is_gluten_free']
-    search_fields = ['name', 'description']
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
+    filterset_class = MenuItemFilter
+    search_index = MENU_ITEM_SEARCH
+    search_fields = ['name', 'description']  # fallback without a search index
     ordering_fields = ['name', 'price', 'created_at']
     ordering = ['name']
 
@@ -118,4 +142,72 @@ class MenuItemViewSet(CountryFilterMixin, viewsets.ModelViewSet):
             permission_classes = [IsAdmin]
         else:
             permission_classes = [IsAuthenticated, IsMember]
-        return [permission() for permission in permission_classes]
\ No newline at end of file
+        return [permission() for permission in permission_classes]
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        A page of matching menu items plus facet counts over all matches:
+        per dietary flag, per category and by availability. Takes the same
+        filters as the list (e.g. ?restaurant=1&dietary=vegan).
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        facets = queryset.facet_counts()
+
+        response = self.values_list_response(queryset)
+        response.data['facets'] = facets
+        return response
+
+
+class AsyncRestaurantListView(AsyncReadView):
+    """
+    GET /api/async/restaurants/: the restaurant list on the event loop
+    """
+    viewset_class = RestaurantViewSet
+
+    async def respond(self, viewset):
+        return await self.paginated(viewset, viewset.filter_queryset(viewset.get_queryset()))
+
+
+class AsyncRestaurantDetailView(AsyncReadView):
+    """
+    GET /api/async/restaurants/<pk>/
+    """
+    viewset_class = RestaurantViewSet
+    action = 'retrieve'
+
+    async def respond(self, viewset):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        restaurant = await aget_object(queryset, pk=viewset.kwargs['pk'])
+        viewset.check_object_permissions(viewset.request, restaurant)
+        return viewset.get_serializer(restaurant).data
+
+
+class AsyncRestaurantMenuView(AsyncReadView):
+    """
+    GET /api/async/restaurants/<pk>/menu/: a cache hit costs no queries
+    and never leaves the event loop
+    """
+    viewset_class = RestaurantViewSet
+    action = 'menu'
+
+    async def respond(self, viewset):
+        pk = viewset.kwargs['pk']
+        entry = viewset.cached_menu(pk)
+        if entry is None:
+            queryset = viewset.filter_queryset(viewset.get_queryset())
+            restaurant = await aget_object(queryset, pk=pk)
+            viewset.check_object_permissions(viewset.request, restaurant)
+            entry = await acache_menu(restaurant)
+        return entry['menu']
+
+
+class AsyncMenuItemListView(AsyncReadView):
+    """
+    GET /api/async/menu-items/: the menu item list (with its filters)
+    on the event loop
+    """
+    viewset_class = MenuItemViewSet
+
+    async def respond(self, viewset):
+        return await self.paginated(viewset, viewset.filter_queryset(viewset.get_queryset()))
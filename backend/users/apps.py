@@ -5,4 +5,5 @@ class UsersConfig(AppConfig):
     name = 'users'
     
     def ready(self):
-        import users.admin  # Force import admin
\ No newline at end of file
+        import users.admin  # Force import admin
+        import users.signals  # Auth snapshot invalidation
\ No newline at end of file
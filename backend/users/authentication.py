@@ -0,0 +1,118 @@
+# users/authentication.py
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from food_ordering import cache as app_cache
+
+User = get_user_model()
+
+# Everything views, permissions and UserSerializer read off request.user.
+# Anything else (password, last_login, ...) is left deferred and loads
+# lazily if something touches it.
+SNAPSHOT_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name',
+    'role', 'country', 'phone', 'is_active', 'is_staff', 'is_superuser',
+)
+# Model.from_db expects values in concrete field order
+_SNAPSHOT_COLUMNS = tuple(
+    field.attname for field in User._meta.concrete_fields if field.attname in SNAPSHOT_FIELDS
+)
+SNAPSHOT_TIMEOUT = 60 * 15
+
+
+def user_tag(user_id):
+    return f'user:{user_id}'
+
+
+def invalidate_user(user_id):
+    app_cache.invalidate_tags(user_tag(user_id))
+
+
+def invalidate_users(user_ids):
+    if user_ids:
+        app_cache.invalidate_tags(*[user_tag(user_id) for user_id in user_ids])
+
+
+def get_user_snapshot(user_id):
+    """
+    Cached tuple of SNAPSHOT_FIELDS for a user id, or None if there is no such user
+    """
+    return app_cache.get_or_set(
+        f'user-snapshot:{user_id}',
+        lambda: User.objects.filter(pk=user_id).values_list(*_SNAPSHOT_COLUMNS).first(),
+        timeout=SNAPSHOT_TIMEOUT,
+        tags=[user_tag(user_id)],
+    )
+
+
+async def aget_user_snapshot(user_id):
+    """
+    get_user_snapshot() for async views; a miss loads with the async ORM
+    """
+    return await app_cache.aget_or_set(
+        f'user-snapshot:{user_id}',
+        lambda: User.objects.filter(pk=user_id).values_list(*_SNAPSHOT_COLUMNS).afirst(),
+        timeout=SNAPSHOT_TIMEOUT,
+        tags=[user_tag(user_id)],
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user from a cached snapshot instead of
+    loading the users row on every request. The snapshot is invalidated
+    whenever the User is saved or deleted (see users/signals.py) or changed
+    through User.objects...update() (UserQuerySet).
+
+    The returned User is a real model instance with the non-snapshot fields
+    deferred, so FK assignment and comparisons behave as usual, and a save()
+    only writes the loaded fields.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_FIELD != 'id' or api_settings.CHECK_REVOKE_TOKEN:
+            # Needs lookups or fields the snapshot doesn't carry
+            return super().get_user(validated_token)
+
+        return self._snapshot_user(get_user_snapshot(self._user_id(validated_token)))
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for async views (food_ordering.async_views): the same
+        checks, with the snapshot loaded through the async ORM on a miss
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if api_settings.USER_ID_FIELD != 'id' or api_settings.CHECK_REVOKE_TOKEN:
+            user = await sync_to_async(super().get_user)(validated_token)
+        else:
+            user = self._snapshot_user(await aget_user_snapshot(self._user_id(validated_token)))
+        return user, validated_token
+
+    def _user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def _snapshot_user(self, values):
+        if values is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        user = User.from_db(router.db_for_read(User), _SNAPSHOT_COLUMNS, values)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
@@ -0,0 +1,394 @@
+# users/management/commands/benchmark_api.py
+import json
+import math
+import re
+import time
+from dataclasses import dataclass, field
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, get_resolver, resolve
+from django.utils import timezone
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from restaurants.models import Restaurant, MenuCategory, MenuItem
+from orders.models import Order
+from payments.models import PaymentMethod
+
+User = get_user_model()
+
+ROLES = ['admin', 'manager', 'member']
+PLACEHOLDER_RE = re.compile(r'\{(\w+)\}')
+
+# Routes the harness deliberately leaves out
+SKIPPED_ROUTES = {
+    'api/orders/events/': 'Server-Sent Events stream, never completes',
+    'api/cart/checkout/': 'Empties the cart it checks out, so it cannot be repeated',
+}
+
+
+@dataclass
+class Scenario:
+    method: str
+    path: str
+    roles: list = field(default_factory=lambda: list(ROLES))
+    data: dict = None
+    # Run inside a transaction that is rolled back after every request
+    writes: bool = False
+    # Send no Authorization header
+    anonymous: bool = False
+
+    def key(self, role):
+        return f'{self.method} {self.path} [{role}]'
+
+    def placeholders(self):
+        return set(PLACEHOLDER_RE.findall(self.path + json.dumps(self.data)))
+
+
+SCENARIOS = [
+    Scenario('GET', '/api/'),
+    # Auth
+    Scenario('POST', '/api/token/', data={'username': '{username}', 'password': '{password}'}, anonymous=True),
+    Scenario('POST', '/api/token/refresh/', data={'refresh': '{refresh}'}, anonymous=True),
+    Scenario('POST', '/api/token/verify/', data={'token': '{access}'}, anonymous=True),
+    Scenario('POST', '/api/users/login/', data={'username': '{username}', 'password': '{password}'}, anonymous=True),
+    Scenario('POST', '/api/users/register/', roles=['member'], writes=True, anonymous=True, data={
+        'username': 'benchmark_new_user', 'email': 'benchmark@example.com',
+        'password': 'Benchmark-pass-123', 'password2': 'Benchmark-pass-123',
+        'role': 'member', 'country': 'INDIA',
+    }),
+    # Users
+    Scenario('GET', '/api/users/'),
+    Scenario('GET', '/api/users/me/'),
+    Scenario('GET', '/api/users/{user}/'),
+    # Restaurants and menus
+    Scenario('GET', '/api/restaurants/'),
+    Scenario('GET', '/api/restaurants/?search={search}'),
+    Scenario('GET', '/api/restaurants/{restaurant}/'),
+    Scenario('GET', '/api/restaurants/{restaurant}/menu/'),
+    Scenario('GET', '/api/categories/'),
+    Scenario('GET', '/api/categories/{category}/'),
+    Scenario('GET', '/api/menu-items/'),
+    Scenario('GET', '/api/menu-items/?is_vegetarian=true&is_available=true'),
+    Scenario('GET', '/api/menu-items/facets/?restaurant={restaurant}'),
+    Scenario('GET', '/api/menu-items/{menu_item}/'),
+    # Orders
+    Scenario('GET', '/api/orders/'),
+    Scenario('GET', '/api/orders/?pagination=cursor'),
+    Scenario('GET', '/api/orders/?fields=id,restaurant_name,status,total_amount,created_at'),
+    Scenario('GET', '/api/orders/my_orders/'),
+    Scenario('GET', '/api/orders/{order}/'),
+    Scenario('POST', '/api/orders/', roles=['admin', 'manager'], writes=True, data={
+        'restaurant': '{restaurant}', 'country': '{country}', 'delivery_address': 'Benchmark Street 1',
+        'items': [{'menu_item': '{menu_item}', 'quantity': 2}],
+    }),
+    Scenario('POST', '/api/orders/{order}/place_order/', roles=['admin', 'manager'], writes=True),
+    Scenario('POST', '/api/orders/{order}/cancel/', roles=['admin', 'manager'], writes=True),
+    Scenario('PATCH', '/api/orders/{order}/update_status/', roles=['admin', 'manager'], writes=True,
+             data={'status': 'CANCELLED'}),
+    Scenario('POST', '/api/orders/bulk_update_status/', roles=['admin', 'manager'], writes=True,
+             data={'ids': ['{order}'], 'status': 'CANCELLED'}),
+    # Cart (kept in the cache; these run in order)
+    Scenario('GET', '/api/cart/'),
+    Scenario('POST', '/api/cart/items/', roles=['admin', 'manager'], data={'menu_item': '{menu_item}'}),
+    Scenario('PATCH', '/api/cart/items/{menu_item}/', roles=['admin', 'manager'], data={'quantity': 2}),
+    Scenario('DELETE', '/api/cart/', roles=['admin', 'manager']),
+    # Payments
+    Scenario('GET', '/api/payment-methods/'),
+    Scenario('GET', '/api/payment-methods/my_payment_methods/'),
+    Scenario('GET', '/api/payment-methods/{payment_method}/'),
+    Scenario('POST', '/api/payment-methods/{payment_method}/set_default/', writes=True),
+    # Native async read paths
+    Scenario('GET', '/api/async/restaurants/'),
+    Scenario('GET', '/api/async/restaurants/{restaurant}/'),
+    Scenario('GET', '/api/async/restaurants/{restaurant}/menu/'),
+    Scenario('GET', '/api/async/menu-items/?is_vegetarian=true&is_available=true'),
+    Scenario('GET', '/api/async/orders/my_orders/'),
+    # Monitoring
+    Scenario('GET', '/api/cache/stats/', roles=['admin']),
+]
+
+
+def percentile(samples, fraction):
+    """
+    Nearest-rank percentile of already sorted samples
+    """
+    return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+
+def fill(value, context):
+    """
+    Substitute {placeholders} in a scenario path or body. A value that is
+    exactly one placeholder keeps the type of the context value.
+    """
+    if isinstance(value, str):
+        if value.startswith('{') and value.endswith('}') and value[1:-1] in context:
+            return context[value[1:-1]]
+        return value.format(**context)
+    if isinstance(value, list):
+        return [fill(item, context) for item in value]
+    if isinstance(value, dict):
+        return {key: fill(item, context) for key, item in value.items()}
+    return value
+
+
+def api_routes(patterns=None, prefix=''):
+    """
+    Every URL route string, as ResolverMatch.route spells it
+    (nested regex routes lose their leading ^)
+    """
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        route = str(pattern.pattern)
+        route = prefix + (route[1:] if prefix and route.startswith('^') else route)
+        if isinstance(pattern, URLResolver):
+            yield from api_routes(pattern.url_patterns, route)
+        else:
+            yield route
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every API route for each role against the current database '
+        '(e.g. after generate_load_data): p50/p95/p99 latency, SQL queries and '
+        'response bytes. Writes the results as JSON and, given --baseline, fails '
+        'when an endpoint got slower, runs more queries or changed status.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per endpoint and role')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests first (fills caches)')
+        parser.add_argument('--output', default='benchmark-results.json', help='Where to write the results')
+        parser.add_argument('--baseline', help='Results file to compare against')
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Write the results to --baseline instead of comparing'
+        )
+        parser.add_argument(
+            '--metric', choices=['p50', 'p95', 'p99'], default='p50',
+            help='Latency percentile compared against the baseline (default p50, the least noisy)'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help='Allowed latency growth over the baseline, as a fraction (default 0.5)'
+        )
+        parser.add_argument(
+            '--min-delta-ms', type=float, default=2.0,
+            help='Ignore latency growth smaller than this many milliseconds (default 2)'
+        )
+        parser.add_argument('--password', default='loadtest123', help='Password of the benchmark users, for login routes')
+        parser.add_argument('--filter', help='Only run endpoints whose "METHOD path" contains this text')
+
+    # Fixtures ------------------------------------------------------------
+
+    def pick_user(self, role):
+        users = User.objects.filter(role=role, is_active=True).order_by('id')
+        if role == 'member':
+            # A member with order history, so my_orders has something to return
+            with_orders = Order.objects.filter(user__in=users).order_by('id').values_list('user_id', flat=True)[:1]
+            user = users.filter(id__in=with_orders).first()
+            if user is not None:
+                return user
+        return users.first()
+
+    def role_context(self, role, password):
+        """
+        Placeholder values for one role: ids of rows that role can see
+        """
+        user = self.pick_user(role)
+        if user is None:
+            return None
+
+        restaurants = Restaurant.objects.filter(is_active=True)
+        orders = Order.objects.all()
+        if role != 'admin':
+            restaurants = restaurants.filter(country=user.country)
+            orders = orders.filter(country=user.country)
+        if role == 'member':
+            orders = orders.filter(user=user)
+
+        restaurant = restaurants.order_by('id').first()
+        refresh = RefreshToken.for_user(user)
+        context = {
+            'user': user.id,
+            'username': user.username,
+            'password': password,
+            'country': user.country or 'INDIA',
+            'access': str(refresh.access_token),
+            'refresh': str(refresh),
+            'order': orders.order_by('-created_at').values_list('id', flat=True).first(),
+            'payment_method': PaymentMethod.objects.filter(user=user).values_list('id', flat=True).first(),
+            'restaurant': restaurant.id if restaurant else None,
+            'search': restaurant.name.split()[0] if restaurant else None,
+            'category': (
+                MenuCategory.objects.filter(restaurant=restaurant).values_list('id', flat=True).first()
+                if restaurant else None
+            ),
+            'menu_item': (
+                MenuItem.objects.filter(restaurant=restaurant).values_list('id', flat=True).first()
+                if restaurant else None
+            ),
+        }
+        return context
+
+    # Measuring -----------------------------------------------------------
+
+    def request(self, client, scenario, context):
+        path = fill(scenario.path, context)
+        data = fill(scenario.data, context) if scenario.data is not None else None
+        headers = {} if scenario.anonymous else {'HTTP_AUTHORIZATION': f'Bearer {context["access"]}'}
+        send = getattr(client, scenario.method.lower())
+
+        if scenario.method == 'GET':
+            return send(path, **headers)
+        return send(path, data=json.dumps(data or {}), content_type='application/json', **headers)
+
+    def measure(self, client, scenario, context, iterations, warmup):
+        timings, query_counts = [], []
+        response = None
+
+        for number in range(warmup + iterations):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                if scenario.writes:
+                    with transaction.atomic():
+                        response = self.request(client, scenario, context)
+                        transaction.set_rollback(True)
+                else:
+                    response = self.request(client, scenario, context)
+                elapsed = time.perf_counter() - started
+            if number >= warmup:
+                timings.append(elapsed * 1000)
+                query_counts.append(len(queries))
+
+        timings.sort()
+        return {
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'queries': max(query_counts),
+            'bytes': len(response.content),
+        }
+
+    def run(self, options):
+        contexts = {role: self.role_context(role, options['password']) for role in ROLES}
+        # Server errors are results too: record the 500 rather than stop
+        client = Client(raise_request_exception=False)
+        results, covered = {}, set()
+
+        for scenario in SCENARIOS:
+            if options['filter'] and options['filter'] not in f'{scenario.method} {scenario.path}':
+                continue
+            for role in scenario.roles:
+                context = contexts[role]
+                key = scenario.key(role)
+                if context is None:
+                    self.stdout.write(self.style.WARNING(f'{key}: no active {role} user, skipped'))
+                    continue
+                if any(context[name] is None for name in scenario.placeholders()):
+                    self.stdout.write(self.style.WARNING(f'{key}: no data to build the request from, skipped'))
+                    continue
+
+                covered.add(resolve(fill(scenario.path, context).split('?')[0]).route)
+                result = self.measure(client, scenario, context, options['iterations'], options['warmup'])
+                results[key] = result
+                self.stdout.write(
+                    f'{key:<75} {result["status"]}  p50 {result["p50_ms"]:8.2f}ms  '
+                    f'p95 {result["p95_ms"]:8.2f}ms  p99 {result["p99_ms"]:8.2f}ms  '
+                    f'{result["queries"]:3d} queries  {result["bytes"]:8d} B'
+                )
+        return results, covered
+
+    # Reporting -----------------------------------------------------------
+
+    def report_coverage(self, covered):
+        missing = sorted(
+            route for route in set(api_routes())
+            if route.startswith('api/') and 'format' not in route
+            and route not in covered and route not in SKIPPED_ROUTES
+            and not route.startswith('api/auth/')
+        )
+        for route, reason in SKIPPED_ROUTES.items():
+            self.stdout.write(f'Not benchmarked: {route} ({reason})')
+        for route in missing:
+            self.stdout.write(self.style.WARNING(f'Not benchmarked: {route}'))
+
+    def compare(self, results, baseline, metric, tolerance, min_delta_ms):
+        """
+        Regressions of `results` against `baseline`, as readable lines
+        """
+        regressions = []
+        for key, result in results.items():
+            previous = baseline.get(key)
+            if previous is None:
+                continue
+            if result['status'] != previous['status']:
+                regressions.append(f'{key}: status {previous["status"]} -> {result["status"]}')
+            if result['queries'] > previous['queries']:
+                regressions.append(f'{key}: {previous["queries"]} -> {result["queries"]} queries')
+            before, after = previous[f'{metric}_ms'], result[f'{metric}_ms']
+            if after - before > min_delta_ms and after > before * (1 + tolerance):
+                regressions.append(f'{key}: {metric} {before:.2f}ms -> {after:.2f}ms')
+            if result['bytes'] > previous['bytes'] * (1 + tolerance):
+                self.stdout.write(self.style.WARNING(
+                    f'{key}: response grew {previous["bytes"]} -> {result["bytes"]} bytes'
+                ))
+        return regressions
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError('--iterations must be at least 1 and --warmup not negative')
+        if options['update_baseline'] and not options['baseline']:
+            raise CommandError('--update-baseline needs --baseline')
+
+        # Throttling would start rejecting requests a few hundred calls in
+        with mock.patch.object(APIView, 'get_throttles', lambda view: []), \
+                override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            results, covered = self.run(options)
+
+        if not options['filter']:
+            self.report_coverage(covered)
+
+        document = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(document, output, indent=2, sort_keys=True)
+        self.stdout.write(f'Results written to {options["output"]}')
+
+        if not options['baseline']:
+            return
+        if options['update_baseline']:
+            with open(options['baseline'], 'w') as output:
+                json.dump(document, output, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Baseline updated: {options["baseline"]}'))
+            return
+
+        try:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)['results']
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Cannot read baseline {options["baseline"]}: {exc}')
+
+        regressions = self.compare(
+            results, baseline, options['metric'], options['tolerance'], options['min_delta_ms']
+        )
+        if regressions:
+            for line in regressions:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
@@ -0,0 +1,139 @@
+# users/management/commands/benchmark_async.py
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from rest_framework.views import APIView
+
+from .benchmark_api import Command as ApiBenchmark, ROLES, fill, percentile
+
+# (sync endpoint, its native async twin)
+ENDPOINTS = [
+    ('/api/restaurants/', '/api/async/restaurants/'),
+    ('/api/restaurants/{restaurant}/', '/api/async/restaurants/{restaurant}/'),
+    ('/api/restaurants/{restaurant}/menu/', '/api/async/restaurants/{restaurant}/menu/'),
+    ('/api/menu-items/?is_available=true', '/api/async/menu-items/?is_available=true'),
+    ('/api/orders/my_orders/', '/api/async/orders/my_orders/'),
+]
+
+MODES = {
+    'wsgi': 'sync view, one thread per client (gunicorn threads)',
+    'asgi': 'sync view under ASGI, run in a worker thread per request',
+    'async': 'native async view on the event loop',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Throughput of the hot read endpoints under concurrent clients, three '
+        'ways: the sync views behind WSGI threads, the same views under ASGI, '
+        'and their native async twins under /api/async/. Run it against a '
+        'loaded database (generate_load_data); SQLite serialises some of the '
+        'work, so compare the modes with each other, not with production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=20, help='Clients sending requests at once')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode')
+        parser.add_argument('--role', choices=ROLES, default='member', help='Role of the benchmark user')
+        parser.add_argument('--mode', choices=sorted(MODES), action='append', help='Only run these modes')
+        parser.add_argument('--filter', help='Only run endpoints whose path contains this text')
+
+    def handle(self, *args, **options):
+        context = ApiBenchmark().role_context(options['role'], password='')
+        if context is None:
+            raise CommandError(f'No active {options["role"]} user; run generate_load_data first')
+        if context['restaurant'] is None:
+            raise CommandError(f'No restaurant visible to the {options["role"]} user')
+        headers = {'Authorization': f'Bearer {context["access"]}'}
+        modes = options['mode'] or list(MODES)
+
+        for mode in modes:
+            self.stdout.write(f'{mode}: {MODES[mode]}')
+        self.stdout.write('')
+
+        # Throttling would start rejecting requests a few hundred calls in
+        with mock.patch.object(APIView, 'get_throttles', lambda view: []), \
+                override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self.run(context, headers, modes, options)
+
+    def run(self, context, headers, modes, options):
+        for sync_path, async_path in ENDPOINTS:
+            if options['filter'] and options['filter'] not in sync_path:
+                continue
+            for mode in modes:
+                path = fill(async_path if mode == 'async' else sync_path, context)
+                run = self.run_threads if mode == 'wsgi' else self.run_async
+                # One untimed request per mode fills the caches
+                run(path, headers, 1, 1)
+                statuses, timings, elapsed = run(path, headers, options['concurrency'], options['requests'])
+                self.report(mode, path, statuses, timings, elapsed)
+            self.stdout.write('')
+
+    def run_threads(self, path, headers, concurrency, requests):
+        def client_loop(count):
+            client = Client()
+            results = []
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = client.get(path, headers=headers)
+                    results.append((response.status_code, time.perf_counter() - started))
+            finally:
+                connections.close_all()
+            return results
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            batches = list(pool.map(client_loop, self.split(requests, concurrency)))
+        return self.collect(batches, time.perf_counter() - started)
+
+    def run_async(self, path, headers, concurrency, requests):
+        async def client_loop(count):
+            client = AsyncClient()
+            results = []
+            for _ in range(count):
+                started = time.perf_counter()
+                # Like ASGIHandler: each request gets its own thread for sync work
+                async with ThreadSensitiveContext():
+                    response = await client.get(path, headers=headers)
+                results.append((response.status_code, time.perf_counter() - started))
+            return results
+
+        async def main():
+            return await asyncio.gather(*(client_loop(count) for count in self.split(requests, concurrency)))
+
+        started = time.perf_counter()
+        batches = asyncio.run(main())
+        return self.collect(batches, time.perf_counter() - started)
+
+    def split(self, requests, concurrency):
+        """
+        `requests` spread over `concurrency` clients
+        """
+        concurrency = max(1, min(concurrency, requests))
+        share, extra = divmod(requests, concurrency)
+        return [share + (index < extra) for index in range(concurrency)]
+
+    def collect(self, batches, elapsed):
+        results = [result for batch in batches for result in batch]
+        statuses = sorted({status for status, _ in results})
+        timings = sorted(seconds * 1000 for _, seconds in results)
+        return statuses, timings, elapsed
+
+    def report(self, mode, path, statuses, timings, elapsed):
+        throughput = len(timings) / elapsed if elapsed else math.inf
+        line = (
+            f'{mode:<6} {path:<45} {"/".join(map(str, statuses)):<8} '
+            f'{throughput:8.1f} req/s  p50 {percentile(timings, 0.50):8.2f}ms  '
+            f'p95 {percentile(timings, 0.95):8.2f}ms'
+        )
+        self.stdout.write(line if statuses == [200] else self.style.WARNING(line))
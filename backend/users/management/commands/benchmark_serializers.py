@@ -0,0 +1,85 @@
+# users/management/commands/benchmark_serializers.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from restaurants.serializers import (
+    RestaurantSerializer,
+    RestaurantValuesSerializer,
+    MenuItemSerializer,
+    MenuItemValuesSerializer
+)
+from orders.serializers import OrderSerializer, OrderValuesSerializer
+from orders.views import OrderViewSet
+from restaurants.views import RestaurantViewSet, MenuItemViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare rows/second of the ModelSerializer and values_list() list '
+        'paths for restaurants, menu items and orders, using the rows already '
+        'in the database. Also checks both produce the same JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows per round (default 1000)')
+        parser.add_argument('--rounds', type=int, default=5, help='Timed rounds per path, best one wins (default 5)')
+
+    def cases(self):
+        """
+        The list querysets as the viewsets build them, before pagination
+        """
+        return [
+            ('restaurants', RestaurantSerializer, RestaurantValuesSerializer,
+             RestaurantViewSet.queryset.order_by('name', 'id')),
+            ('menu items', MenuItemSerializer, MenuItemValuesSerializer,
+             MenuItemViewSet.queryset.order_by('name', 'id')),
+            ('orders', OrderSerializer, OrderValuesSerializer,
+             OrderViewSet.queryset.order_by('-created_at', '-id')),
+        ]
+
+    def best_of(self, rounds, render):
+        best = None
+        output = None
+        for _ in range(rounds):
+            started = time.perf_counter()
+            output = render()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
+
+    def handle(self, *args, **options):
+        rows, rounds = options['rows'], options['rounds']
+        if rows < 1 or rounds < 1:
+            raise CommandError('--rows and --rounds must be positive')
+
+        context = {'request': APIRequestFactory().get('/api/')}
+        renderer = JSONRenderer()
+
+        for label, serializer_class, values_serializer_class, queryset in self.cases():
+            queryset = queryset[:rows]
+            count = queryset.count()
+            if not count:
+                self.stdout.write(self.style.WARNING(f'{label}: no rows, skipped (run populate_data first)'))
+                continue
+
+            # Each round re-runs the query, so fetching is part of the cost
+            def render_model():
+                return renderer.render(serializer_class(queryset.all(), many=True, context=context).data)
+
+            def render_values():
+                values_serializer = values_serializer_class(context)
+                return renderer.render(values_serializer.to_representation(values_serializer.values(queryset.all())))
+
+            model_time, model_output = self.best_of(rounds, render_model)
+            values_time, values_output = self.best_of(rounds, render_values)
+
+            self.stdout.write(self.style.SUCCESS(f'{label} ({count} rows, best of {rounds})'))
+            self.stdout.write(f'  ModelSerializer   {count / model_time:12,.0f} rows/s')
+            self.stdout.write(f'  ValuesSerializer  {count / values_time:12,.0f} rows/s  ({model_time / values_time:.1f}x)')
+            if model_output == values_output:
+                self.stdout.write('  output identical')
+            else:
+                self.stdout.write(self.style.ERROR('  output differs!'))
@@ -0,0 +1,115 @@
+# users/management/commands/explain_hot_filters.py
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from restaurants.models import Restaurant, MenuCategory, MenuItem
+from restaurants.views import RestaurantViewSet, MenuCategoryViewSet, MenuItemViewSet
+from orders.models import Order
+from orders.archive import stale_terminal
+from orders.sweeper import stale_pending
+from orders.views import OrderViewSet
+
+INDEXED_MODELS = [Restaurant, MenuCategory, MenuItem, Order]
+
+
+class _RollbackPlans(Exception):
+    """Raised to undo the temporary index drops"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Print EXPLAIN plans for each viewset\'s hot filter combination, '
+        'with the composite/partial indexes and without them (dropped inside '
+        'a rolled-back transaction). Takes a table lock on PostgreSQL - do '
+        'not run against a busy primary.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--country', default='INDIA', help='Country used for manager/member filters')
+        parser.add_argument('--status', default='PENDING', help='Order status used for ?status= filters')
+
+    def sample_ids(self, country):
+        """
+        A restaurant of `country` with active categories, up to three of
+        those categories, and a user with orders there: real rows, so the
+        planner estimates the same selectivity a request would see
+        """
+        restaurant_id = (
+            MenuCategory.objects.filter(country=country, is_active=True, restaurant__is_active=True)
+            .values_list('restaurant_id', flat=True).first()
+        )
+        category_ids = list(
+            MenuCategory.objects.filter(restaurant_id=restaurant_id, is_active=True)
+            .values_list('id', flat=True)[:3]
+        )
+        user_id = Order.objects.filter(country=country).values_list('user_id', flat=True).first()
+        if restaurant_id is None or user_id is None:
+            self.stderr.write(self.style.WARNING(
+                f'No menu or orders in {country}: plans use ids that match no rows'
+            ))
+        return restaurant_id or 0, category_ids or [0], user_id or 0
+
+    def hot_queries(self, country, status):
+        """
+        The querysets each viewset runs for its most common request,
+        as CountryFilterMixin and the filterset_fields shape them
+        """
+        restaurant_id, category_ids, user_id = self.sample_ids(country)
+        return [
+            ('RestaurantViewSet.list (member, ?is_active=true)',
+             RestaurantViewSet.queryset.filter(country=country, is_active=True).order_by('name')),
+            ('RestaurantViewSet.menu categories',
+             MenuCategory.objects.filter(restaurant_id=restaurant_id, is_active=True)),
+            ('RestaurantViewSet.menu items',
+             MenuItem.objects.filter(category_id__in=category_ids, is_available=True)),
+            ('MenuCategoryViewSet.list (member, ?is_active=true)',
+             MenuCategoryViewSet.queryset.filter(country=country, is_active=True)
+             .order_by('display_order')),
+            ('MenuItemViewSet.list (member, ?is_available=true)',
+             MenuItemViewSet.queryset.filter(country=country, is_available=True)
+             .order_by('name')),
+            ('OrderViewSet.list (manager, ?status=)',
+             OrderViewSet.queryset.filter(country=country, status=status).order_by('-created_at')),
+            ('OrderViewSet.list (admin, ?status=)',
+             OrderViewSet.queryset.filter(status=status).order_by('-created_at')),
+            ('OrderViewSet.my_orders',
+             OrderViewSet.queryset.filter(country=country, user_id=user_id).order_by('-created_at')),
+            ('sweep_pending_orders batch',
+             stale_pending(connection.alias, timezone.now()).values_list('created_at', 'id')[:500]),
+            ('archive_orders batch',
+             stale_terminal(connection.alias, 'DELIVERED', timezone.now()).values_list('created_at', 'id')[:500]),
+        ]
+
+    def explain_all(self, queries):
+        return {label: queryset.explain() for label, queryset in queries}
+
+    def handle(self, *args, **options):
+        queries = self.hot_queries(options['country'], options['status'])
+        index_names = [index.name for model in INDEXED_MODELS for index in model._meta.indexes]
+
+        before = {}
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for name in index_names:
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+                before = self.explain_all(queries)
+                raise _RollbackPlans
+        except _RollbackPlans:
+            pass
+
+        # Start from a fresh connection so no statement prepared while the
+        # indexes were gone gets reused (sqlite3 caches prepared statements)
+        connection.close()
+        after = self.explain_all(queries)
+
+        self.stdout.write(f'Indexes compared: {", ".join(index_names)}')
+        for label, _ in queries:
+            self.stdout.write('\n' + '=' * 70)
+            self.stdout.write(self.style.SUCCESS(label))
+            self.stdout.write('=' * 70)
+            self.stdout.write('-- before (initial migrations only)')
+            self.stdout.write(before[label])
+            self.stdout.write('-- after')
+            self.stdout.write(after[label])
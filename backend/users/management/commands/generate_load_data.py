@@ -0,0 +1,428 @@
+# users/management/commands/generate_load_data.py
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, time as day_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from restaurants.cache import invalidate_menu
+from restaurants.models import Restaurant, MenuCategory, MenuItem
+from restaurants.search import SEARCH_INDEXES
+from orders.models import Order, OrderItem
+from payments.models import PaymentMethod
+from users.authentication import invalidate_users
+
+User = get_user_model()
+
+COUNTRIES = ['INDIA', 'AMERICA']
+# Share of users and restaurants per country
+COUNTRY_WEIGHTS = [60, 40]
+CITIES = {
+    'INDIA': ['Mumbai', 'Bangalore', 'Delhi', 'Chennai', 'Hyderabad', 'Pune'],
+    'AMERICA': ['New York', 'Chicago', 'Austin', 'Seattle', 'Boston', 'Denver'],
+}
+CUISINES = {
+    'INDIA': ['Punjabi', 'Mughlai', 'Udupi', 'Chettinad', 'Bengali', 'Goan', 'Hyderabadi'],
+    'AMERICA': ['Burger', 'Pizza', 'BBQ', 'Taco', 'Diner', 'Sushi', 'Deli'],
+}
+RESTAURANT_SUFFIXES = ['Kitchen', 'House', 'Garden', 'Corner', 'Express', 'Grill', 'Cafe']
+CATEGORY_NAMES = ['Starters', 'Main Course', 'Breads', 'Rice', 'Sides', 'Desserts', 'Beverages', 'Combos']
+DISHES = [
+    'Paneer Tikka', 'Dal Makhani', 'Masala Dosa', 'Chicken Biryani', 'Butter Naan', 'Samosa',
+    'Chole Bhature', 'Fish Curry', 'Cheeseburger', 'Pepperoni Pizza', 'Caesar Salad', 'Fries',
+    'Chicken Wings', 'Mac and Cheese', 'Brisket', 'Pancakes', 'Milkshake', 'Brownie',
+]
+DISH_STYLES = ['Classic', 'Spicy', 'Smoky', 'Crispy', 'House', 'Garlic', 'Tandoori', 'Loaded']
+
+ACTIVE_STATUSES = ['PENDING', 'CONFIRMED', 'PREPARING', 'OUT_FOR_DELIVERY']
+# Orders older than a couple of hours have mostly finished one way or another
+SETTLED_STATUSES = ['DELIVERED', 'CANCELLED', 'PENDING']
+SETTLED_WEIGHTS = [88, 10, 2]
+# Relative order volume per hour of the day: lunch and dinner peaks
+HOURLY_WEIGHTS = [1, 1, 1, 1, 1, 1, 2, 4, 6, 5, 5, 9, 14, 13, 7, 4, 4, 6, 10, 14, 13, 9, 5, 2]
+LINE_COUNT_WEIGHTS = [35, 30, 18, 10, 7]
+
+
+def invalidate_menus(restaurant_ids):
+    for restaurant_id in restaurant_ids:
+        invalidate_menu(restaurant_id)
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """
+    Let bulk_create write the given auto_now / auto_now_add fields as set
+    on the instances, instead of stamping them with the current time
+    """
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic restaurants, menus, users, payment methods, orders '
+        'and order items at load-testing scale. Output is deterministic for a '
+        'given --seed and --end. Rows are written with batched bulk_create, one '
+        'transaction per batch, and memory stays bounded whatever --orders is.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default 42)')
+        parser.add_argument('--restaurants', type=int, default=100)
+        parser.add_argument('--categories-per-restaurant', type=int, default=5)
+        parser.add_argument('--items-per-category', type=int, default=8)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=365, help='Order history length in days (default 365)')
+        parser.add_argument(
+            '--end', default=None,
+            help='Date (YYYY-MM-DD, UTC) the order history ends on. Defaults to now; '
+                 'pin it to reproduce a data set exactly.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create batch')
+        parser.add_argument('--prefix', default='load', help='Prefix of generated usernames and slugs')
+        parser.add_argument('--password', default='loadtest123', help='Password of every generated user')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete rows from an earlier run with the same --prefix first'
+        )
+
+    def handle(self, *args, **options):
+        for name in ['restaurants', 'categories_per_restaurant', 'items_per_category', 'users', 'batch_size']:
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} must be at least 1')
+        if options['orders'] < 0 or options['days'] < 1:
+            raise CommandError('--orders must not be negative and --days must be at least 1')
+
+        if options['end']:
+            try:
+                end_date = datetime.strptime(options['end'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--end must look like YYYY-MM-DD')
+            self.end = datetime.combine(end_date, day_time.max, tzinfo=dt_timezone.utc)
+        else:
+            # Not the end of today: no order may be created in the future
+            self.end = timezone.now()
+
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        self.start = self.end - timedelta(days=options['days'])
+        started = time.monotonic()
+
+        if options['clear']:
+            self.clear()
+
+        self.create_users(options['users'], options['password'])
+        self.create_restaurants(options['restaurants'])
+        self.create_menus(options['categories_per_restaurant'], options['items_per_category'])
+        self.create_orders(options['orders'])
+
+        self.stdout.write('Rebuilding search indexes...')
+        for index in SEARCH_INDEXES:
+            with transaction.atomic():
+                index.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.1f}s'))
+
+    # Helpers -------------------------------------------------------------
+
+    def chunks(self, count):
+        """
+        (start, stop) index ranges of at most batch_size
+        """
+        for start in range(0, count, self.batch_size):
+            yield start, min(start + self.batch_size, count)
+
+    def pick_country(self):
+        return self.rng.choices(COUNTRIES, COUNTRY_WEIGHTS)[0]
+
+    def pick_popular(self, candidates):
+        """
+        Skewed pick: a fifth of the picks go to the first 5% of candidates,
+        so some users and restaurants are regulars
+        """
+        if self.rng.random() < 0.2:
+            return candidates[self.rng.randrange(max(1, len(candidates) // 20))]
+        return candidates[self.rng.randrange(len(candidates))]
+
+    def progress(self, label, done, total):
+        self.stdout.write(f'  {label}: {done:,}/{total:,}')
+
+    # Steps ---------------------------------------------------------------
+
+    def clear(self):
+        """
+        Raw deletes, child tables first, in keyset batches of --batch-size
+        ids: no rows are loaded and no per-row signals fire, so memory stays
+        bounded. The search index is rebuilt at the end of the run; cached
+        menus and auth snapshots of the deleted rows are invalidated here.
+        """
+        self.stdout.write(f'Deleting rows from earlier runs with prefix "{self.prefix}"...')
+        users = User.objects.filter(username__startswith=f'{self.prefix}_')
+        restaurants = Restaurant.objects.filter(slug__startswith=f'{self.prefix}-')
+
+        for queryset in [
+            OrderItem.objects.filter(order__user__in=users),
+            OrderItem.objects.filter(order__restaurant__in=restaurants),
+            Order.objects.filter(user__in=users),
+            Order.objects.filter(restaurant__in=restaurants),
+            PaymentMethod.objects.filter(user__in=users),
+            MenuItem.objects.filter(restaurant__in=restaurants),
+            MenuCategory.objects.filter(restaurant__in=restaurants),
+        ]:
+            self.delete_in_batches(queryset)
+        self.delete_in_batches(restaurants, deleted=invalidate_menus)
+        self.delete_in_batches(users, deleted=invalidate_users)
+
+    def delete_in_batches(self, queryset, deleted=None):
+        """
+        Delete the rows of `queryset` in primary key order, one DELETE per
+        batch of ids; `deleted` is called with each batch's ids
+        """
+        model = queryset.model
+        last = None
+        while True:
+            batch = queryset.order_by('pk')
+            if last is not None:
+                batch = batch.filter(pk__gt=last)
+            ids = list(batch.values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return
+
+            last = ids[-1]
+            rows = model.objects.filter(pk__in=ids)
+            rows._raw_delete(rows.db)
+            if deleted:
+                deleted(ids)
+
+    def create_users(self, count, password):
+        self.stdout.write(f'Creating {count:,} users with payment methods...')
+        # Hashing is deliberately slow: hash once, share it
+        password_hash = make_password(password)
+        payment_types = [choice for choice, _ in PaymentMethod.PAYMENT_TYPES]
+
+        self.user_ids = array('q')
+        self.user_payment_ids = array('q')
+        self.users_by_country = {country: array('l') for country in COUNTRIES}
+
+        for start, stop in self.chunks(count):
+            users = []
+            for number in range(start, stop):
+                country = self.pick_country()
+                roll = self.rng.random()
+                role = 'admin' if roll < 0.001 else 'manager' if roll < 0.02 else 'member'
+                users.append(User(
+                    username=f'{self.prefix}_user_{number}',
+                    email=f'{self.prefix}_user_{number}@example.com',
+                    password=password_hash,
+                    role=role,
+                    country=country,
+                    is_staff=role == 'admin',
+                ))
+
+            with transaction.atomic():
+                users = User.objects.bulk_create(users)
+                methods = []
+                for user in users:
+                    payment_type = self.rng.choice(payment_types)
+                    is_card = payment_type in ('CREDIT_CARD', 'DEBIT_CARD')
+                    methods.append(PaymentMethod(
+                        user_id=user.id,
+                        payment_type=payment_type,
+                        is_default=True,
+                        card_last4=f'{self.rng.randrange(10000):04d}' if is_card else None,
+                        card_brand=self.rng.choice(['VISA', 'MASTERCARD', 'RUPAY']) if is_card else None,
+                        upi_id=f'{user.username}@upi' if payment_type == 'UPI' else None,
+                    ))
+                methods = PaymentMethod.objects.bulk_create(methods)
+
+            for user, method in zip(users, methods):
+                self.users_by_country[user.country].append(len(self.user_ids))
+                self.user_ids.append(user.id)
+                self.user_payment_ids.append(method.id)
+            self.progress('users', stop, count)
+
+    def create_restaurants(self, count):
+        self.stdout.write(f'Creating {count:,} restaurants...')
+        self.restaurant_ids = array('q')
+        self.restaurant_countries = []
+        self.restaurants_by_country = {country: array('l') for country in COUNTRIES}
+        managers = {country: [] for country in COUNTRIES}
+        for user_id, country in User.objects.filter(
+            username__startswith=f'{self.prefix}_', role='manager'
+        ).values_list('id', 'country'):
+            managers[country].append(user_id)
+
+        for start, stop in self.chunks(count):
+            restaurants = []
+            for number in range(start, stop):
+                country = self.pick_country()
+                city = self.rng.choice(CITIES[country])
+                name = f'{self.rng.choice(CUISINES[country])} {self.rng.choice(RESTAURANT_SUFFIXES)} {number}'
+                restaurants.append(Restaurant(
+                    name=name,
+                    slug=f'{self.prefix}-restaurant-{number}',
+                    description=f'{name.rsplit(" ", 1)[0]} favourites in {city}',
+                    address=f'{self.rng.randrange(1, 999)} Main Street, {city}',
+                    country=country,
+                    phone_number=f'+{91 if country == "INDIA" else 1}-{self.rng.randrange(10**9, 10**10)}',
+                    is_active=self.rng.random() > 0.05,
+                    owner_id=self.rng.choice(managers[country]) if managers[country] else None,
+                ))
+
+            with transaction.atomic():
+                restaurants = Restaurant.objects.bulk_create(restaurants)
+            for restaurant in restaurants:
+                self.restaurants_by_country[restaurant.country].append(len(self.restaurant_ids))
+                self.restaurant_ids.append(restaurant.id)
+                self.restaurant_countries.append(restaurant.country)
+            self.progress('restaurants', stop, count)
+
+    def create_menus(self, categories_per_restaurant, items_per_category):
+        total = len(self.restaurant_ids)
+        self.stdout.write(
+            f'Creating {total * categories_per_restaurant:,} categories and '
+            f'{total * categories_per_restaurant * items_per_category:,} menu items...'
+        )
+        # Menu item ids and prices (in cents) of restaurant i live at
+        # [item_offsets[i], item_offsets[i + 1]) in these arrays
+        self.item_ids = array('q')
+        self.item_prices = array('l')
+        self.item_offsets = array('q', [0])
+
+        restaurants_per_batch = max(1, self.batch_size // (categories_per_restaurant * items_per_category))
+        for start in range(0, total, restaurants_per_batch):
+            stop = min(start + restaurants_per_batch, total)
+            categories = [
+                MenuCategory(
+                    name=CATEGORY_NAMES[position % len(CATEGORY_NAMES)],
+                    restaurant_id=self.restaurant_ids[index],
+                    country=self.restaurant_countries[index],
+                    display_order=position,
+                )
+                for index in range(start, stop)
+                for position in range(categories_per_restaurant)
+            ]
+
+            with transaction.atomic():
+                categories = MenuCategory.objects.bulk_create(categories)
+                items = []
+                for category in categories:
+                    for _ in range(items_per_category):
+                        flags = {
+                            'is_vegetarian': self.rng.random() < 0.4,
+                            'is_gluten_free': self.rng.random() < 0.2,
+                        }
+                        flags['is_vegan'] = flags['is_vegetarian'] and self.rng.random() < 0.3
+                        items.append(MenuItem(
+                            name=f'{self.rng.choice(DISH_STYLES)} {self.rng.choice(DISHES)}',
+                            description=f'{category.name} from the kitchen',
+                            price=Decimal(self.rng.randrange(199, 2999)) / 100,
+                            is_available=self.rng.random() > 0.1,
+                            category_id=category.id,
+                            restaurant_id=category.restaurant_id,
+                            country=category.country,
+                            dietary_flags=MenuItem.dietary_flags_for(**flags),
+                            preparation_time=self.rng.choice([10, 15, 20, 25, 30, 45]),
+                            **flags
+                        ))
+                items = MenuItem.objects.bulk_create(items)
+
+            # Items come back in the order they were built: grouped by restaurant
+            per_restaurant = categories_per_restaurant * items_per_category
+            for offset in range(0, len(items), per_restaurant):
+                for item in items[offset:offset + per_restaurant]:
+                    self.item_ids.append(item.id)
+                    self.item_prices.append(int(item.price * 100))
+                self.item_offsets.append(len(self.item_ids))
+            self.progress('restaurants with menus', stop, total)
+
+    def create_orders(self, count):
+        self.stdout.write(f'Creating {count:,} orders...')
+        span = (self.end - self.start).total_seconds()
+        created_at = Order._meta.get_field('created_at')
+        updated_at = Order._meta.get_field('updated_at')
+        countries = [country for country in COUNTRIES if self.users_by_country[country] and self.restaurants_by_country[country]]
+        if count and not countries:
+            raise CommandError('No country has both users and restaurants to build orders from')
+
+        lines_written = 0
+        with explicit_timestamps(created_at, updated_at):
+            for start, stop in self.chunks(count):
+                orders, order_lines = [], []
+                for number in range(start, stop):
+                    order, lines = self.build_order(number, count, span, countries)
+                    orders.append(order)
+                    order_lines.append(lines)
+
+                with transaction.atomic():
+                    orders = Order.objects.bulk_create(orders)
+                    items = [
+                        OrderItem(order_id=order.id, menu_item_id=item_id, quantity=quantity, price=price)
+                        for order, lines in zip(orders, order_lines)
+                        for item_id, quantity, price in lines
+                    ]
+                    OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+                lines_written += len(items)
+                self.progress('orders', stop, count)
+
+        self.stdout.write(f'  order items: {lines_written:,}')
+
+    def build_order(self, number, count, span, countries):
+        """
+        One unsaved Order plus its (menu_item_id, quantity, price) lines.
+        Orders come out in time order, denser towards the end of the range.
+        """
+        rng = self.rng
+        country = countries[0] if len(countries) == 1 else rng.choices(
+            countries, [COUNTRY_WEIGHTS[COUNTRIES.index(country)] for country in countries]
+        )[0]
+        user_index = self.pick_popular(self.users_by_country[country])
+        restaurant_index = self.pick_popular(self.restaurants_by_country[country])
+
+        # sqrt of the order's quantile: volume grows linearly over the range
+        moment = self.start + timedelta(seconds=span * ((number + rng.random()) / count) ** 0.5)
+        hour = rng.choices(range(24), HOURLY_WEIGHTS)[0]
+        moment = moment.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60))
+        moment = min(moment, self.end)
+
+        if self.end - moment < timedelta(hours=2):
+            status = rng.choice(ACTIVE_STATUSES)
+        else:
+            status = rng.choices(SETTLED_STATUSES, SETTLED_WEIGHTS)[0]
+
+        first, last = self.item_offsets[restaurant_index], self.item_offsets[restaurant_index + 1]
+        lines = []
+        for _ in range(rng.choices(range(1, len(LINE_COUNT_WEIGHTS) + 1), LINE_COUNT_WEIGHTS)[0]):
+            position = rng.randrange(first, last)
+            quantity = rng.choices([1, 2, 3], [70, 22, 8])[0]
+            lines.append((self.item_ids[position], quantity, Decimal(self.item_prices[position]) / 100))
+        total = sum((price * quantity for _, quantity, price in lines), Decimal('0.00'))
+
+        order = Order(
+            user_id=self.user_ids[user_index],
+            restaurant_id=self.restaurant_ids[restaurant_index],
+            status=status,
+            country=country,
+            total_amount=total,
+            delivery_address=f'{rng.randrange(1, 999)} {rng.choice(CITIES[country])} Road',
+            payment_method_id=self.user_payment_ids[user_index] if rng.random() > 0.1 else None,
+            created_at=moment,
+            updated_at=min(moment + timedelta(minutes=rng.randrange(1, 90)), self.end)
+            if status != 'PENDING' else moment,
+        )
+        return order, lines
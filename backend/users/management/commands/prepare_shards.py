@@ -0,0 +1,47 @@
+# users/management/commands/prepare_shards.py
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from food_ordering import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        'Migrate every country shard in DATABASE_SHARDS, make its tables hand '
+        'out ids from the shard\'s own range, and copy all users into it. '
+        'Safe to re-run; run it again after loading users in bulk.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users copied per INSERT')
+
+    def handle(self, *args, **options):
+        if not sharding.is_enabled():
+            raise CommandError('No shards configured; set DATABASE_SHARD_URLS')
+
+        users = get_user_model()._base_manager.order_by('pk')
+        for country, alias in settings.DATABASE_SHARDS.items():
+            call_command('migrate', database=alias, interactive=False, verbosity=0)
+            try:
+                sharding.start_id_range(alias)
+            except NotImplementedError as error:
+                raise CommandError(str(error))
+
+            copied = 0
+            batch = []
+            for user in users.iterator(chunk_size=options['batch_size']):
+                batch.append(user)
+                if len(batch) == options['batch_size']:
+                    sharding.mirror_users(alias, batch)
+                    copied += len(batch)
+                    batch = []
+            if batch:
+                sharding.mirror_users(alias, batch)
+                copied += len(batch)
+
+            first, end = sharding.id_range(alias)
+            self.stdout.write(self.style.SUCCESS(
+                f'{alias} ({country}): migrated, ids from {first} to {end - 1}, {copied} users copied'
+            ))
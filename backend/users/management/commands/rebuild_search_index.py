@@ -0,0 +1,30 @@
+# users/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from restaurants.search import SEARCH_INDEXES
+
+
+class Command(BaseCommand):
+    help = (
+        'Refill the restaurant and menu item full-text search tables from '
+        'scratch. Needed after writes that skip model signals, such as '
+        'bulk_create or raw SQL imports.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to rebuild')
+
+    def handle(self, *args, **options):
+        using = options['database']
+
+        for index in SEARCH_INDEXES:
+            if not index.is_supported(using):
+                self.stdout.write(self.style.WARNING(
+                    f'{index.table}: no full-text search on this database, skipped'
+                ))
+                continue
+
+            with transaction.atomic(using=using):
+                count = index.rebuild(using=using)
+            self.stdout.write(self.style.SUCCESS(f'{index.table}: indexed {count} rows'))
@@ -0,0 +1,37 @@
+# users/management/commands/sync_replicas.py
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database over every SQLite replica in '
+        'DATABASE_REPLICAS. A local stand-in for replication, for trying the '
+        'replica router with two SQLite files; real replicas replicate themselves.'
+    )
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('sync_replicas only copies SQLite databases')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured; set DATABASE_REPLICA_URLS')
+
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            replica = connections[alias]
+            if replica.vendor != 'sqlite':
+                self.stdout.write(self.style.WARNING(f'{alias}: not SQLite, skipped'))
+                continue
+
+            # sqlite3's online backup: a consistent copy even while the primary is in use
+            replica.close()
+            target = sqlite3.connect(replica.settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f'{alias}: copied from {primary.settings_dict["NAME"]}'))
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:28
+
+import users.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_role'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', users.models.UserManager()),
+            ],
+        ),
+    ]
@@ -1,9 +1,44 @@
+from django.conf import settings
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
 
-class CountryFilterMixin:
+from food_ordering import sharding
+
+
+class ShardRoutingMixin:
+    """
+    Mixin that routes the view's queries on sharded models to the requesting
+    user's home shard (food_ordering.sharding). On writes, admins go to the
+    shard of the `country` in the request body, if they send one.
+    Does nothing unless DATABASE_SHARD_URLS is set.
+    """
+    
+    def dispatch(self, request, *args, **kwargs):
+        with sharding.using_shard():
+            return super().dispatch(request, *args, **kwargs)
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        
+        user = request.user
+        if not sharding.is_enabled() or not user.is_authenticated:
+            return
+        
+        country = None
+        if user.role == 'admin' and request.method not in SAFE_METHODS and isinstance(request.data, dict):
+            country = request.data.get('country')
+        if country in settings.DATABASE_SHARDS:
+            sharding.select_shard(settings.DATABASE_SHARDS[country])
+        else:
+            sharding.select_shard(sharding.home_shard(user))
+
+
+class CountryFilterMixin(ShardRoutingMixin):
     """
     Mixin to filter queryset by user's country for managers and members.
-    Admins see all data.
+    Admins see all data; with country shards, filtered querysets read
+    across every shard.
     
     Usage: Add this mixin to your ViewSet before other mixins
     Example: class RestaurantViewSet(CountryFilterMixin, viewsets.ModelViewSet):
@@ -23,27 +58,50 @@ class CountryFilterMixin:
         # Manager and Member see only their country's data
         if user.role in ['manager', 'member']:
             # Check if the model has a country field
+            # (MenuItem and MenuCategory carry a denormalized copy of their
+            # restaurant's country, so they take this path too)
             if hasattr(queryset.model, 'country'):
                 return queryset.filter(country=user.country)
             
-            # For models that don't have country directly (like MenuItem)
+            # For models that don't have country directly
             # Filter through related fields
             model_name = queryset.model.__name__
             
-            if model_name == 'MenuItem':
-                # Filter menu items by restaurant country
-                return queryset.filter(category__restaurant__country=user.country)
-            
-            elif model_name == 'MenuCategory':
-                # Filter categories by restaurant country
-                return queryset.filter(restaurant__country=user.country)
-            
-            elif model_name == 'OrderItem':
+            if model_name == 'OrderItem':
                 # Filter order items by order country
                 return queryset.filter(order__country=user.country)
         
         return queryset
     
+    def filter_queryset(self, queryset):
+        """
+        Filters run on a plain queryset; admins then get it on every shard
+        """
+        return self.scatter_for_admin(super().filter_queryset(queryset))
+    
+    def scatter_for_admin(self, queryset):
+        """
+        `queryset` across every country shard for admins (no-op unsharded)
+        """
+        if self.request.user.role == 'admin':
+            return sharding.scatter(queryset)
+        return queryset
+    
+    def is_country_visible(self, country):
+        """
+        Check whether data for `country` would survive get_queryset's filter.
+        Lets cached payloads be served without re-running the query.
+        """
+        user = self.request.user
+        
+        if not user.is_authenticated:
+            return False
+        
+        if user.role in ['manager', 'member']:
+            return country == user.country
+        
+        return True
+    
     def perform_create(self, serializer):
         """
         Automatically set country when creating objects for non-admin users
@@ -57,6 +115,42 @@ class CountryFilterMixin:
             serializer.save()
 
 
+class ValuesListMixin:
+    """
+    Mixin that serves the `list` action through `values_serializer_class`
+    (a food_ordering.values_serializers.ValuesSerializer) instead of the
+    ModelSerializer. Filtering, ordering and pagination work as usual; only
+    the rows are fetched with values_list() and rendered without model
+    instances. Other actions are untouched.
+    
+    Example: class MenuItemViewSet(ValuesListMixin, CountryFilterMixin, viewsets.ModelViewSet):
+    """
+    
+    values_serializer_class = None
+    
+    def get_values_serializer(self, **kwargs):
+        return self.values_serializer_class(context=self.get_serializer_context(), **kwargs)
+    
+    def values_list_response(self, queryset):
+        """
+        Paginated response for `queryset`, rendered from values_list() rows
+        """
+        serializer = self.get_values_serializer()
+        queryset = serializer.values(queryset)
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        
+        return Response(serializer.to_representation(queryset))
+    
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+        
+        return self.values_list_response(self.filter_queryset(self.get_queryset()))
+
+
 class RoleBasedAccessMixin:
     """
     Mixin to handle role-based action restrictions
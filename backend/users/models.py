@@ -1,5 +1,30 @@
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import AbstractUser, UserManager as DjangoUserManager
+from django.db import models, transaction
+
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        update() that also drops the cached auth snapshots of the updated
+        users once it commits, as saving each of them would. Without it a
+        bulk is_active=False or role change keeps authenticating with the
+        old values until the snapshot expires.
+        """
+        from .authentication import SNAPSHOT_FIELDS, invalidate_users
+
+        if not set(kwargs) & set(SNAPSHOT_FIELDS):
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            ids = list(self.values_list('pk', flat=True))
+            count = super().update(**kwargs)
+            transaction.on_commit(lambda: invalidate_users(ids), using=self.db)
+        return count
+
+
+class UserManager(DjangoUserManager.from_queryset(UserQuerySet)):
+    pass
+
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -16,6 +41,8 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='member')
     country = models.CharField(max_length=10, choices=COUNTRY_CHOICES, null=True, blank=True)
     phone = models.CharField(max_length=15, blank=True, null=True)
+
+    objects = UserManager()
     
     def __str__(self):
         return f"{self.username} - {self.role}"
@@ -2,15 +2,17 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 
+from food_ordering.metrics import TimedSerializerMixin
+
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'role', 'country', 'phone')
         read_only_fields = ('id',)
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
+class UserRegistrationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
 
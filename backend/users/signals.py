@@ -0,0 +1,40 @@
+# users/signals.py
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from food_ordering import sharding
+from .authentication import invalidate_user
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    """
+    Drop the cached auth snapshot once the change is committed
+    """
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+@receiver(post_save, sender=User)
+def mirror_user(sender, instance, using, **kwargs):
+    """
+    Keep the copy of the user in every country shard current
+    """
+    if using == DEFAULT_DB_ALIAS:
+        for alias in settings.DATABASE_SHARDS.values():
+            sharding.mirror_users(alias, [instance])
+
+
+@receiver(post_delete, sender=User)
+def unmirror_user(sender, instance, using, **kwargs):
+    """
+    Delete the user's copies, with their restaurants, orders and payment methods
+    """
+    if using == DEFAULT_DB_ALIAS:
+        for alias in settings.DATABASE_SHARDS.values():
+            User._base_manager.using(alias).filter(pk=instance.pk).delete()
@@ -1,3 +1,151 @@
-from django.test import TestCase
+import json
+import math
+import os
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import CachedJWTAuthentication
+from .models import User
+from orders.models import Order, OrderItem
+from restaurants.cache import cache_menu, get_cached_menu
+from restaurants.models import MenuItem, Restaurant
+
+
+class GenerateLoadDataTests(TestCase):
+    def generate(self, **options):
+        call_command(
+            'generate_load_data', restaurants=3, users=10, orders=30, batch_size=7,
+            end='2026-01-01', stdout=StringIO(), **options
+        )
+        return [model.objects.count() for model in [User, Restaurant, MenuItem, Order, OrderItem]]
+
+    def test_clear_deletes_the_earlier_run_in_batches(self):
+        first = self.generate()
+        restaurant = Restaurant.objects.first()
+        cache_menu(restaurant)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.generate(clear=True), first)
+
+        # One DELETE per batch of 7 ids, none per row
+        menu_item_deletes = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith(f'DELETE FROM "{MenuItem._meta.db_table}"')
+        ]
+        self.assertEqual(len(menu_item_deletes), math.ceil(first[2] / 7))
+        self.assertIsNone(get_cached_menu(restaurant.id))
+
+
+class BenchmarkApiCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_load_data', restaurants=4, users=12, orders=40,
+            end='2026-01-01', stdout=StringIO()
+        )
+        # Too few users for the generator to roll these roles
+        User.objects.create_user(username='bench_admin', password='loadtest123', role='admin', country='AMERICA')
+        User.objects.create_user(username='bench_manager', password='loadtest123', role='manager', country='INDIA')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, 'results.json')
+        self.baseline = os.path.join(directory.name, 'baseline.json')
+
+    def _benchmark(self, **options):
+        call_command(
+            'benchmark_api', iterations=1, warmup=1, output=self.output,
+            filter='/api/orders/', stdout=StringIO(), **options
+        )
+        with open(self.output) as results:
+            return json.load(results)
+
+    def test_records_every_role(self):
+        document = self._benchmark()
+
+        self.assertEqual(document['meta']['iterations'], 1)
+        for role in ('admin', 'manager', 'member'):
+            result = document['results'][f'GET /api/orders/ [{role}]']
+            self.assertEqual(result['status'], 200)
+            self.assertGreater(result['bytes'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        # Writes are rolled back after each request
+        self.assertIn('POST /api/orders/ [manager]', document['results'])
+        self.assertNotIn('POST /api/orders/ [member]', document['results'])
+
+    def test_fails_on_more_queries_than_baseline(self):
+        self._benchmark(baseline=self.baseline, update_baseline=True)
+        with open(self.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        baseline['results']['GET /api/orders/ [admin]']['queries'] -= 1
+        with open(self.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file)
+
+        with self.assertRaisesMessage(CommandError, 'regression'):
+            self._benchmark(baseline=self.baseline, min_delta_ms=1000)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='captain_marvel', password='pass12345', role='manager', country='INDIA'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def authenticate(self, user=None):
+        token = AccessToken.for_user(user or self.user)
+        request = RequestFactory().get('/', headers={'Authorization': f'Bearer {token}'})
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        return user
+
+    def test_miss_then_hit(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+
+        self.assertEqual(user, self.user)
+        self.assertEqual((user.role, user.country), ('manager', 'INDIA'))
+
+    def test_unsnapshotted_fields_are_deferred(self):
+        user = self.authenticate()
+
+        self.assertIn('password', user.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('pass12345'))
+
+    def test_save_invalidates(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = 'member'
+            self.user.save()
+
+        self.assertEqual(self.authenticate().role, 'member')
+
+    def test_bulk_update_invalidates(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(role='admin')
+        self.assertEqual(self.authenticate().role, 'admin')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_unknown_user(self):
+        ghost = User(id=999999, username='ghost')
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(ghost)